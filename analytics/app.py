@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, Blueprint
+from flask import Flask, request, jsonify, Blueprint, g, Response
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import os
@@ -6,12 +6,17 @@ from dotenv import load_dotenv
 import pandas as pd
 from io import BytesIO
 import logging
+import time
 
 # Handle both relative and absolute imports
 try:
     from .eoq_calculator import EOQCalculator, EOQInput, DemandForecaster, InventoryAnalytics
+    from . import metrics
+    from . import instrumentation
 except ImportError:
     from eoq_calculator import EOQCalculator, EOQInput, DemandForecaster, InventoryAnalytics
+    import metrics
+    import instrumentation
 
 # Load environment variables from multiple locations
 # Try: analytics/.env, repo root .env, analytics/.env.local, repo root .env.local
@@ -54,6 +59,44 @@ def create_app():
     except ImportError:
         from routes import analytics_bp
     app.register_blueprint(analytics_bp)
+
+    # Request count and latency per route (url rule, not raw path, to keep label cardinality bounded)
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        # SQL queries / Supabase HTTP calls issued by this request
+        g.query_log = instrumentation.QueryLog()
+        g.query_log_token = instrumentation.activate_query_log(g.query_log)
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = getattr(g, 'request_started', None)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if started is not None:
+            metrics.HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+            metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route)
+        query_log = getattr(g, 'query_log', None)
+        if query_log is not None:
+            query_log.warn_repeated(f'{request.method} {route}')
+            # ?debug=1 or X-Analytics-Debug: 1 adds the query counts to JSON object responses
+            debug = request.args.get('debug') or request.headers.get('X-Analytics-Debug')
+            if debug and debug.strip().lower() in ('1', 'true', 'yes', 'on') and response.is_json:
+                payload = response.get_json(silent=True)
+                if isinstance(payload, dict):
+                    payload['debug'] = {'queries': query_log.as_dict()}
+                    response.set_data(app.json.dumps(payload))
+        return response
+
+    @app.teardown_request
+    def release_query_log(error=None):
+        token = g.pop('query_log_token', None)
+        if token is not None:
+            instrumentation.deactivate_query_log(token)
+
+    # Prometheus scrape endpoint
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
     
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
@@ -0,0 +1,63 @@
+"""Small in-process TTL cache for lookups that are expensive to rebuild per request.
+
+Entries expire `ttl` seconds after they are stored; hits and misses are reported to
+`metrics.record_cache_lookup` under the cache's name, so /metrics shows the hit ratio.
+Values are per process: under gunicorn each worker keeps its own copy.
+"""
+import threading
+import time
+
+# Handle both relative and absolute imports
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe dict with per-entry expiry and an optional size bound (oldest evicted first)."""
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 256):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] <= now:
+                del self._entries[key]
+                entry = _MISSING
+        metrics.record_cache_lookup(self.name, entry is not _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            while self.maxsize and len(self._entries) >= self.maxsize:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_build(self, key, build):
+        """Cached value for `key`, calling `build()` and storing its result on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = build()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=_MISSING):
+        """Drop one key, or everything when called without one."""
+        with self._lock:
+            if key is _MISSING:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
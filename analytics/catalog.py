@@ -0,0 +1,247 @@
+"""Bulk product-name resolution against `centralized_product`.
+
+POS exports and restock recommendations identify products by name. Rather than one
+`db.get_product_id_by_name` query per name, each branch's catalogue is fetched once
+into a `ProductNameIndex` keyed by normalized name (Unicode NFKC, case-folded,
+whitespace collapsed) and kept in a TTL cache, so resolving a whole batch is one
+vectorized lookup. Set ANALYTICS_NAME_INDEX_TTL (seconds, default 300) to tune how
+long a branch's index is reused. Products are created and renamed by the Node backend,
+not this service, so a new or renamed product resolves once its branch's index expires;
+code here that writes product names must call `invalidate`.
+
+Matching has two tiers. `exact` compares normalized names. `fuzzy` first compares
+names with punctuation and spacing removed ("LED-Bulb 9 W" == "led bulb 9w"), then
+falls back to cosine similarity of hashed character trigrams, accepted at
+ANALYTICS_NAME_MATCH_THRESHOLD (default 0.85) unless two products tie. A fuzzy match
+also needs the same numbers (sizes, wattages, pack counts) in both names, so
+"Bulb 13W" never resolves to "Bulb 18W". Both tiers work on the distinct names of a
+batch, so a 100k-row file costs as much as its few hundred distinct products.
+"""
+import logging
+import os
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Handle both relative and absolute imports
+try:
+    from . import db as db_module
+    from .cache import TTLCache
+except ImportError:
+    import db as db_module
+    from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+try:
+    NAME_INDEX_TTL = float(os.getenv('ANALYTICS_NAME_INDEX_TTL') or 300)
+except ValueError:
+    logger.warning('Ignoring non-numeric ANALYTICS_NAME_INDEX_TTL')
+    NAME_INDEX_TTL = 300.0
+
+try:
+    NAME_MATCH_THRESHOLD = float(os.getenv('ANALYTICS_NAME_MATCH_THRESHOLD') or 0.85)
+except ValueError:
+    logger.warning('Ignoring non-numeric ANALYTICS_NAME_MATCH_THRESHOLD')
+    NAME_MATCH_THRESHOLD = 0.85
+
+# Width of the hashed trigram vectors used by the fuzzy tier
+TRIGRAM_DIM = 1024
+
+_name_indexes = TTLCache('product_name_index', NAME_INDEX_TTL)
+
+
+def normalize_names(values) -> pd.Series:
+    """Normalized lookup keys for an iterable of names; missing or blank names become <NA>."""
+    names = pd.Series(values, dtype='string')
+    keys = (names.str.normalize('NFKC')
+            .str.casefold()
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip())
+    return keys.mask(keys == '')
+
+
+def _compact(keys: pd.Series) -> pd.Series:
+    """Normalized keys with everything but letters and digits removed."""
+    compact = keys.str.replace(r'[\W_]+', '', regex=True)
+    return compact.mask(compact == '')
+
+
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def _numeric_signature(keys) -> list:
+    """The sorted numbers in each key ('13', '1.5', ...) joined into one string."""
+    return [' '.join(sorted(_NUMBER.findall(key))) for key in keys]
+
+
+def _trigram_vectors(keys) -> np.ndarray:
+    """L2-normalized hashed character-trigram counts, one float32 row per key."""
+    rows, cols = [], []
+    for row, key in enumerate(keys):
+        padded = f'  {key} '
+        buckets = [zlib.crc32(padded[i:i + 3].encode()) % TRIGRAM_DIM for i in range(len(padded) - 2)]
+        rows.extend([row] * len(buckets))
+        cols.extend(buckets)
+    vectors = np.zeros((len(keys), TRIGRAM_DIM), dtype=np.float32)
+    np.add.at(vectors, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class ProductNameIndex:
+    """Normalized product name -> product_id for one branch.
+
+    When several products share a normalized name the lowest id wins, which is
+    the row the per-name lookup found first.
+    """
+
+    def __init__(self, branch_id: int, rows):
+        self.branch_id = branch_id
+        frame = pd.DataFrame(list(rows), columns=['product_id', 'product_name'])
+        frame['key'] = normalize_names(frame['product_name']).to_numpy()
+        frame = frame.dropna(subset=['key']).sort_values('product_id', kind='stable')
+        frame = frame.drop_duplicates('key')
+        self._ids = pd.Series(frame['product_id'].to_numpy(dtype='int64'), index=pd.Index(frame['key'], dtype='string'))
+        self._names = frame['product_name'].to_numpy(dtype=object)
+        self._numbers = np.asarray(_numeric_signature(self._ids.index), dtype=object)
+        compact = _compact(self._ids.index.to_series())
+        keep = (compact.notna() & ~compact.duplicated()).to_numpy()
+        self._compact_positions = np.flatnonzero(keep)
+        self._compact_ids = pd.Series(self._ids.to_numpy()[keep],
+                                      index=pd.Index(compact[keep].to_numpy(), dtype='string'))
+        self._vectors = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def resolve(self, names) -> pd.Series:
+        """product_id (Int64, <NA> when unknown) for each name, aligned with the input order."""
+        keys = normalize_names(names)
+        positions = self._ids.index.get_indexer(keys)
+        ids = pd.array(self._ids.to_numpy()[positions], dtype='Int64')
+        ids[positions < 0] = pd.NA
+        return pd.Series(ids, index=keys.index)
+
+    def match(self, names, fuzzy: bool = True, threshold: float | None = None) -> pd.DataFrame:
+        """Exact, then fuzzy, match of each name; aligned with the input order.
+
+        Returns columns product_id (Int64), match ('exact', 'fuzzy' or <NA>), score
+        (1.0 for exact and compact matches, trigram cosine otherwise) and matched_name
+        (the catalogue name of the product).
+        """
+        threshold = NAME_MATCH_THRESHOLD if threshold is None else threshold
+        keys = normalize_names(names)
+        codes, uniques = pd.factorize(keys, use_na_sentinel=True)
+        uniques = pd.Index(uniques, dtype='string')
+
+        positions = self._ids.index.get_indexer(uniques)
+        tiers = np.where(positions >= 0, 'exact', '')
+        scores = np.where(positions >= 0, 1.0, np.nan)
+
+        pending = np.flatnonzero(positions < 0)
+        if fuzzy and len(pending) and len(self._ids):
+            numbers = np.asarray(_numeric_signature(uniques[pending]), dtype=object)
+            compact = _compact(uniques[pending].to_series()).to_numpy()
+            hits = self._compact_ids.index.get_indexer(pd.Index(compact, dtype='string'))
+            hits = np.where(hits >= 0, self._compact_positions[hits], -1)
+            found = hits >= 0
+            found[found] = self._numbers[hits[found]] == numbers[found]
+            positions[pending[found]] = hits[found]
+            tiers[pending[found]] = 'fuzzy'
+            scores[pending[found]] = 1.0
+
+            numbers = numbers[~found]
+            pending = pending[~found]
+            if len(pending):
+                similarity = _trigram_vectors(uniques[pending]) @ self._trigram_matrix().T
+                # only products with exactly the same numbers are candidates
+                codes_by_number = pd.factorize(np.concatenate([numbers, self._numbers]))[0]
+                same_numbers = codes_by_number[:len(pending), None] == codes_by_number[None, len(pending):]
+                similarity = np.where(same_numbers, similarity, -1.0)
+                best = similarity.argmax(axis=1)
+                best_score = similarity[np.arange(len(pending)), best]
+                accepted = best_score >= threshold
+                if similarity.shape[1] > 1:
+                    # a name equally close to two products is ambiguous; leave it unmatched
+                    runner_up = np.partition(similarity, -2, axis=1)[:, -2]
+                    accepted &= runner_up < best_score - 1e-6
+                positions[pending[accepted]] = best[accepted]
+                tiers[pending[accepted]] = 'fuzzy'
+                scores[pending[accepted]] = best_score[accepted]
+        product_ids = np.where(positions >= 0, self._ids.to_numpy()[positions], -1)
+        matched_names = np.where(positions >= 0, self._names[positions], None)
+
+        # Broadcast back to rows; missing names point at a trailing "no match" slot
+        take = np.where(codes >= 0, codes, len(uniques))
+        result_ids = pd.array(np.append(product_ids, -1)[take], dtype='Int64')
+        result_ids[result_ids < 0] = pd.NA
+        result_tiers = pd.array(np.append(tiers, '')[take], dtype='string')
+        result_tiers[result_tiers == ''] = pd.NA
+        return pd.DataFrame({'product_id': result_ids, 'match': result_tiers, 'score': np.append(scores, np.nan)[take],
+                             'matched_name': np.append(matched_names, None)[take]},
+                            index=keys.index)
+
+    def _trigram_matrix(self) -> np.ndarray:
+        if self._vectors is None:
+            self._vectors = _trigram_vectors(self._ids.index)
+        return self._vectors
+
+
+def name_index(branch_id: int, conn=None) -> ProductNameIndex:
+    """The cached ProductNameIndex for `branch_id`, built from one catalogue fetch on a miss."""
+    def build():
+        rows = db_module.fetch_branch_product_names(branch_id, conn=conn)
+        index = ProductNameIndex(branch_id, rows)
+        logger.info(f'Built product name index for branch {branch_id}: {len(index)} names from {len(rows)} products')
+        return index
+
+    return _name_indexes.get_or_build(int(branch_id), build)
+
+
+def resolve_product_ids(names, branch_id: int, conn=None) -> pd.Series:
+    """Bulk form of db.get_product_id_by_name: one Int64 product_id (or <NA>) per name."""
+    return name_index(branch_id, conn=conn).resolve(names)
+
+
+def resolve_products(names, branch_ids=None, default_branch_id: int = 1, fuzzy: bool = True,
+                     conn=None) -> pd.DataFrame:
+    """Resolve names to (product_id, branch_id) for a name-only sales file.
+
+    names:      one product name per row
+    branch_ids: optional per-row branch ids; missing entries use default_branch_id
+    Each distinct branch's cached index is matched once with the names of its rows.
+    Returns product_id (Int64), branch_id (Int64), match, score and matched_name, aligned
+    with `names`.
+    """
+    names = pd.Series(names).reset_index(drop=True)
+    if branch_ids is None:
+        branches = pd.Series(default_branch_id, index=names.index, dtype='Int64')
+    else:
+        branches = pd.Series(branch_ids).reset_index(drop=True).astype('Int64').fillna(default_branch_id)
+
+    result = pd.DataFrame({
+        'product_id': pd.array([pd.NA] * len(names), dtype='Int64'),
+        'branch_id': branches,
+        'match': pd.array([pd.NA] * len(names), dtype='string'),
+        'score': np.full(len(names), np.nan),
+        'matched_name': np.full(len(names), None, dtype=object),
+    })
+    for branch_id in branches.unique():
+        rows = (branches == branch_id).to_numpy()
+        matched = name_index(int(branch_id), conn=conn).match(names[rows], fuzzy=fuzzy)
+        result.loc[rows, ['product_id', 'match', 'score', 'matched_name']] = matched.to_numpy()
+    result['product_id'] = result['product_id'].astype('Int64')
+    result['match'] = result['match'].astype('string')
+    result['score'] = result['score'].astype('float64')
+    return result
+
+
+def invalidate(branch_id: int | None = None):
+    """Forget the cached index of one branch, or of all branches."""
+    if branch_id is None:
+        _name_indexes.invalidate()
+    else:
+        _name_indexes.invalidate(int(branch_id))
@@ -1,10 +1,14 @@
 import os
+import json
 import logging
-from datetime import datetime
+import functools
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from typing import Optional
 
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.extras import execute_values, Json
 from dotenv import load_dotenv
 from typing import Iterable, Sequence, Any
 
@@ -14,6 +18,14 @@ try:
 except Exception:
     create_client = None
 
+# Handle both relative and absolute imports
+try:
+    from . import instrumentation
+    from . import metrics
+except ImportError:
+    import instrumentation
+    import metrics
+
 # Load environment variables. Attempt `.env` first, then `.env.local` for overrides.
 # Try multiple locations: current directory, analytics directory, and repo root
 import pathlib
@@ -48,21 +60,46 @@ _supabase_client = None
 logger.info('Supabase env present: url=%s, key=%s, supabase_pkg=%s', bool(os.getenv('SUPABASE_URL')), bool(os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_ANON_KEY')), bool(create_client))
 if SUPABASE_URL and SUPABASE_KEY and create_client:
     try:
-        _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        # HTTP calls are reported to the active request's StageTimer
+        _supabase_client = instrumentation.count_supabase_calls(create_client(SUPABASE_URL, SUPABASE_KEY))
         logger.info('Supabase client initialized (url=%s, using_service_key=%s)', SUPABASE_URL, bool(os.getenv('SUPABASE_SERVICE_KEY')))
     except Exception:
         _supabase_client = None
         logger.exception('Failed to initialize Supabase client')
 
+# Optional connection limit, used to report connection saturation on /metrics
+try:
+    metrics.set_connection_limit(int(os.getenv('ANALYTICS_DB_MAX_CONNECTIONS') or 0))
+except ValueError:
+    logger.warning('Ignoring non-integer ANALYTICS_DB_MAX_CONNECTIONS')
+
+
+def _timed(func):
+    """Record each call in the db-call latency histogram, labelled by backend."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        backend = 'supabase' if _supabase_client else 'psycopg2'
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            metrics.DB_CALL_ERRORS.inc(function=func.__name__, backend=backend)
+            raise
+        finally:
+            metrics.DB_CALL_SECONDS.observe(time.perf_counter() - started, function=func.__name__, backend=backend)
+    return wrapper
+
 
 def get_conn():
     """Get a new psycopg2 connection using environment variables.
 
     Expects: ANALYTICS_DB_DSN or DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+    Cursors report each statement to the active request's StageTimer and open
+    connections are tracked for /metrics.
     """
     dsn = os.getenv('ANALYTICS_DB_DSN')
     if dsn:
-        return psycopg2.connect(dsn)
+        return psycopg2.connect(dsn, connection_factory=instrumentation.TrackedConnection)
 
     host = os.getenv('DB_HOST')
     port = os.getenv('DB_PORT', '5432')
@@ -73,14 +110,85 @@ def get_conn():
     if not (host and dbname and user):
         raise RuntimeError('Database configuration incomplete; set ANALYTICS_DB_DSN or DB_HOST/DB_NAME/DB_USER')
 
-    return psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password)
+    return psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password,
+                            connection_factory=instrumentation.TrackedConnection)
+
+
+@_timed
+def begin_import_transaction():
+    """Open the single psycopg2 connection used as the unit of work for an import batch.
+
+    Returns None when the Supabase client is configured: PostgREST calls cannot
+    share a transaction, so each helper keeps its own per-call behaviour there.
+    The caller owns the returned connection: commit it once at the end of the
+    batch and close it in a `finally` (closing without commit rolls back).
+    """
+    if _supabase_client:
+        return None
+    return get_conn()
+
+
+@contextmanager
+def savepoint(conn, name: str):
+    """Run an optional import stage inside a SAVEPOINT on the shared connection.
+
+    If the stage raises, or leaves the transaction in an aborted state (helpers
+    that swallow their own errors), the stage is rolled back to the savepoint
+    so the rest of the batch can still commit. No-op when conn is None.
+    """
+    if conn is None:
+        yield
+        return
+
+    cur = conn.cursor()
+    try:
+        cur.execute(f'SAVEPOINT {name}')
+        try:
+            yield
+        except Exception:
+            cur.execute(f'ROLLBACK TO SAVEPOINT {name}')
+            raise
+        if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+            logger.warning('Import stage %s left the transaction aborted; rolling back to savepoint', name)
+            cur.execute(f'ROLLBACK TO SAVEPOINT {name}')
+        else:
+            cur.execute(f'RELEASE SAVEPOINT {name}')
+    finally:
+        cur.close()
+
+
+# Rows per Supabase select page; PostgREST caps a response at its max-rows (1000 by default)
+SUPABASE_PAGE_SIZE = 1000
+
 
+def _select_all(build_query, page_size: int = SUPABASE_PAGE_SIZE) -> list:
+    """Every row of a Supabase select, fetched page by page with `.range()`.
 
-def deduct_stock_from_sales(tuples: list, conn):
+    build_query: callable returning a fresh, totally ordered select query; a new
+    builder is made per page because range() adds to the builder's parameters.
+    Stops at the first short page. Raises RuntimeError on a response error.
+    """
+    rows = []
+    start = 0
+    while True:
+        resp = build_query().range(start, start + page_size - 1).execute()
+        if getattr(resp, 'error', None):
+            raise RuntimeError(str(getattr(resp, 'error', None)))
+        page = getattr(resp, 'data', []) or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+@_timed
+def deduct_stock_from_sales(tuples: list, conn, commit: bool = True):
     """Deduct stock from centralized_product when sales are inserted.
     
     tuples: list of tuples in format (product_id, branch_id, quantity_sold, ...)
     conn: psycopg2 connection object
+    commit: commit (or roll back on error) the connection here; pass False when
+            the caller owns the transaction.
     
     Validates that no product's quantity would go negative before making any updates.
     Raises ValueError if any deduction would result in negative stock.
@@ -159,12 +267,13 @@ def deduct_stock_from_sales(tuples: list, conn):
             logger.info(f'Deducted {total_qty} units from product {product_id} (branch {branch_id})')
         
         # Commit the deductions
-        conn.commit()
+        if commit:
+            conn.commit()
         logger.info(f'Stock deductions completed for {len(stock_deductions)} product/branch combinations')
         
     except Exception as e:
         logger.error(f'Error in deduct_stock_from_sales: {str(e)}')
-        if conn:
+        if conn and commit:
             conn.rollback()
         raise
     finally:
@@ -172,12 +281,15 @@ def deduct_stock_from_sales(tuples: list, conn):
             cur.close()
 
 
-def insert_sales_rows(rows: Iterable[Sequence[Any]] | Iterable[dict], commit: bool = True):
+@_timed
+def insert_sales_rows(rows: Iterable[Sequence[Any]] | Iterable[dict], commit: bool = True, conn=None):
     """Insert multiple sales rows into `public.sales`.
 
     rows: iterable of tuples matching (product_id, branch_id, quantity, transaction_date, unit_price, total_amount, payment_method, created_at, import_batch_id)
           or iterable of dicts matching column names when using Supabase client.
           import_batch_id is optional (can be None for backward compatibility).
+    conn: optional psycopg2 connection owned by the caller (see begin_import_transaction);
+          when given, nothing is committed, rolled back or closed here.
     """
     rows_list = list(rows)
     if not rows_list:
@@ -277,93 +389,94 @@ def insert_sales_rows(rows: Iterable[Sequence[Any]] | Iterable[dict], commit: bo
             
             # Deduct stock from centralized_product after successful insert
             if inserted > 0:
-                try:
-                    stock_deductions = {}
-                    for item in payload:
-                        product_id = item.get('product_id')
-                        branch_id = item.get('branch_id')
-                        quantity_sold = item.get('quantity_sold')
+                with instrumentation.stage('deduct'):
+                    try:
+                        stock_deductions = {}
+                        for item in payload:
+                            product_id = item.get('product_id')
+                            branch_id = item.get('branch_id')
+                            quantity_sold = item.get('quantity_sold')
                         
-                        if product_id is None or quantity_sold is None:
-                            continue
+                            if product_id is None or quantity_sold is None:
+                                continue
                         
-                        key = (product_id, branch_id)
-                        if key not in stock_deductions:
-                            stock_deductions[key] = 0
-                        stock_deductions[key] += quantity_sold
+                            key = (product_id, branch_id)
+                            if key not in stock_deductions:
+                                stock_deductions[key] = 0
+                            stock_deductions[key] += quantity_sold
                     
-                    # VALIDATION: Check that no product would go negative before updating
-                    negative_products = []
-                    for (product_id, branch_id), total_qty in stock_deductions.items():
-                        try:
-                            resp = _supabase_client.table('centralized_product').select('quantity').eq('id', product_id).eq('branch_id', branch_id).execute()
-                            if resp.data:
-                                current_qty = resp.data[0].get('quantity', 0)
-                                if current_qty - total_qty < 0:
+                        # VALIDATION: Check that no product would go negative before updating
+                        negative_products = []
+                        for (product_id, branch_id), total_qty in stock_deductions.items():
+                            try:
+                                resp = _supabase_client.table('centralized_product').select('quantity').eq('id', product_id).eq('branch_id', branch_id).execute()
+                                if resp.data:
+                                    current_qty = resp.data[0].get('quantity', 0)
+                                    if current_qty - total_qty < 0:
+                                        negative_products.append({
+                                            'product_id': product_id,
+                                            'branch_id': branch_id,
+                                            'current_quantity': current_qty,
+                                            'quantity_to_deduct': total_qty,
+                                            'would_result_in': current_qty - total_qty
+                                        })
+                                else:
+                                    # Product not found - also invalid
                                     negative_products.append({
                                         'product_id': product_id,
                                         'branch_id': branch_id,
-                                        'current_quantity': current_qty,
+                                        'current_quantity': 0,
                                         'quantity_to_deduct': total_qty,
-                                        'would_result_in': current_qty - total_qty
+                                        'would_result_in': -total_qty,
+                                        'error': 'Product not found'
                                     })
-                            else:
-                                # Product not found - also invalid
-                                negative_products.append({
-                                    'product_id': product_id,
-                                    'branch_id': branch_id,
-                                    'current_quantity': 0,
-                                    'quantity_to_deduct': total_qty,
-                                    'would_result_in': -total_qty,
-                                    'error': 'Product not found'
-                                })
-                        except Exception as e:
-                            logger.error(f'Error checking stock for product {product_id} branch {branch_id}: {str(e)}')
-                            raise
+                            except Exception as e:
+                                logger.error(f'Error checking stock for product {product_id} branch {branch_id}: {str(e)}')
+                                raise
                     
-                    if negative_products:
-                        error_msg = f'Stock deduction would result in negative quantities for {len(negative_products)} product(s): '
-                        details = []
-                        for p in negative_products:
-                            details.append(f"Product {p['product_id']} (Branch {p['branch_id']}): {p['current_quantity']} - {p['quantity_to_deduct']} = {p['would_result_in']}")
-                        error_msg += '; '.join(details)
-                        logger.error(error_msg)
-                        # Delete the inserted sales rows since we can't deduct stock
-                        try:
-                            for item in payload:
-                                product_id = item.get('product_id')
-                                branch_id = item.get('branch_id')
-                                quantity_sold = item.get('quantity_sold')
-                                transaction_date = item.get('transaction_date')
-                                if product_id and quantity_sold and transaction_date:
-                                    _supabase_client.table('sales').delete().eq('product_id', product_id).eq('branch_id', branch_id).eq('quantity_sold', quantity_sold).eq('transaction_date', transaction_date).execute()
-                        except Exception as e:
-                            logger.error(f'Error cleaning up inserted sales: {str(e)}')
-                        raise ValueError(error_msg)
+                        if negative_products:
+                            error_msg = f'Stock deduction would result in negative quantities for {len(negative_products)} product(s): '
+                            details = []
+                            for p in negative_products:
+                                details.append(f"Product {p['product_id']} (Branch {p['branch_id']}): {p['current_quantity']} - {p['quantity_to_deduct']} = {p['would_result_in']}")
+                            error_msg += '; '.join(details)
+                            logger.error(error_msg)
+                            # Delete the inserted sales rows since we can't deduct stock
+                            try:
+                                for item in payload:
+                                    product_id = item.get('product_id')
+                                    branch_id = item.get('branch_id')
+                                    quantity_sold = item.get('quantity_sold')
+                                    transaction_date = item.get('transaction_date')
+                                    if product_id and quantity_sold and transaction_date:
+                                        _supabase_client.table('sales').delete().eq('product_id', product_id).eq('branch_id', branch_id).eq('quantity_sold', quantity_sold).eq('transaction_date', transaction_date).execute()
+                            except Exception as e:
+                                logger.error(f'Error cleaning up inserted sales: {str(e)}')
+                            raise ValueError(error_msg)
                     
-                    # Update stock via Supabase - all validations passed
-                    for (product_id, branch_id), total_qty in stock_deductions.items():
-                        try:
-                            resp = _supabase_client.table('centralized_product').select('quantity').eq('id', product_id).eq('branch_id', branch_id).execute()
-                            if resp.data:
-                                current_qty = resp.data[0].get('quantity', 0)
-                                new_qty = current_qty - total_qty
+                        # Update stock via Supabase - all validations passed
+                        for (product_id, branch_id), total_qty in stock_deductions.items():
+                            try:
+                                resp = _supabase_client.table('centralized_product').select('quantity').eq('id', product_id).eq('branch_id', branch_id).execute()
+                                if resp.data:
+                                    current_qty = resp.data[0].get('quantity', 0)
+                                    new_qty = current_qty - total_qty
                                 
-                                # Update via Supabase
-                                update_resp = _supabase_client.table('centralized_product').update({
-                                    'quantity': new_qty,
-                                    'updated_at': datetime.utcnow().isoformat()
-                                }).eq('id', product_id).eq('branch_id', branch_id).execute()
+                                    # Update via Supabase
+                                    update_resp = _supabase_client.table('centralized_product').update({
+                                        'quantity': new_qty,
+                                        'updated_at': datetime.utcnow().isoformat()
+                                    }).eq('id', product_id).eq('branch_id', branch_id).execute()
                                 
-                                logger.info(f'Deducted {total_qty} units from product {product_id} (branch {branch_id}) via Supabase: {current_qty} -> {new_qty}')
-                            else:
-                                logger.warning(f'Product {product_id} branch {branch_id} not found in centralized_product')
-                        except Exception as e:
-                            logger.error(f'Error deducting stock for product {product_id} branch {branch_id}: {str(e)}')
-                            raise
-                except Exception as e:
-                    logger.error(f'Error in stock deduction batch: {str(e)}', exc_info=True)
-                    raise
+                                    logger.info(f'Deducted {total_qty} units from product {product_id} (branch {branch_id}) via Supabase: {current_qty} -> {new_qty}')
+                                else:
+                                    logger.warning(f'Product {product_id} branch {branch_id} not found in centralized_product')
+                            except Exception as e:
+                                logger.error(f'Error deducting stock for product {product_id} branch {branch_id}: {str(e)}')
+                                raise
+                    except Exception as e:
+                        logger.error(f'Error in stock deduction batch: {str(e)}', exc_info=True)
+                        raise
             
             return inserted
         except Exception:
@@ -378,10 +491,11 @@ def insert_sales_rows(rows: Iterable[Sequence[Any]] | Iterable[dict], commit: bo
     RETURNING id
     '''
 
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         # if dicts provided, map to tuples
         tuples = []
@@ -471,30 +585,32 @@ def insert_sales_rows(rows: Iterable[Sequence[Any]] | Iterable[dict], commit: bo
         # Deduct stock from centralized_product for each sale
         if inserted > 0:
             try:
-                deduct_stock_from_sales(tuples, conn)
+                with instrumentation.stage('deduct'):
+                    deduct_stock_from_sales(tuples, conn, commit=False)
             except Exception as e:
                 logger.error(f'Error deducting stock: {str(e)}')
-                if commit:
+                if commit and own_conn:
                     conn.rollback()
                 raise
         
-        if commit:
+        if commit and own_conn:
             conn.commit()
         logger.info(f'Inserted {inserted} sales rows (psycopg2)')
         return inserted
     except Exception as e:
-        if conn:
+        if conn and own_conn:
             conn.rollback()
         logger.exception('Failed to insert sales rows')
         raise
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
-def insert_eoq_calculation(product_id: int, branch_id: int, result: dict):
+@_timed
+def insert_eoq_calculation(product_id: int, branch_id: int, result: dict, conn=None):
     """Persist EOQ calculation into `public.eoq_calculations` using UPSERT.
 
     result: dictionary containing EOQ values produced by EOQCalculator
@@ -504,6 +620,8 @@ def insert_eoq_calculation(product_id: int, branch_id: int, result: dict):
     
     Validates that product exists in centralized_product before inserting.
     Uses ON CONFLICT to update existing records based on (product_id, branch_id).
+    conn: optional caller-owned psycopg2 connection; when given, the check and
+          the upsert run on it and the caller commits.
     """
     # Note: We attempt to save EOQ even if product doesn't exist in centralized_product
     # The foreign key constraint will handle validation. This allows EOQ to be saved
@@ -521,14 +639,15 @@ def insert_eoq_calculation(product_id: int, branch_id: int, result: dict):
     else:
         # For psycopg2, check product exists (for logging only)
         try:
-            conn = get_conn()
-            cur = conn.cursor()
+            check_conn = conn or get_conn()
+            cur = check_conn.cursor()
             cur.execute('SELECT id FROM centralized_product WHERE id = %s AND branch_id = %s LIMIT 1', (product_id, branch_id))
             product_exists = bool(cur.fetchone())
             if not product_exists:
                 logger.warning('Product %s branch %s not found in centralized_product. Will attempt EOQ insertion anyway (FK constraint will validate).', product_id, branch_id)
             cur.close()
-            conn.close()
+            if check_conn is not conn:
+                check_conn.close()
         except Exception as e:
             logger.warning('Could not validate product existence: %s. Will attempt EOQ insertion anyway.', str(e))
     
@@ -622,26 +741,29 @@ def insert_eoq_calculation(product_id: int, branch_id: int, result: dict):
             logger.exception('Failed to store EOQ calculation to Supabase')
             raise
 
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         cur.execute(sql, params)
-        conn.commit()
+        if own_conn:
+            conn.commit()
         logger.info(f'Stored EOQ calculation for product {product_id} branch {branch_id}')
     except Exception:
-        if conn:
+        if conn and own_conn:
             conn.rollback()
         logger.exception('Failed to store EOQ calculation')
         raise
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
+@_timed
 def fetch_eoq_calculations(limit: int = 100, branch_id: int | None = None):
     """Fetch recent EOQ calculations from DB. Returns list of dicts.
     
@@ -692,6 +814,7 @@ def fetch_eoq_calculations(limit: int = 100, branch_id: int | None = None):
             conn.close()
 
 
+@_timed
 def fetch_sales_summary(days: int = 30, branch_id: int | None = None):
     """Return aggregated sales metrics over the last `days` days.
     
@@ -789,10 +912,12 @@ def fetch_sales_summary(days: int = 30, branch_id: int | None = None):
             conn.close()
 
 
-def insert_product_demand_history(entries: Iterable[dict]):
+@_timed
+def insert_product_demand_history(entries: Iterable[dict], conn=None):
     """Insert aggregated product demand history rows.
 
     entries: iterable of dicts with keys: product_id, branch_id, period_date (date or iso string), quantity_sold, revenue, avg_price, source
+    conn: optional caller-owned psycopg2 connection (no commit/close here)
     """
     rows = list(entries)
     if not rows:
@@ -829,10 +954,11 @@ def insert_product_demand_history(entries: Iterable[dict]):
             raise
 
     # psycopg2 fallback
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         # Clean rows: replace NaN values with 0 or None
         import math
@@ -885,25 +1011,27 @@ def insert_product_demand_history(entries: Iterable[dict]):
                 datetime.utcnow()
             ))
         execute_values(cur, insert_sql, tuples, template=None, page_size=100)
-        if conn:
+        if own_conn:
             conn.commit()
         return cur.rowcount
     except Exception:
-        if conn:
+        if conn and own_conn:
             conn.rollback()
         logger.exception('Failed to insert product_demand_history')
         raise
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
-def insert_sales_forecasts(entries: Iterable[dict]):
+@_timed
+def insert_sales_forecasts(entries: Iterable[dict], conn=None):
     """Insert simple sales forecast rows into `sales_forecast`.
 
     entries: iterable of dicts with keys: product_id, branch_id, forecast_month (date), forecasted_quantity, confidence_interval_lower, confidence_interval_upper, forecast_method
+    conn: optional caller-owned psycopg2 connection (no commit/close here)
     """
     rows = list(entries)
     if not rows:
@@ -920,10 +1048,11 @@ def insert_sales_forecasts(entries: Iterable[dict]):
             logger.exception('Failed to insert sales_forecast to Supabase')
             raise
 
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         insert_sql = '''
         INSERT INTO public.sales_forecast (product_id, branch_id, forecast_month, forecasted_quantity, confidence_interval_lower, confidence_interval_upper, forecast_method, created_at)
@@ -942,25 +1071,27 @@ def insert_sales_forecasts(entries: Iterable[dict]):
                 datetime.utcnow()
             ))
         execute_values(cur, insert_sql, tuples, template=None, page_size=100)
-        if conn:
+        if own_conn:
             conn.commit()
         return cur.rowcount
     except Exception:
-        if conn:
+        if conn and own_conn:
             conn.rollback()
         logger.exception('Failed to insert sales_forecast')
         raise
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
-def insert_inventory_analytics(entries: Iterable[dict]):
+@_timed
+def insert_inventory_analytics(entries: Iterable[dict], conn=None):
     """Insert inventory analytics summary rows into `inventory_analytics`.
 
     entries: iterable of dicts with keys: product_id, branch_id, analysis_date, current_stock, avg_daily_usage, stock_adequacy_days, turnover_ratio, carrying_cost, stockout_risk_percentage, recommendation
+    conn: optional caller-owned psycopg2 connection (no commit/close here)
     """
     rows = list(entries)
     if not rows:
@@ -1012,10 +1143,11 @@ def insert_inventory_analytics(entries: Iterable[dict]):
             logger.exception('Failed to insert inventory_analytics to Supabase')
             raise
 
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         insert_sql = '''
         INSERT INTO public.inventory_analytics (product_id, branch_id, analysis_date, current_stock, avg_daily_usage, stock_adequacy_days, turnover_ratio, carrying_cost, stockout_risk_percentage, recommendation, created_at)
@@ -1055,25 +1187,28 @@ def insert_inventory_analytics(entries: Iterable[dict]):
                 datetime.utcnow()
             ))
         execute_values(cur, insert_sql, tuples, template=None, page_size=100)
-        if conn:
+        if own_conn:
             conn.commit()
         return cur.rowcount
     except Exception:
-        if conn:
+        if conn and own_conn:
             conn.rollback()
         logger.exception('Failed to insert inventory_analytics')
         raise
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
-def get_product_names(product_ids: Iterable[int]):
+@_timed
+def get_product_names(product_ids: Iterable[int], conn=None):
     """Return a mapping of product_id -> product_name for given ids.
 
     Attempts to read `name`, `product_name`, or `title` fields from `centralized_product`.
+
+    conn: optional caller-owned psycopg2 connection (not closed here).
     """
     ids = list(set(int(x) for x in product_ids if x is not None))
     if not ids:
@@ -1107,10 +1242,11 @@ def get_product_names(product_ids: Iterable[int]):
             # fall through to SQL path
 
     # psycopg2 path - coalesce only columns that are expected to exist
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         # avoid referencing `name` if it doesn't exist; prefer `product_name` then `title`
         cur.execute("SELECT id, COALESCE(product_name, title) as product_name FROM public.centralized_product WHERE id = ANY(%s)", (ids,))
@@ -1123,16 +1259,19 @@ def get_product_names(product_ids: Iterable[int]):
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
-def get_product_id_by_name(product_name: str, branch_id: int = None):
+@_timed
+def get_product_id_by_name(product_name: str, branch_id: int = None, conn=None):
     """Return product_id for a given product name.
     
     Searches for product_name field with exact match (case-insensitive).
     If branch_id is provided, also filters by branch_id.
     Returns the first matching product_id, or None if not found.
+
+    conn: optional caller-owned psycopg2 connection (not closed here).
     """
     if not product_name:
         return None
@@ -1164,10 +1303,11 @@ def get_product_id_by_name(product_name: str, branch_id: int = None):
             return None
     
     # psycopg2 path
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         # Search in product_name field using ILIKE for case-insensitive matching
         if branch_id is not None:
@@ -1195,15 +1335,57 @@ def get_product_id_by_name(product_name: str, branch_id: int = None):
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
-def validate_products_exist(product_ids: Iterable[int], branch_ids: Iterable[int] = None):
+@_timed
+def fetch_branch_product_names(branch_id: int, conn=None):
+    """Return [(product_id, product_name)] for every product of one branch, ordered by id.
+
+    Feeds catalog.ProductNameIndex, which resolves many names against one fetch.
+    conn: optional caller-owned psycopg2 connection (not closed here).
+    """
+    if _supabase_client:
+        try:
+            rows = _select_all(lambda: _supabase_client.table('centralized_product')
+                               .select('id, product_name')
+                               .eq('branch_id', int(branch_id))
+                               .order('id'))
+            return [(int(r['id']), r.get('product_name')) for r in rows]
+        except Exception:
+            logger.exception('Failed to fetch product names for branch %s from Supabase', branch_id)
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT id, product_name FROM public.centralized_product WHERE branch_id = %s ORDER BY id',
+            (int(branch_id),)
+        )
+        return [(int(pid), name) for pid, name in cur.fetchall()]
+    except Exception:
+        logger.exception('Failed to fetch product names for branch %s from Postgres', branch_id)
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
+def validate_products_exist(product_ids: Iterable[int], branch_ids: Iterable[int] = None, conn=None):
     """Return a set of (product_id, branch_id) tuples that exist in centralized_product.
     
     Used to filter sales data to only include products that exist in the database.
     Returns set of (product_id, branch_id) tuples.
+
+    conn: optional caller-owned psycopg2 connection (not closed here).
     """
     ids = list(set(int(x) for x in product_ids if x is not None))
     if not ids:
@@ -1238,10 +1420,11 @@ def validate_products_exist(product_ids: Iterable[int], branch_ids: Iterable[int
             # fall through to SQL path
 
     # psycopg2 path
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         if branch_filter:
             cur.execute(
@@ -1264,15 +1447,18 @@ def validate_products_exist(product_ids: Iterable[int], branch_ids: Iterable[int
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
-def get_product_stock(product_ids: Iterable[int], branch_ids: Iterable[int] = None):
+@_timed
+def get_product_stock(product_ids: Iterable[int], branch_ids: Iterable[int] = None, conn=None):
     """Return a mapping of (product_id, branch_id) -> quantity from centralized_product.
     
     If branch_ids is None, returns stock for all branches for the given product_ids.
     Returns dict with keys as (product_id, branch_id) tuples and values as quantity (bigint).
+
+    conn: optional caller-owned psycopg2 connection (not closed here).
     """
     ids = list(set(int(x) for x in product_ids if x is not None))
     if not ids:
@@ -1308,10 +1494,11 @@ def get_product_stock(product_ids: Iterable[int], branch_ids: Iterable[int] = No
             # fall through to SQL path
 
     # psycopg2 path
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         if branch_filter:
             cur.execute(
@@ -1337,10 +1524,371 @@ def get_product_stock(product_ids: Iterable[int], branch_ids: Iterable[int] = No
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
+INVENTORY_POSITION_FIELDS = (
+    'product_id', 'branch_id', 'product_name', 'current_stock', 'price', 'pack_size',
+    'eoq_quantity', 'reorder_point', 'safety_stock', 'annual_demand', 'unit_cost', 'holding_cost',
+    'ordering_cost', 'lead_time_days', 'eoq_calculated_at', 'recent_quantity_sold', 'first_sale_date',
+)
+
+
+@_timed
+def fetch_inventory_positions(branch_id: int | None = None, days: int = 90, conn=None):
+    """Every product's stock joined with its latest EOQ calculation and recent demand.
+
+    One row per centralized_product (of `branch_id`, or of all branches), with the
+    INVENTORY_POSITION_FIELDS keys. EOQ fields are None when the product has no
+    eoq_calculations row; recent_quantity_sold sums product_demand_history over the
+    last `days` days (0 without history); first_sale_date is the product's earliest
+    product_demand_history day (None without history).
+    conn: optional caller-owned psycopg2 connection (not closed here).
+    """
+    if _supabase_client:
+        try:
+            since = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+
+            def select(table, columns, order, period_since=None):
+                def build():
+                    query = _supabase_client.table(table).select(columns)
+                    if period_since is not None:
+                        query = query.gte('period_date', period_since)
+                    if branch_id is not None:
+                        query = query.eq('branch_id', int(branch_id))
+                    for column in order:
+                        query = query.order(column)
+                    return query
+                return _select_all(build)
+
+            products = select('centralized_product', 'id, branch_id, product_name, quantity, price, pack_size', ['id'])
+            # eoq_calculations_latest (schema.sql) holds one row per product: its newest calculation
+            eoq_rows = select('eoq_calculations_latest',
+                              'product_id, branch_id, eoq_quantity, reorder_point, safety_stock, annual_demand, unit_cost, '
+                              'holding_cost, ordering_cost, lead_time_days, calculated_at',
+                              ['product_id', 'branch_id'])
+            demand_rows = select('product_demand_history', 'product_id, branch_id, quantity_sold', ['id'],
+                                 period_since=since)
+            # product_first_sale (schema.sql): MIN(period_date) per product
+            first_sales = {(int(r['product_id']), int(r['branch_id'])): r.get('first_sale_date')
+                           for r in select('product_first_sale', 'product_id, branch_id, first_sale_date',
+                                           ['product_id', 'branch_id'])}
+
+            latest_eoq = {(int(r['product_id']), int(r['branch_id'])): r for r in eoq_rows}
+            recent = {}
+            for r in demand_rows:
+                key = (int(r['product_id']), int(r['branch_id']))
+                recent[key] = recent.get(key, 0) + (r.get('quantity_sold') or 0)
+
+            positions = []
+            for p in products:
+                key = (int(p['id']), int(p['branch_id']))
+                e = latest_eoq.get(key, {})
+                positions.append({
+                    'product_id': key[0],
+                    'branch_id': key[1],
+                    'product_name': p.get('product_name'),
+                    'current_stock': p.get('quantity') or 0,
+                    'price': p.get('price'),
+                    'pack_size': p.get('pack_size') or 1,
+                    'eoq_quantity': e.get('eoq_quantity'),
+                    'reorder_point': e.get('reorder_point'),
+                    'safety_stock': e.get('safety_stock'),
+                    'annual_demand': e.get('annual_demand'),
+                    'unit_cost': e.get('unit_cost'),
+                    'holding_cost': e.get('holding_cost'),
+                    'ordering_cost': e.get('ordering_cost'),
+                    'lead_time_days': e.get('lead_time_days'),
+                    'eoq_calculated_at': e.get('calculated_at'),
+                    'recent_quantity_sold': recent.get(key, 0),
+                    'first_sale_date': first_sales.get(key),
+                })
+            return positions
+        except Exception:
+            logger.exception('Failed to fetch inventory positions from Supabase')
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        branch_filter = 'WHERE cp.branch_id = %(branch_id)s' if branch_id is not None else ''
+        demand_branch_filter = 'AND branch_id = %(branch_id)s' if branch_id is not None else ''
+        where_branch = 'WHERE branch_id = %(branch_id)s' if branch_id is not None else ''
+        cur.execute(f"""
+            SELECT cp.id, cp.branch_id, cp.product_name, COALESCE(cp.quantity, 0), cp.price, COALESCE(cp.pack_size, 1),
+                   e.eoq_quantity, e.reorder_point, e.safety_stock, e.annual_demand, e.unit_cost, e.holding_cost,
+                   e.ordering_cost, e.lead_time_days, e.calculated_at, COALESCE(d.quantity_sold, 0), f.first_sale_date
+            FROM public.centralized_product cp
+            LEFT JOIN (
+                SELECT DISTINCT ON (product_id, branch_id)
+                       product_id, branch_id, eoq_quantity, reorder_point, safety_stock, annual_demand,
+                       unit_cost, holding_cost, ordering_cost, lead_time_days, calculated_at
+                FROM public.eoq_calculations
+                {where_branch}
+                ORDER BY product_id, branch_id, calculated_at DESC, id DESC
+            ) e ON e.product_id = cp.id AND e.branch_id = cp.branch_id
+            LEFT JOIN (
+                SELECT product_id, branch_id, SUM(quantity_sold) AS quantity_sold
+                FROM public.product_demand_history
+                WHERE period_date >= CURRENT_DATE - %(days)s {demand_branch_filter}
+                GROUP BY product_id, branch_id
+            ) d ON d.product_id = cp.id AND d.branch_id = cp.branch_id
+            LEFT JOIN (
+                SELECT product_id, branch_id, MIN(period_date) AS first_sale_date
+                FROM public.product_demand_history
+                {where_branch}
+                GROUP BY product_id, branch_id
+            ) f ON f.product_id = cp.id AND f.branch_id = cp.branch_id
+            {branch_filter}
+            ORDER BY cp.branch_id, cp.id
+        """, {'branch_id': branch_id, 'days': int(days)})
+        return [dict(zip(INVENTORY_POSITION_FIELDS, row)) for row in cur.fetchall()]
+    except Exception:
+        logger.exception('Failed to fetch inventory positions from Postgres')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
+def fetch_demand_history(branch_id: int | None = None, days: int = 90, conn=None):
+    """Daily product_demand_history rows of the last `days` days as
+    [(product_id, branch_id, period_date, quantity_sold)], for one branch or all.
+
+    conn: optional caller-owned psycopg2 connection (not closed here).
+    """
+    since = datetime.utcnow().date() - timedelta(days=days)
+    if _supabase_client:
+        try:
+            def build():
+                query = (_supabase_client.table('product_demand_history')
+                         .select('product_id, branch_id, period_date, quantity_sold')
+                         .gte('period_date', since.isoformat()))
+                if branch_id is not None:
+                    query = query.eq('branch_id', int(branch_id))
+                return query.order('id')
+            return [
+                (int(r['product_id']), int(r['branch_id']), datetime.fromisoformat(str(r['period_date'])[:10]).date(),
+                 r.get('quantity_sold') or 0)
+                for r in _select_all(build)
+            ]
+        except Exception:
+            logger.exception('Failed to fetch demand history from Supabase')
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        if branch_id is not None:
+            cur.execute(
+                """SELECT product_id, branch_id, period_date, quantity_sold FROM public.product_demand_history
+                   WHERE branch_id = %s AND period_date >= %s""",
+                (int(branch_id), since)
+            )
+        else:
+            cur.execute(
+                """SELECT product_id, branch_id, period_date, quantity_sold FROM public.product_demand_history
+                   WHERE period_date >= %s""",
+                (since,)
+            )
+        return cur.fetchall()
+    except Exception:
+        logger.exception('Failed to fetch demand history from Postgres')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
+def fetch_price_breaks(product_ids: Iterable[int], conn=None):
+    """Price-break tables of many products in one query: {product_id: [(min_quantity, unit_cost)]}.
+
+    Products without rows in product_price_breaks are absent from the result.
+    conn: optional caller-owned psycopg2 connection (not closed here).
+    """
+    ids = list(set(int(x) for x in product_ids if x is not None))
+    if not ids:
+        return {}
+    breaks = {}
+
+    if _supabase_client:
+        try:
+            rows = _select_all(lambda: _supabase_client.table('product_price_breaks')
+                               .select('product_id, min_quantity, unit_cost')
+                               .in_('product_id', ids)
+                               .order('product_id').order('min_quantity'))
+            for r in rows:
+                breaks.setdefault(int(r['product_id']), []).append((r['min_quantity'], r['unit_cost']))
+            return breaks
+        except Exception:
+            logger.exception('Failed to fetch price breaks from Supabase')
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT product_id, min_quantity, unit_cost FROM public.product_price_breaks
+               WHERE product_id = ANY(%s) ORDER BY product_id, min_quantity""",
+            (ids,)
+        )
+        for product_id, min_quantity, unit_cost in cur.fetchall():
+            breaks.setdefault(int(product_id), []).append((min_quantity, unit_cost))
+        return breaks
+    except Exception:
+        logger.exception('Failed to fetch price breaks from Postgres')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+PURCHASE_ORDER_ITEM_FIELDS = ('product_id', 'product_name', 'current_stock', 'reorder_point', 'eoq_quantity',
+                              'pack_size', 'packs', 'order_quantity', 'unit_cost', 'line_cost')
+
+
+@_timed
+def branch_exists(branch_id: int, conn=None) -> bool:
+    """Whether a branch with this id exists. Raises on database errors.
+
+    conn: optional caller-owned psycopg2 connection (not closed here).
+    """
+    if _supabase_client:
+        resp = _supabase_client.table('branch').select('id').eq('id', int(branch_id)).limit(1).execute()
+        if getattr(resp, 'error', None):
+            logger.error('Supabase fetch branch error: %s', getattr(resp, 'error', None))
+            raise RuntimeError(str(getattr(resp, 'error', None)))
+        return bool(getattr(resp, 'data', None))
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        cur.execute('SELECT 1 FROM public.branch WHERE id = %s', (int(branch_id),))
+        return cur.fetchone() is not None
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
+def save_purchase_order_drafts(drafts: Iterable[dict], draft_date=None, conn=None):
+    """Store consolidated purchase order drafts, replacing any draft of the same branch and day.
+
+    drafts: iterable of {'branch_id', 'line_count', 'total_units', 'total_cost', 'items'}
+            where items are dicts with the PURCHASE_ORDER_ITEM_FIELDS keys. A branch with
+            no items still gets an (empty) header so yesterday's lines do not linger.
+    All headers are upserted in one statement, their old lines deleted in one and the
+    new lines inserted in one, whatever the number of branches; on Supabase the three
+    run inside the save_purchase_order_drafts SQL function, so they commit together.
+    conn: optional caller-owned psycopg2 connection (no commit/close here).
+    Returns {branch_id: draft_id}.
+    """
+    drafts = list(drafts)
+    if not drafts:
+        return {}
+    draft_date = (draft_date or datetime.utcnow().date()).isoformat()
+    now = datetime.utcnow().isoformat()
+    headers = [
+        {
+            'branch_id': int(d['branch_id']),
+            'draft_date': draft_date,
+            'status': 'draft',
+            'line_count': int(d.get('line_count', len(d.get('items') or []))),
+            'total_units': float(d.get('total_units') or 0),
+            'total_cost': float(d.get('total_cost') or 0),
+            'generated_at': now,
+        }
+        for d in drafts
+    ]
+
+    if _supabase_client:
+        # One RPC so the header upsert, line delete and line insert commit or fail
+        # together; three PostgREST requests could leave a header with no lines
+        items = [
+            dict({f: item.get(f) for f in PURCHASE_ORDER_ITEM_FIELDS}, branch_id=int(d['branch_id']))
+            for d in drafts for item in (d.get('items') or [])
+        ]
+        try:
+            resp = _supabase_client.rpc('save_purchase_order_drafts',
+                                        {'p_headers': headers, 'p_items': items}).execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase rpc save_purchase_order_drafts error: %s', getattr(resp, 'error', None))
+                raise RuntimeError(str(getattr(resp, 'error', None)))
+            return {int(branch): int(draft_id) for branch, draft_id in (getattr(resp, 'data', None) or {}).items()}
+        except Exception:
+            logger.exception('Failed to save purchase order drafts to Supabase')
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        returned = execute_values(cur, """
+            INSERT INTO public.purchase_order_drafts
+                (branch_id, draft_date, status, line_count, total_units, total_cost, generated_at)
+            VALUES %s
+            ON CONFLICT (branch_id, draft_date) DO UPDATE SET
+                status = EXCLUDED.status,
+                line_count = EXCLUDED.line_count,
+                total_units = EXCLUDED.total_units,
+                total_cost = EXCLUDED.total_cost,
+                generated_at = EXCLUDED.generated_at
+            RETURNING branch_id, id
+        """, [(h['branch_id'], h['draft_date'], h['status'], h['line_count'], h['total_units'], h['total_cost'],
+               h['generated_at']) for h in headers], page_size=len(headers), fetch=True)
+        draft_ids = {int(branch): int(draft_id) for branch, draft_id in returned}
+        cur.execute('DELETE FROM public.purchase_order_draft_items WHERE draft_id = ANY(%s)',
+                    (list(draft_ids.values()),))
+        tuples = [
+            (draft_ids[int(d['branch_id'])],) + tuple(item.get(f) for f in PURCHASE_ORDER_ITEM_FIELDS)
+            for d in drafts for item in (d.get('items') or [])
+        ]
+        if tuples:
+            execute_values(cur, f"""
+                INSERT INTO public.purchase_order_draft_items (draft_id, {', '.join(PURCHASE_ORDER_ITEM_FIELDS)})
+                VALUES %s
+            """, tuples, page_size=1000)
+        if own_conn:
+            conn.commit()
+        return draft_ids
+    except Exception:
+        if conn and own_conn:
+            conn.rollback()
+        logger.exception('Failed to save purchase order drafts to PostgreSQL')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
 def fetch_inventory_analytics(days: int = 30, limit: int = 100, branch_id: int | None = None):
     """Fetch recent inventory_analytics rows within the last `days` days.
     
@@ -1394,6 +1942,7 @@ def fetch_inventory_analytics(days: int = 30, limit: int = 100, branch_id: int |
             conn.close()
 
 
+@_timed
 def fetch_top_products(days: int = 30, limit: int = 10, branch_id: int | None = None):
     """Return top products aggregated from product_demand_history for the last `days` days.
     
@@ -1502,7 +2051,8 @@ def fetch_top_products(days: int = 30, limit: int = 10, branch_id: int | None =
             conn.close()
 
 
-def insert_restock_recommendations(product_id: int | None, branch_id: int, recommendations: dict):
+@_timed
+def insert_restock_recommendations(product_id: int | None, branch_id: int, recommendations: dict, conn=None):
     """Insert restock recommendation into restock_recommendations table.
     
     product_id can be None if product not found in system.
@@ -1513,6 +2063,8 @@ def insert_restock_recommendations(product_id: int | None, branch_id: int, recom
       - recommendation: recommendation text
       - priority: 'high', 'medium', or 'low'
       - product_name: product name (optional, for logging)
+
+    conn: optional caller-owned psycopg2 connection (no commit/close here).
     """
     if _supabase_client:
         try:
@@ -1537,10 +2089,11 @@ def insert_restock_recommendations(product_id: int | None, branch_id: int, recom
             logger.exception('Failed to insert restock recommendation to Supabase: %s', str(e))
             return False
 
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         now = datetime.utcnow().isoformat()
         logger.info(f'Inserting restock recommendation to PostgreSQL: product_id={product_id}, branch_id={branch_id}, product_name={recommendations.get("product_name", "")}')
@@ -1552,21 +2105,91 @@ def insert_restock_recommendations(product_id: int | None, branch_id: int, recom
              recommendations.get('daily_rate', 0), recommendations.get('recommendation', ''),
              recommendations.get('priority', 'low'), recommendations.get('product_name', ''), now)
         )
-        conn.commit()
+        if own_conn:
+            conn.commit()
         logger.info(f'Successfully inserted restock recommendation to PostgreSQL')
         return True
     except Exception as e:
         logger.exception('Failed to insert restock recommendation to PostgreSQL: %s', str(e))
-        if conn:
+        if conn and own_conn:
             conn.rollback()
         return False
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and own_conn:
             conn.close()
 
 
+@_timed
+def insert_restock_recommendations_bulk(entries: Iterable[tuple], branch_id: int, conn=None):
+    """Insert many restock recommendations in one statement (one Supabase request).
+
+    entries: iterable of (product_id or None, recommendation dict) pairs; the dicts have
+    the keys insert_restock_recommendations documents.
+    conn: optional caller-owned psycopg2 connection (no commit/close here).
+    Returns the number of rows inserted.
+    """
+    now = datetime.utcnow().isoformat()
+    rows = [
+        {
+            'product_id': product_id,
+            'branch_id': branch_id,
+            'last_sold_qty': rec.get('last_sold_qty', 0),
+            'daily_rate': rec.get('daily_rate', 0),
+            'recommendation': rec.get('recommendation', ''),
+            'priority': rec.get('priority', 'low'),
+            'product_name': rec.get('product_name', ''),
+            'created_at': now,
+        }
+        for product_id, rec in entries
+    ]
+    if not rows:
+        return 0
+
+    if _supabase_client:
+        try:
+            resp = _supabase_client.table('restock_recommendations').insert(rows).execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase insert restock recommendations error: %s', getattr(resp, 'error', None))
+                raise RuntimeError(str(getattr(resp, 'error', None)))
+            return len(getattr(resp, 'data', []) or rows)
+        except Exception:
+            logger.exception('Failed to insert restock recommendations to Supabase')
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        insert_sql = '''
+        INSERT INTO public.restock_recommendations (product_id, branch_id, last_sold_qty, daily_rate, recommendation, priority, product_name, created_at)
+        VALUES %s
+        '''
+        tuples = [
+            (r['product_id'], r['branch_id'], r['last_sold_qty'], r['daily_rate'],
+             r['recommendation'], r['priority'], r['product_name'], r['created_at'])
+            for r in rows
+        ]
+        execute_values(cur, insert_sql, tuples, template=None, page_size=500)
+        if own_conn:
+            conn.commit()
+        return len(tuples)
+    except Exception:
+        if conn and own_conn:
+            conn.rollback()
+        logger.exception('Failed to insert restock recommendations to PostgreSQL')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
 def fetch_restock_recommendations(days: int = 30, branch_id: int | None = None, limit: int = 100):
     """Fetch recent restock recommendations from the database.
     
@@ -1632,11 +2255,14 @@ def fetch_restock_recommendations(days: int = 30, branch_id: int | None = None,
             conn.close()
 
 
-def get_stock_deductions_by_batch(import_batch_id: str):
+@_timed
+def get_stock_deductions_by_batch(import_batch_id: str, conn=None):
     """Get stock deduction details for a specific import batch.
     
     Returns list of dicts with product_id, product_name, branch_id, quantity_deducted, 
     previous_quantity, updated_quantity.
+
+    conn: optional caller-owned psycopg2 connection (not closed here).
     """
     if not import_batch_id:
         return []
@@ -1718,10 +2344,11 @@ def get_stock_deductions_by_batch(import_batch_id: str):
             return []
     
     # psycopg2 fallback
-    conn = None
+    own_conn = conn is None
     cur = None
     try:
-        conn = get_conn()
+        if own_conn:
+            conn = get_conn()
         cur = conn.cursor()
         
         # Query sales grouped by product
@@ -1756,6 +2383,428 @@ def get_stock_deductions_by_batch(import_batch_id: str):
     except Exception as e:
         logger.error(f'Error fetching stock deductions by batch: {str(e)}')
         return []
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
+def get_import_batch_by_hash(content_hash: str, branch_id: int | None = None, conn=None):
+    """Return the stored import batch for an upload's content hash, or None.
+
+    Returns dict with import_batch_id, content_hash, branch_id, file_name,
+    records_imported, summary (the original import response) and created_at.
+    Lookup failures (e.g. table not migrated yet) are logged and treated as a miss.
+    conn: optional caller-owned psycopg2 connection (not closed here).
+    """
+    if not content_hash:
+        return None
+
+    if _supabase_client:
+        try:
+            query = _supabase_client.table('sales_import_batches').select('*').eq('content_hash', content_hash)
+            if branch_id is not None:
+                query = query.eq('branch_id', branch_id)
+            resp = query.limit(1).execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase fetch sales_import_batches error: %s', getattr(resp, 'error', None))
+                return None
+            rows = getattr(resp, 'data', []) or []
+            return rows[0] if rows else None
+        except Exception as e:
+            logger.warning('Failed to look up import batch by hash from Supabase: %s', str(e))
+            return None
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        if branch_id is not None:
+            cur.execute(
+                """SELECT import_batch_id, content_hash, branch_id, file_name, records_imported, summary, created_at
+                   FROM public.sales_import_batches
+                   WHERE content_hash = %s AND branch_id = %s
+                   LIMIT 1""",
+                (content_hash, branch_id)
+            )
+        else:
+            cur.execute(
+                """SELECT import_batch_id, content_hash, branch_id, file_name, records_imported, summary, created_at
+                   FROM public.sales_import_batches
+                   WHERE content_hash = %s
+                   ORDER BY created_at DESC LIMIT 1""",
+                (content_hash,)
+            )
+        row = cur.fetchone()
+        if not row:
+            return None
+        cols = [c[0] for c in cur.description]
+        result = dict(zip(cols, row))
+        result['import_batch_id'] = str(result['import_batch_id'])
+        return result
+    except Exception as e:
+        logger.warning('Failed to look up import batch by hash: %s', str(e))
+        return None
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+# A Supabase claim whose import never finished (worker killed or timed out) stops
+# blocking re-uploads of the file after this many seconds; keep it above the longest import
+try:
+    IMPORT_CLAIM_TTL = float(os.getenv('ANALYTICS_IMPORT_CLAIM_TTL') or 900)
+except ValueError:
+    logger.warning('Ignoring non-numeric ANALYTICS_IMPORT_CLAIM_TTL')
+    IMPORT_CLAIM_TTL = 900.0
+
+
+@_timed
+def claim_import_hash(content_hash: str, branch_id: int, import_batch_id: str,
+                      file_name: str | None = None, conn=None) -> bool:
+    """Claim an upload's content hash for this import before any row is written.
+
+    psycopg2: takes a transaction-scoped advisory lock on (branch_id, content_hash) on
+    the import transaction `conn`, so a concurrent upload of the same file waits until
+    this import commits or rolls back and then sees its batch. Always returns True
+    (without a lock when there is no import transaction).
+    Supabase: inserts a placeholder batch row (no summary, claimed_at now) with ON
+    CONFLICT DO NOTHING; returns False when the hash is already claimed, by a finished
+    or a running import. A claim that does not end in record_import_batch is dropped
+    with release_import_hash; one left behind by a dead worker is taken over once its
+    claimed_at is more than IMPORT_CLAIM_TTL seconds old.
+    """
+    if _supabase_client:
+        now = datetime.utcnow()
+        payload = {
+            'import_batch_id': import_batch_id,
+            'content_hash': content_hash,
+            'branch_id': branch_id,
+            'file_name': file_name,
+            'records_imported': 0,
+            'summary': None,
+            'claimed_at': now.isoformat(),
+            'created_at': now.isoformat()
+        }
+
+        def claim():
+            resp = _supabase_client.table('sales_import_batches').upsert(
+                payload,
+                on_conflict='content_hash,branch_id',
+                ignore_duplicates=True
+            ).execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase claim sales_import_batches error: %s', getattr(resp, 'error', None))
+                raise RuntimeError(str(getattr(resp, 'error', None)))
+            return bool(getattr(resp, 'data', None))
+
+        if claim():
+            return True
+        # Drop the placeholder only if it is still unfinished and stale; a concurrent
+        # reclaim re-inserts with a fresh claimed_at, so at most one upsert wins below
+        stale_before = (now - timedelta(seconds=IMPORT_CLAIM_TTL)).isoformat()
+        resp = (_supabase_client.table('sales_import_batches').delete()
+                .eq('content_hash', content_hash).eq('branch_id', branch_id)
+                .is_('summary', 'null').lt('claimed_at', stale_before).execute())
+        if getattr(resp, 'error', None):
+            logger.error('Supabase reclaim sales_import_batches error: %s', getattr(resp, 'error', None))
+            raise RuntimeError(str(getattr(resp, 'error', None)))
+        if not getattr(resp, 'data', None):
+            return False
+        logger.warning('Reclaiming import claim on %s... abandoned before %s', content_hash[:12], stale_before)
+        return claim()
+
+    if conn is None:
+        logger.warning('No import transaction to hold the claim on %s...; concurrent uploads are not serialized', content_hash[:12])
+        return True
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', (f'sales_import:{branch_id}:{content_hash}',))
+        return True
+    finally:
+        cur.close()
+
+
+@_timed
+def release_import_hash(content_hash: str, branch_id: int, import_batch_id: str):
+    """Drop an unfinished Supabase claim so the file can be uploaded again.
+
+    Only the placeholder row of this import (matched by import_batch_id) is removed; on
+    psycopg2 the advisory lock ends with the import transaction and nothing is needed.
+    """
+    if not _supabase_client:
+        return
+    try:
+        resp = (_supabase_client.table('sales_import_batches').delete()
+                .eq('content_hash', content_hash).eq('branch_id', branch_id)
+                .eq('import_batch_id', import_batch_id).execute())
+        if getattr(resp, 'error', None):
+            logger.error('Supabase release sales_import_batches error: %s', getattr(resp, 'error', None))
+    except Exception:
+        logger.exception('Failed to release import claim for batch %s', import_batch_id)
+
+
+@_timed
+def record_import_batch(content_hash: str, branch_id: int, import_batch_id: str, summary: dict,
+                        file_name: str | None = None, conn=None):
+    """Record a completed import under its content hash so re-uploads can be short-circuited.
+
+    Upserts on (content_hash, branch_id): a forced re-import replaces the stored batch.
+    summary: the JSON-serializable import response returned to the client.
+    conn: optional caller-owned psycopg2 connection (no commit/close here); pass the
+          import transaction so the record commits atomically with the sales rows.
+    """
+    records_imported = int(summary.get('records_imported') or 0) if summary else 0
+
+    if _supabase_client:
+        try:
+            payload = {
+                'import_batch_id': import_batch_id,
+                'content_hash': content_hash,
+                'branch_id': branch_id,
+                'file_name': file_name,
+                'records_imported': records_imported,
+                'summary': json.loads(json.dumps(summary, default=str)),
+                'created_at': datetime.utcnow().isoformat()
+            }
+            resp = _supabase_client.table('sales_import_batches').upsert(
+                payload,
+                on_conflict='content_hash,branch_id'
+            ).execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase upsert sales_import_batches error: %s', getattr(resp, 'error', None))
+                raise RuntimeError(str(getattr(resp, 'error', None)))
+            return True
+        except Exception:
+            logger.exception('Failed to record import batch to Supabase')
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO public.sales_import_batches
+               (import_batch_id, content_hash, branch_id, file_name, records_imported, summary, created_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)
+               ON CONFLICT (content_hash, branch_id) DO UPDATE SET
+                   import_batch_id = EXCLUDED.import_batch_id,
+                   file_name = EXCLUDED.file_name,
+                   records_imported = EXCLUDED.records_imported,
+                   summary = EXCLUDED.summary,
+                   created_at = EXCLUDED.created_at""",
+            (import_batch_id, content_hash, branch_id, file_name, records_imported,
+             Json(summary, dumps=lambda o: json.dumps(o, default=str)), datetime.utcnow())
+        )
+        if own_conn:
+            conn.commit()
+        return True
+    except Exception:
+        if conn and own_conn:
+            conn.rollback()
+        logger.exception('Failed to record import batch')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+IMPORT_PROFILE_FIELDS = ('name', 'branch_id', 'column_map', 'dtypes', 'date_format', 'sheet', 'header_row', 'updated_at')
+
+
+def _import_profile_row(row: dict) -> dict:
+    """Normalize a stored profile: sheet comes back as text, jsonb may arrive as str."""
+    result = {k: row.get(k) for k in IMPORT_PROFILE_FIELDS if k in row}
+    for key in ('column_map', 'dtypes'):
+        if isinstance(result.get(key), str):
+            result[key] = json.loads(result[key])
+    sheet = result.get('sheet')
+    if isinstance(sheet, str) and sheet.isdigit():
+        result['sheet'] = int(sheet)
+    return result
+
+
+@_timed
+def fetch_import_profiles(branch_id: int | None = None):
+    """List saved sales import profiles, optionally for one branch, ordered by name."""
+    if _supabase_client:
+        try:
+            query = _supabase_client.table('sales_import_profiles').select('*').order('name')
+            if branch_id is not None:
+                query = query.eq('branch_id', branch_id)
+            resp = query.execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase fetch sales_import_profiles error: %s', getattr(resp, 'error', None))
+                return []
+            return [_import_profile_row(r) for r in (getattr(resp, 'data', []) or [])]
+        except Exception:
+            logger.exception('Failed to fetch import profiles from Supabase')
+            return []
+
+    conn = None
+    cur = None
+    try:
+        conn = get_conn()
+        cur = conn.cursor()
+        sql = """SELECT name, branch_id, column_map, dtypes, date_format, sheet, header_row, updated_at
+                 FROM public.sales_import_profiles"""
+        if branch_id is not None:
+            cur.execute(sql + ' WHERE branch_id = %s ORDER BY name', (branch_id,))
+        else:
+            cur.execute(sql + ' ORDER BY branch_id, name')
+        cols = [c[0] for c in cur.description]
+        return [_import_profile_row(dict(zip(cols, row))) for row in cur.fetchall()]
+    except Exception:
+        logger.exception('Failed to fetch import profiles')
+        return []
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            conn.close()
+
+
+@_timed
+def get_import_profile(branch_id: int, name: str, conn=None):
+    """Return one saved import profile as a dict, or None when it does not exist.
+
+    Raises when the lookup itself fails, so callers can tell an outage from a
+    missing profile.
+    conn: optional caller-owned psycopg2 connection (not closed here).
+    """
+    if _supabase_client:
+        try:
+            resp = _supabase_client.table('sales_import_profiles').select('*').eq('branch_id', branch_id).eq('name', name).limit(1).execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase fetch sales_import_profiles error: %s', getattr(resp, 'error', None))
+                raise RuntimeError(str(getattr(resp, 'error', None)))
+            rows = getattr(resp, 'data', []) or []
+            return _import_profile_row(rows[0]) if rows else None
+        except Exception:
+            logger.exception('Failed to fetch import profile from Supabase')
+            raise
+
+    own_conn = conn is None
+    cur = None
+    try:
+        if own_conn:
+            conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT name, branch_id, column_map, dtypes, date_format, sheet, header_row, updated_at
+               FROM public.sales_import_profiles
+               WHERE branch_id = %s AND name = %s""",
+            (branch_id, name)
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        return _import_profile_row(dict(zip([c[0] for c in cur.description], row)))
+    except Exception:
+        logger.exception('Failed to fetch import profile')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn and own_conn:
+            conn.close()
+
+
+@_timed
+def upsert_import_profile(profile: dict):
+    """Create or replace a sales import profile, keyed by (branch_id, name).
+
+    profile: validated dict (ingest.ImportProfile.to_dict()). Raises on failure.
+    """
+    sheet = profile.get('sheet')
+    payload = {
+        'name': profile['name'],
+        'branch_id': profile['branch_id'],
+        'column_map': profile['column_map'],
+        'dtypes': profile.get('dtypes') or {},
+        'date_format': profile.get('date_format'),
+        'sheet': str(sheet) if sheet is not None else None,
+        'header_row': int(profile.get('header_row') or 0),
+        'updated_at': datetime.utcnow().isoformat(),
+    }
+
+    if _supabase_client:
+        resp = _supabase_client.table('sales_import_profiles').upsert(payload, on_conflict='branch_id,name').execute()
+        if getattr(resp, 'error', None):
+            logger.error('Supabase upsert sales_import_profiles error: %s', getattr(resp, 'error', None))
+            raise RuntimeError(str(getattr(resp, 'error', None)))
+        return True
+
+    conn = None
+    cur = None
+    try:
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO public.sales_import_profiles
+               (name, branch_id, column_map, dtypes, date_format, sheet, header_row, updated_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, now())
+               ON CONFLICT (branch_id, name) DO UPDATE SET
+                   column_map = EXCLUDED.column_map,
+                   dtypes = EXCLUDED.dtypes,
+                   date_format = EXCLUDED.date_format,
+                   sheet = EXCLUDED.sheet,
+                   header_row = EXCLUDED.header_row,
+                   updated_at = now()""",
+            (payload['name'], payload['branch_id'], Json(payload['column_map']), Json(payload['dtypes']),
+             payload['date_format'], payload['sheet'], payload['header_row'])
+        )
+        conn.commit()
+        return True
+    except Exception:
+        if conn:
+            conn.rollback()
+        logger.exception('Failed to save import profile')
+        raise
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            conn.close()
+
+
+@_timed
+def delete_import_profile(branch_id: int, name: str) -> bool:
+    """Delete a saved import profile; returns True when one was removed."""
+    if _supabase_client:
+        try:
+            resp = _supabase_client.table('sales_import_profiles').delete().eq('branch_id', branch_id).eq('name', name).execute()
+            if getattr(resp, 'error', None):
+                logger.error('Supabase delete sales_import_profiles error: %s', getattr(resp, 'error', None))
+                return False
+            return bool(getattr(resp, 'data', None))
+        except Exception:
+            logger.exception('Failed to delete import profile from Supabase')
+            return False
+
+    conn = None
+    cur = None
+    try:
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute('DELETE FROM public.sales_import_profiles WHERE branch_id = %s AND name = %s', (branch_id, name))
+        conn.commit()
+        return cur.rowcount > 0
+    except Exception:
+        if conn:
+            conn.rollback()
+        logger.exception('Failed to delete import profile')
+        return False
     finally:
         if cur:
             cur.close()
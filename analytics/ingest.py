@@ -0,0 +1,539 @@
+"""Readers that turn an uploaded sales file into the DataFrame used by the import pipeline.
+
+Supports CSV, Excel (.xlsx/.xls), Parquet and Arrow IPC (.arrow/.feather/.arrows).
+Columnar formats are read with projection: only columns the importer understands
+are loaded, and their stored types are kept as-is (no string -> number coercion).
+Excel goes through a fast path first (calamine engine when installed, otherwise a
+read-only, values-only openpyxl row stream) before the pandas openpyxl/xlrd chain.
+
+Every reader ends with the same schema step (`apply_import_schema`): compact dtypes
+for the known columns, so later groupbys work on int32/float32/categorical data
+instead of object columns. Dates are parsed by `parse_dates` with an explicit format
+detected once on a sample and remembered per export layout (`source_key`).
+"""
+import hashlib
+import logging
+import re
+import warnings
+from dataclasses import dataclass, field
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.tseries.api import guess_datetime_format
+
+# optional fast Excel engine (pandas engine='calamine', pandas >= 2.2)
+try:
+    import python_calamine  # noqa: F401
+    HAS_CALAMINE = True
+except Exception:
+    HAS_CALAMINE = False
+
+# optional columnar readers (Parquet / Arrow IPC uploads)
+try:
+    import pyarrow as pa
+    import pyarrow.feather as pa_feather
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_parquet
+except Exception:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Date column names accepted from different POS exports, in order of preference
+DATE_CANDIDATES = ['date', 'transaction_date', 'sale_date', 'timestamp', 'transactiondatetime', 'created_at']
+
+# Every column the import pipeline reads; other columns in columnar uploads are skipped
+SALES_IMPORT_COLUMNS = [
+    'quantity', 'product', 'product_name', 'product_id', 'branch_id',
+    'unit_price', 'price', 'total_amount', 'amount', 'payment_method',
+] + DATE_CANDIDATES
+
+# Target dtypes of the import columns. ids are int32 like the integer keys in the schema
+# (nullable, since exports leave them blank), float32 matches the `real` price/amount
+# columns of `sales`, and categoricals store each product name / payment method once.
+SALES_IMPORT_DTYPES = {
+    'product_id': 'Int32',
+    'branch_id': 'Int32',
+    'quantity': 'float32',
+    'unit_price': 'float32',
+    'price': 'float32',
+    'total_amount': 'float32',
+    'amount': 'float32',
+    'product': 'category',
+    'product_name': 'category',
+    'payment_method': 'category',
+}
+
+# Date format detection: rows sampled, distinct values guessed from, the share of the
+# sample a newly detected format must parse to be used, and the share a remembered
+# format (per layout or from an import profile) must still parse to skip detection
+DATE_FORMAT_SAMPLE = 200
+DATE_GUESS_VALUES = 10
+MIN_FORMAT_MATCH = 0.5
+REMEMBERED_FORMAT_MATCH = 0.99
+MAX_REMEMBERED_SOURCES = 256
+_DIGITS = re.compile(r'\d')
+# Date "shape" (digits masked, e.g. '9999-99-99 99:99:99') -> strftime format
+_date_formats = {}
+# source_key(...) -> strftime format last detected for that export layout
+_source_date_formats = {}
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc', '.arrows')
+
+PARQUET_MAGIC = b'PAR1'
+ARROW_FILE_MAGIC = b'ARROW1'
+ZIP_MAGIC = b'PK'
+
+
+# Columns an import profile can map, and the dtypes a profile may pin
+PROFILE_COLUMNS = ['date'] + [c for c in SALES_IMPORT_COLUMNS if c not in DATE_CANDIDATES]
+PROFILE_REQUIRED_COLUMNS = ('date', 'quantity')
+PROFILE_DTYPES = ('Int32', 'Int64', 'float32', 'float64', 'category', 'string')
+
+
+class SalesFileError(ValueError):
+    """Uploaded sales file could not be read; the message is safe to return to the client."""
+
+
+@dataclass
+class ImportProfile:
+    """Saved column mapping for one POS export format (table sales_import_profiles).
+
+    column_map: importer column (PROFILE_COLUMNS) -> column name in the export
+    dtypes: importer column -> dtype overriding SALES_IMPORT_DTYPES
+    date_format: strftime format of the date column (skips format detection)
+    sheet / header_row: Excel sheet name or index and 0-based header row
+    """
+    name: str
+    branch_id: int
+    column_map: dict
+    dtypes: dict = field(default_factory=dict)
+    date_format: str | None = None
+    sheet: str | int | None = None
+    header_row: int = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ImportProfile':
+        """Build and validate a profile from a request body or a stored row; raises ValueError."""
+        if not isinstance(data, dict):
+            raise ValueError('Profile must be a JSON object')
+        name = str(data.get('name') or '').strip()
+        if not name:
+            raise ValueError('Profile name is required')
+        try:
+            branch_id = int(data.get('branch_id') or 1)
+            header_row = int(data.get('header_row') or 0)
+        except (TypeError, ValueError):
+            raise ValueError('branch_id and header_row must be integers')
+        column_map = data.get('column_map') or {}
+        if not isinstance(column_map, dict) or not all(isinstance(v, str) and v for v in column_map.values()):
+            raise ValueError('column_map must map importer columns to export column names')
+        unknown = sorted(set(column_map) - set(PROFILE_COLUMNS))
+        if unknown:
+            raise ValueError(f'Unknown importer columns in column_map: {", ".join(unknown)}. Use: {", ".join(PROFILE_COLUMNS)}')
+        missing = [c for c in PROFILE_REQUIRED_COLUMNS if c not in column_map]
+        if missing:
+            raise ValueError(f'column_map must include: {", ".join(missing)}')
+        if len(set(column_map.values())) != len(column_map):
+            raise ValueError('column_map maps two importer columns to the same export column')
+        dtypes = data.get('dtypes') or {}
+        if not isinstance(dtypes, dict):
+            raise ValueError('dtypes must be an object')
+        bad = sorted(k for k, v in dtypes.items() if k not in column_map or k == 'date' or v not in PROFILE_DTYPES)
+        if bad:
+            raise ValueError(f'Invalid dtypes for: {", ".join(bad)}. Mapped non-date columns only, one of: {", ".join(PROFILE_DTYPES)}')
+        sheet = data.get('sheet')
+        if isinstance(sheet, str) and sheet.strip().isdigit():
+            sheet = int(sheet)
+        if header_row < 0:
+            raise ValueError('header_row must be a non-negative integer')
+        return cls(name=name, branch_id=branch_id, column_map=dict(column_map), dtypes=dict(dtypes),
+                   date_format=data.get('date_format') or None, sheet=sheet if sheet != '' else None,
+                   header_row=header_row)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'branch_id': self.branch_id,
+            'column_map': self.column_map,
+            'dtypes': self.dtypes,
+            'date_format': self.date_format,
+            'sheet': self.sheet,
+            'header_row': self.header_row,
+        }
+
+    @property
+    def source_columns(self) -> list:
+        return list(self.column_map.values())
+
+    def source_dtypes(self) -> dict:
+        """Target dtypes keyed by export column name, for typed reads (date excluded)."""
+        target = {**SALES_IMPORT_DTYPES, **self.dtypes}
+        return {source: target[column] for column, source in self.column_map.items() if column in target}
+
+    def rename(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Check the export has every mapped column and rename them to importer names."""
+        missing = [source for source in self.source_columns if source not in df.columns]
+        if missing:
+            raise SalesFileError(f'File does not match import profile "{self.name}": missing column(s) {", ".join(missing)}')
+        return df[self.source_columns].rename(columns={v: k for k, v in self.column_map.items()})
+
+
+def detect_format(filename: str, file_bytes: bytes) -> str | None:
+    """Return 'csv', 'excel', 'parquet' or 'arrow' from the extension, falling back to magic bytes."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(EXCEL_EXTENSIONS):
+        return 'excel'
+    if name.endswith(PARQUET_EXTENSIONS):
+        return 'parquet'
+    if name.endswith(ARROW_EXTENSIONS):
+        return 'arrow'
+    if file_bytes[:4] == PARQUET_MAGIC:
+        return 'parquet'
+    if file_bytes[:6] == ARROW_FILE_MAGIC:
+        return 'arrow'
+    return None
+
+
+def read_sales_file(file_bytes: bytes, filename: str, sheet_name: str | int | None = None,
+                    header_row: int = 0, profile: ImportProfile | None = None) -> pd.DataFrame:
+    """Parse an uploaded sales file into a DataFrame.
+
+    sheet_name: Excel sheet name or 0-based index (default: first sheet)
+    header_row: 0-based row index holding the Excel column headers
+    profile: saved column mapping; only its columns are read (usecols / projection),
+             typed with its dtypes and renamed to the importer's column names
+
+    Raises SalesFileError for unsupported formats or unreadable content.
+    """
+    columns = profile.source_columns if profile else None
+    file_format = detect_format(filename, file_bytes)
+    if file_format == 'csv':
+        df = _read_csv(file_bytes, columns, profile.source_dtypes() if profile else SALES_IMPORT_DTYPES)
+    elif file_format == 'excel':
+        df = _read_excel(file_bytes, filename, sheet_name=sheet_name, header_row=header_row, columns=columns)
+    elif file_format == 'parquet':
+        df = _read_parquet(file_bytes, filename, columns)
+    elif file_format == 'arrow':
+        df = _read_arrow(file_bytes, filename, columns)
+    else:
+        raise SalesFileError('Unsupported file format. Use CSV, Excel, Parquet or Arrow')
+    if profile:
+        return apply_import_schema(profile.rename(df), profile.dtypes)
+    return apply_import_schema(df)
+
+
+def apply_import_schema(df: pd.DataFrame, dtypes: dict | None = None) -> pd.DataFrame:
+    """Cast known import columns to SALES_IMPORT_DTYPES (plus `dtypes` overrides) in place.
+
+    Values that do not convert (text in a numeric column, fractional ids) become
+    missing, as the previous per-row coercion did. Unknown columns are left alone.
+    """
+    for column, dtype in {**SALES_IMPORT_DTYPES, **(dtypes or {})}.items():
+        if column not in df.columns or str(df[column].dtype) == dtype:
+            continue
+        values = df[column]
+        if dtype in ('category', 'string'):
+            df[column] = values.astype(dtype)
+            continue
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            values = pd.to_numeric(values, errors='coerce')
+        if dtype in ('Int32', 'Int64'):
+            # fractional ids are not ids; drop them rather than truncating
+            values = values.where(values.isna() | (values % 1 == 0))
+            values = values.astype('Float64').astype(dtype)
+        df[column] = values.astype(dtype)
+    return df
+
+
+def source_key(branch_id, columns, date_col: str) -> str:
+    """Identity of an export layout: the branch plus the file's column names."""
+    return f'{branch_id}|{date_col}|' + ','.join(str(c) for c in columns)
+
+
+def auto_profile_name(source: str) -> str:
+    """Name of the import profile that stores what was detected for an export layout."""
+    return 'auto-' + hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+
+
+def auto_profile(source: str, branch_id: int, columns, date_col: str, date_format: str,
+                 sheet: str | int | None = None, header_row: int = 0) -> ImportProfile:
+    """Profile for a file imported without one: its importer columns as-is and the detected format."""
+    column_map = {'date': str(date_col)}
+    column_map.update({str(c): str(c) for c in columns if str(c) in PROFILE_COLUMNS and str(c) != 'date'})
+    return ImportProfile.from_dict({
+        'name': auto_profile_name(source), 'branch_id': branch_id, 'column_map': column_map,
+        'date_format': date_format, 'sheet': sheet, 'header_row': header_row,
+    })
+
+
+def remembered_date_format(source: str | None) -> str | None:
+    """Format this process last detected for `source`, if any."""
+    return _source_date_formats.get(source) if source else None
+
+
+def infer_date_format(values: pd.Series, source: str | None = None, remembered: str | None = None) -> str | None:
+    """Explicit strftime format for a date column, detected once on a sample.
+
+    `remembered` (a stored profile's format) or else the format this process last
+    detected for `source` (see `source_key`) is reused while it parses nearly all of
+    the sample (REMEMBERED_FORMAT_MATCH). Otherwise candidates are guessed from the first
+    distinct sample values (month-first and day-first) plus the format last seen for
+    the same digit pattern, and the one that parses the most sample rows wins.
+    The sample is spread evenly over the column. Returns None when nothing parses at
+    least half of it, or the column holds no strings.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return None
+    present = values.dropna()
+    # spread the sample over the file: the first rows are often one day, which
+    # cannot tell month-first from day-first
+    sample = present.iloc[np.linspace(0, len(present) - 1, min(len(present), DATE_FORMAT_SAMPLE)).astype(int)]
+    sample = sample[sample.map(lambda v: isinstance(v, str))].str.strip()
+    if sample.empty:
+        return None
+
+    remembered = remembered or remembered_date_format(source)
+    if remembered and _parse_rate(sample, remembered) >= REMEMBERED_FORMAT_MATCH:
+        _remember_source_format(source, remembered)
+        return remembered
+
+    candidates = []
+    shape_format = _date_formats.get(_DIGITS.sub('9', sample.iloc[0]))
+    if shape_format:
+        candidates.append(shape_format)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        for value in sample.drop_duplicates().head(DATE_GUESS_VALUES):
+            for dayfirst in (False, True):
+                fmt = guess_datetime_format(value, dayfirst=dayfirst)
+                if fmt and fmt not in candidates:
+                    candidates.append(fmt)
+
+    best, best_rate = None, 0.0
+    for fmt in candidates:
+        rate = _parse_rate(sample, fmt)
+        if rate > best_rate:
+            best, best_rate = fmt, rate
+        if rate == 1.0:
+            break
+    if best_rate < MIN_FORMAT_MATCH:
+        logger.info(f'No date format fits the sample (best {best} at {best_rate:.0%}); using per-element parsing')
+        return None
+
+    _date_formats[_DIGITS.sub('9', sample.iloc[0])] = best
+    _remember_source_format(source, best)
+    logger.info(f'Date format for values like {sample.iloc[0]!r}: {best} (fits {best_rate:.0%} of sample)')
+    return best
+
+
+def parse_dates(values: pd.Series, date_format: str | None = None, source: str | None = None) -> pd.Series:
+    """Parse a date column to datetime64.
+
+    Fast path: one vectorized parse with an explicit format (given, or from
+    `infer_date_format`). Slow path: per-element inference, run only on the rows
+    the fast path could not parse (mixed or locale formats in one export).
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if date_format is None:
+        date_format = infer_date_format(values, source)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)  # "could not infer format" noise
+        if date_format is not None:
+            parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+        else:
+            parsed = pd.to_datetime(values, errors='coerce')
+        failed = parsed.isna() & values.notna()
+        if failed.any():
+            logger.info(f'{int(failed.sum())} of {len(values)} dates did not match {date_format or "the inferred format"}; parsing them per element')
+            parsed[failed] = pd.to_datetime(values[failed], format='mixed', errors='coerce')
+    return parsed
+
+
+def _remember_source_format(source: str | None, fmt: str):
+    if not source or _source_date_formats.get(source) == fmt:
+        return
+    if source not in _source_date_formats and len(_source_date_formats) >= MAX_REMEMBERED_SOURCES:
+        _source_date_formats.pop(next(iter(_source_date_formats)))
+    _source_date_formats[source] = fmt
+
+
+def _parse_rate(sample: pd.Series, fmt: str) -> float:
+    return float(pd.to_datetime(sample, format=fmt, errors='coerce').notna().mean())
+
+
+def _read_csv(file_bytes: bytes, columns: list | None = None, dtypes: dict = SALES_IMPORT_DTYPES) -> pd.DataFrame:
+    file_content = BytesIO(file_bytes)
+    # profile reads parse only the mapped columns; a callable tolerates absent ones
+    usecols = (lambda name: name in columns) if columns else None
+    try:
+        # typed read: no object columns to convert afterwards
+        df = pd.read_csv(file_content, dtype=dtypes, usecols=usecols)
+    except (ValueError, TypeError) as e:
+        logger.info(f'Typed CSV read failed ({str(e)}); reading untyped and coercing')
+        file_content.seek(0)
+        df = pd.read_csv(file_content, usecols=usecols)
+    logger.info(f'Read CSV file: {len(df)} rows loaded')
+    return df
+
+
+def _is_import_column(name) -> bool:
+    return str(name).strip() in SALES_IMPORT_COLUMNS
+
+
+def _read_excel_fast(file_bytes: bytes, sheet_name: str | int | None, header_row: int,
+                     columns: list | None = None) -> pd.DataFrame:
+    """Fast Excel path: calamine when installed, else a read-only openpyxl row stream."""
+    if HAS_CALAMINE:
+        usecols = (lambda name: str(name).strip() in columns) if columns else _is_import_column
+        return pd.read_excel(BytesIO(file_bytes), engine='calamine', sheet_name=sheet_name or 0,
+                             header=header_row, usecols=usecols)
+    if file_bytes[:2] != ZIP_MAGIC:
+        raise ValueError('streaming reader only handles .xlsx (ZIP) workbooks')
+    return _stream_xlsx(file_bytes, sheet_name, header_row, columns)
+
+
+def _stream_xlsx(file_bytes: bytes, sheet_name: str | int | None, header_row: int,
+                 columns: list | None = None) -> pd.DataFrame:
+    """Iterate cell values without building the workbook object model.
+
+    Only `columns` (a profile's export columns) or the known import columns are kept
+    (all columns if none of the headers are known); each column is collected as a
+    list of cell values and typed once at the end.
+    """
+    wanted = set(columns) if columns else set(SALES_IMPORT_COLUMNS)
+    workbook = load_workbook(BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, str):
+            worksheet = workbook[sheet_name]
+        else:
+            worksheet = workbook.worksheets[sheet_name or 0]
+        rows = worksheet.iter_rows(min_row=header_row + 1, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+
+        names = [str(h).strip() if h is not None else f'Unnamed: {i}' for i, h in enumerate(header)]
+        keep = [i for i, name in enumerate(names) if name in wanted] or list(range(len(names)))
+        # first occurrence wins for duplicated headers
+        keep = [i for i in keep if names.index(names[i]) == i]
+        values_by_name = {names[i]: [] for i in keep}
+        for row in rows:
+            if not row or all(value is None for value in row):
+                continue  # blank rows are dropped, as pandas does
+            width = len(row)
+            for i in keep:
+                values_by_name[names[i]].append(row[i] if i < width else None)
+    finally:
+        workbook.close()
+
+    return pd.DataFrame({name: pd.Series(values) for name, values in values_by_name.items()})
+
+
+def _read_excel(file_bytes: bytes, filename: str, sheet_name: str | int | None = None,
+                header_row: int = 0, columns: list | None = None) -> pd.DataFrame:
+    # Log file signature to verify it's a valid Excel file
+    if len(file_bytes) >= 4:
+        file_signature = file_bytes[:4].hex()
+        logger.info(f'File signature (first 4 bytes): {file_signature}')
+        # Excel files start with PK (ZIP signature) - 504b0304
+        if file_signature.startswith('504b'):
+            logger.info('File appears to be a valid Excel/ZIP file')
+        else:
+            logger.warning(f'File signature {file_signature} does not match Excel format (expected PK/ZIP)')
+
+    try:
+        df = _read_excel_fast(file_bytes, sheet_name, header_row, columns)
+        if len(df) > 0:
+            logger.info(f'Read Excel file (fast path, calamine={HAS_CALAMINE}): {len(df)} rows, columns {list(df.columns)} from {filename}')
+            return df
+        logger.warning(f'Fast Excel reader returned 0 rows for {filename}; retrying with pandas/openpyxl')
+    except Exception as e:
+        logger.warning(f'Fast Excel reader failed for {filename} ({str(e)}); falling back to pandas/openpyxl')
+
+    # Create a fresh BytesIO from the file bytes so we read the actual uploaded content
+    file_content = BytesIO(file_bytes)
+    usecols = (lambda name: str(name).strip() in columns) if columns else None
+    try:
+        df = pd.read_excel(file_content, engine='openpyxl', sheet_name=sheet_name or 0, header=header_row, usecols=usecols)
+    except Exception as e:
+        logger.error(f'Error reading Excel file with pandas: {str(e)}')
+        logger.error(f'File size: {len(file_bytes)} bytes, File signature: {file_bytes[:4].hex() if len(file_bytes) >= 4 else "N/A"}')
+        raise SalesFileError(f'Failed to read Excel file: {str(e)}')
+
+    logger.info(f'Read Excel file: {len(df)} rows, {len(df.columns)} columns loaded from {filename}')
+    logger.info(f'Excel columns: {list(df.columns)}')
+
+    if len(df) > 0:
+        logger.info(f'Sample row: {df.iloc[0].to_dict()}')
+        return df
+
+    logger.error(f'Excel file {filename} has 0 rows after reading! File size: {len(file_bytes)} bytes')
+    logger.error(f'This might indicate the file is corrupted or was not uploaded correctly')
+    # Try to read it again with different engine as fallback
+    try:
+        file_content.seek(0)
+        df_fallback = pd.read_excel(file_content, engine='xlrd', sheet_name=sheet_name or 0, header=header_row, usecols=usecols)
+    except Exception:
+        raise SalesFileError(f'Excel file appears to be empty or could not be read. File size: {len(file_bytes)} bytes. Please regenerate the file and try again.')
+    if len(df_fallback) > 0:
+        logger.info(f'Fallback engine (xlrd) successfully read {len(df_fallback)} rows')
+        return df_fallback
+    raise SalesFileError(f'Excel file appears to be empty. File size: {len(file_bytes)} bytes. Please check the file and try again.')
+
+
+def _require_pyarrow(kind: str):
+    if pa is None:
+        raise SalesFileError(f'{kind} uploads require the pyarrow package on the analytics server')
+
+
+def _projected_columns(schema_names, columns: list | None = None) -> list:
+    """Known import columns (or a profile's `columns`) present in a columnar file's schema."""
+    wanted = set(columns) if columns else set(SALES_IMPORT_COLUMNS)
+    return [name for name in schema_names if name in wanted]
+
+
+def _table_to_frame(table, filename: str, kind: str) -> pd.DataFrame:
+    df = table.to_pandas()
+    logger.info(f'Read {kind} file: {len(df)} rows, columns {list(df.columns)} from {filename}')
+    return df
+
+
+def _read_parquet(file_bytes: bytes, filename: str, columns: list | None = None) -> pd.DataFrame:
+    _require_pyarrow('Parquet')
+    try:
+        parquet_file = pa_parquet.ParquetFile(pa.BufferReader(file_bytes))
+        projected = _projected_columns(parquet_file.schema_arrow.names, columns)
+        table = parquet_file.read(columns=projected or None)
+    except Exception as e:
+        logger.error(f'Error reading Parquet file {filename}: {str(e)}')
+        raise SalesFileError(f'Failed to read Parquet file: {str(e)}')
+    return _table_to_frame(table, filename, 'Parquet')
+
+
+def _read_arrow(file_bytes: bytes, filename: str, columns: list | None = None) -> pd.DataFrame:
+    _require_pyarrow('Arrow')
+    buffer = pa.BufferReader(file_bytes)
+    try:
+        if file_bytes[:6] == ARROW_FILE_MAGIC:
+            # Arrow IPC file / Feather v2: projection happens inside the reader
+            schema_names = pa_ipc.open_file(buffer).schema.names
+            table = pa_feather.read_table(pa.BufferReader(file_bytes), columns=_projected_columns(schema_names, columns) or None)
+        else:
+            # Arrow IPC stream: batches must be read in full, then projected
+            table = pa_ipc.open_stream(buffer).read_all()
+            projected = _projected_columns(table.schema.names, columns)
+            if projected:
+                table = table.select(projected)
+    except Exception as e:
+        logger.error(f'Error reading Arrow file {filename}: {str(e)}')
+        raise SalesFileError(f'Failed to read Arrow file: {str(e)}')
+    return _table_to_frame(table, filename, 'Arrow')
@@ -0,0 +1,339 @@
+"""Request-scoped instrumentation: per-stage wall time, row counts and DB round trips.
+
+A StageTimer is activated for the current request (contextvars, so each worker
+thread sees its own). db.py reports every psycopg2 `execute` and every Supabase
+`.execute()` HTTP call to the active timer; pipeline code marks stages with
+`StageTimer.begin` (sequential stages) or `stage()` (nested blocks). When no timer
+is active the hooks only do a context-variable lookup.
+
+The same hooks feed a per-request QueryLog that counts SQL queries and HTTP calls
+by structural signature (literals stripped), to flag N+1 loops.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import psycopg2.extensions
+
+# Handle both relative and absolute imports
+try:
+    from . import metrics
+except ImportError:
+    import metrics
+
+logger = logging.getLogger(__name__)
+# Stage breakdowns are emitted on their own logger so they can be shipped as metrics
+metrics_logger = logging.getLogger('analytics.metrics')
+
+_current_timer = contextvars.ContextVar('analytics_stage_timer', default=None)
+_current_query_log = contextvars.ContextVar('analytics_query_log', default=None)
+# Callables notified when a timer's innermost stage changes (memory profiling harness)
+_stage_observers = []
+
+# More structurally identical queries than this in one request logs an N+1 warning
+try:
+    REPEATED_QUERY_THRESHOLD = int(os.getenv('ANALYTICS_REPEATED_QUERY_THRESHOLD') or 10)
+except ValueError:
+    REPEATED_QUERY_THRESHOLD = 10
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?')
+_SQL_LIST = re.compile(r'\(\s*(?:\?\s*,\s*)+\?\s*\)')
+_SQL_ROWS = re.compile(r'(\((?:\?|\?, \.\.\.)\))(?:\s*,\s*\1)+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@functools.lru_cache(maxsize=512)
+def sql_signature(query: str) -> str:
+    """Structure of a statement: literals become ?, IN lists and VALUES rows collapse."""
+    signature = _SQL_STRING.sub('?', query)
+    signature = _SQL_NUMBER.sub('?', signature)
+    signature = _WHITESPACE.sub(' ', signature).strip()
+    signature = _SQL_LIST.sub('(?, ...)', signature)
+    return _SQL_ROWS.sub(r'\1, ...', signature)
+
+
+class StageTimer:
+    """Accumulates wall time, rows and DB round trips per named stage.
+
+    Stages nest; time and round trips are attributed to the innermost open stage
+    only, so 'insert' does not include the 'deduct' work it triggers. A stage that
+    is entered several times (e.g. a lookup inside a loop) accumulates.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.round_trips = 0
+        self._stack = []  # [name, started_at, seconds spent in child stages]
+        self._sequential = None
+        self._started = time.perf_counter()
+
+    def _entry(self, name: str) -> dict:
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'ms': 0.0, 'rows': None, 'db_round_trips': 0}
+        return entry
+
+    def _open(self, name: str) -> list:
+        self._entry(name)
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        self._notify()
+        return frame
+
+    def _close(self, frame: list):
+        # Close anything still open above `frame` first (an exception skipped its exit)
+        while self._stack:
+            top = self._stack.pop()
+            elapsed = time.perf_counter() - top[1]
+            self.stages[top[0]]['ms'] += (elapsed - top[2]) * 1000
+            if self._stack:
+                self._stack[-1][2] += elapsed
+            if top is frame:
+                break
+        self._notify()
+
+    def _notify(self):
+        if _stage_observers:
+            current = self._stack[-1][0] if self._stack else None
+            for observer in list(_stage_observers):
+                observer(self, current)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a nested block as `name`."""
+        frame = self._open(name)
+        try:
+            yield self.stages[name]
+        finally:
+            self._close(frame)
+
+    def begin(self, name: str):
+        """Start the next sequential stage, ending the previous one."""
+        self.end()
+        self._sequential = self._open(name)
+
+    def end(self):
+        """End the current sequential stage, if any."""
+        if self._sequential is not None:
+            self._close(self._sequential)
+            self._sequential = None
+
+    def add_rows(self, name: str, rows: int):
+        entry = self._entry(name)
+        entry['rows'] = (entry['rows'] or 0) + int(rows)
+
+    def record_round_trip(self):
+        self.round_trips += 1
+        if self._stack:
+            self.stages[self._stack[-1][0]]['db_round_trips'] += 1
+
+    def as_dict(self) -> dict:
+        return {
+            'total_ms': round((time.perf_counter() - self._started) * 1000, 2),
+            'db_round_trips': self.round_trips,
+            # a list keeps pipeline order (jsonify sorts object keys)
+            'stages': [
+                {'stage': name, 'ms': round(entry['ms'], 2), 'rows': entry['rows'], 'db_round_trips': entry['db_round_trips']}
+                for name, entry in self.stages.items()
+            ]
+        }
+
+    def emit(self, event: str, **labels):
+        """Log the breakdown as one JSON metrics record on the `analytics.metrics` logger."""
+        metrics_logger.info('%s %s', event, json.dumps({**labels, **self.as_dict()}, default=str))
+
+
+class QueryLog:
+    """SQL statements and Supabase HTTP calls issued while handling one request."""
+
+    def __init__(self, threshold: int = None):
+        self.threshold = REPEATED_QUERY_THRESHOLD if threshold is None else threshold
+        self.counts = {'sql': 0, 'http': 0}
+        self.signatures = Counter()
+
+    def record(self, kind: str, signature: str):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.signatures[(kind, signature)] += 1
+
+    def repeated(self) -> list:
+        """Signatures issued more than `threshold` times, most frequent first."""
+        return [
+            {'kind': kind, 'signature': signature, 'count': count}
+            for (kind, signature), count in self.signatures.most_common()
+            if count > self.threshold
+        ]
+
+    def warn_repeated(self, context: str):
+        for item in self.repeated():
+            logger.warning(f'Possible N+1 in {context}: {item["count"]} x {item["kind"]} {item["signature"][:300]}')
+
+    def as_dict(self) -> dict:
+        return {
+            'sql_queries': self.counts.get('sql', 0),
+            'http_calls': self.counts.get('http', 0),
+            'distinct_queries': len(self.signatures),
+            'repeated_query_threshold': self.threshold,
+            'repeated_queries': self.repeated(),
+        }
+
+
+def activate_query_log(query_log: QueryLog):
+    """Make `query_log` record this context's queries; pass the token to `deactivate_query_log`."""
+    return _current_query_log.set(query_log)
+
+
+def deactivate_query_log(token):
+    _current_query_log.reset(token)
+
+
+def current_query_log() -> QueryLog | None:
+    return _current_query_log.get()
+
+
+def add_stage_observer(observer):
+    """Call `observer(timer, stage)` whenever a timer's innermost stage changes (stage is None
+    between stages). Intended for offline harnesses; production code registers none."""
+    _stage_observers.append(observer)
+
+
+def remove_stage_observer(observer):
+    if observer in _stage_observers:
+        _stage_observers.remove(observer)
+
+
+def activate(timer: StageTimer):
+    """Make `timer` the active timer for this context; pass the token to `deactivate`."""
+    return _current_timer.set(timer)
+
+
+def deactivate(token):
+    _current_timer.reset(token)
+
+
+def current_timer() -> StageTimer | None:
+    return _current_timer.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block on the active timer; no-op when nothing is being timed."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield None
+        return
+    with timer.stage(name) as entry:
+        yield entry
+
+
+def record_rows(name: str, rows: int):
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add_rows(name, rows)
+
+
+def record_round_trip(kind: str = 'sql', signature: str = ''):
+    """Report one SQL statement or HTTP call to the active timer and query log."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.record_round_trip()
+    query_log = _current_query_log.get()
+    if query_log is not None:
+        query_log.record(kind, signature)
+
+
+def _tracking_active() -> bool:
+    return _current_timer.get() is not None or _current_query_log.get() is not None
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor that reports each statement sent to the server."""
+
+    def execute(self, query, vars=None):
+        if _tracking_active():
+            record_round_trip('sql', _query_signature(query))
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        # psycopg2 sends one statement per parameter set
+        vars_list = list(vars_list)
+        if _tracking_active():
+            signature = _query_signature(query)
+            for _ in vars_list:
+                record_round_trip('sql', signature)
+        return super().executemany(query, vars_list)
+
+
+def _query_signature(query) -> str:
+    if isinstance(query, bytes):
+        # execute_values sends pre-rendered bytes; only the statement head is structural
+        query = query[:2000].decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = str(query)  # psycopg2.sql.Composed
+    return sql_signature(query)
+
+
+class TrackedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection using CountingCursor that keeps the open-connection gauges current."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingCursor
+        self._tracked_open = True
+        metrics.DB_CONNECTIONS_OPENED.inc()
+        metrics.DB_CONNECTIONS_OPEN.inc()
+
+    def close(self):
+        if self._tracked_open:
+            self._tracked_open = False
+            metrics.DB_CONNECTIONS_OPEN.dec()
+        return super().close()
+
+
+class _SupabaseCallCounter:
+    """Proxy over a Supabase client or query builder that reports each `.execute()` call.
+
+    The chain of builder calls is kept as the call's signature, e.g.
+    `table(centralized_product).select.eq.eq`; filter values are left out.
+    """
+
+    __slots__ = ('_target', '_path')
+
+    def __init__(self, target, path: tuple = ()):
+        self._target = target
+        self._path = path
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            # e.g. builder.not_ returns another builder
+            return _SupabaseCallCounter(attr, self._path + (name,)) if hasattr(attr, 'execute') else attr
+        if name == 'execute':
+            def execute(*args, **kwargs):
+                record_round_trip('http', '.'.join(self._path))
+                return attr(*args, **kwargs)
+            return execute
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, 'execute') or hasattr(result, 'select'):
+                step = f'{name}({args[0]})' if name in ('table', 'from_', 'rpc') and args else name
+                return _SupabaseCallCounter(result, self._path + (step,))
+            return result
+        return call
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._target!r})'
+
+
+def count_supabase_calls(client):
+    """Wrap a Supabase client so its HTTP calls are counted; None passes through."""
+    if client is None:
+        return None
+    return _SupabaseCallCounter(client)
@@ -0,0 +1,194 @@
+"""In-process metrics registry rendered in the Prometheus text format at `/metrics`.
+
+Counters, gauges and fixed-bucket histograms guarded by one lock; an observation
+is a dict lookup plus a bisect, cheap enough to leave on in production. Values are
+per process: under gunicorn each worker exposes its own series.
+"""
+import bisect
+import threading
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_registry = []
+
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames: tuple, key: tuple, extra: str = '') -> str:
+    parts = []
+    for name, value in zip(labelnames, key):
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _header(self) -> list:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> list:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._values.get(key)
+            if series is None:
+                # per-bucket (non-cumulative) counts, then sum and count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = self._header()
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+# HTTP
+HTTP_REQUESTS = Counter('analytics_http_requests_total', 'HTTP requests handled',
+                        ('method', 'route', 'status'))
+HTTP_REQUEST_SECONDS = Histogram('analytics_http_request_duration_seconds', 'HTTP request latency',
+                                 ('method', 'route'))
+
+# db.py helpers
+DB_CALL_SECONDS = Histogram('analytics_db_call_duration_seconds', 'Latency of db.py helper calls',
+                            ('function', 'backend'))
+DB_CALL_ERRORS = Counter('analytics_db_call_errors_total', 'db.py helper calls that raised',
+                         ('function', 'backend'))
+DB_CONNECTIONS_OPEN = Gauge('analytics_db_connections_open', 'psycopg2 connections currently open')
+DB_CONNECTIONS_OPENED = Counter('analytics_db_connections_opened_total', 'psycopg2 connections opened')
+DB_CONNECTIONS_MAX = Gauge('analytics_db_connections_max', 'Configured connection limit (ANALYTICS_DB_MAX_CONNECTIONS)')
+DB_CONNECTION_SATURATION = Gauge('analytics_db_connection_saturation', 'Open connections / configured limit')
+
+# Sales imports
+IMPORT_ROWS = Counter('analytics_import_rows_total', 'Sales rows processed by imports')
+IMPORT_SECONDS = Histogram('analytics_import_duration_seconds', 'End-to-end sales import time',
+                           buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+IMPORT_ROWS_PER_SECOND = Gauge('analytics_import_rows_per_second', 'Throughput of the most recent import')
+IMPORT_STAGE_SECONDS = Histogram('analytics_import_stage_duration_seconds', 'Time per sales import stage',
+                                 ('stage',))
+IMPORT_STAGE_ROUND_TRIPS = Counter('analytics_import_stage_db_round_trips_total', 'DB round trips per import stage',
+                                   ('stage',))
+
+# Caches
+CACHE_REQUESTS = Counter('analytics_cache_requests_total', 'Cache lookups', ('cache', 'result'))
+CACHE_HIT_RATIO = Gauge('analytics_cache_hit_ratio', 'Hits / lookups since process start', ('cache',))
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_import(rows: int, seconds: float, stages: list = ()):
+    """Feed one finished import (and its StageTimer stages) into the import series."""
+    IMPORT_ROWS.inc(rows)
+    IMPORT_SECONDS.observe(seconds)
+    if seconds > 0:
+        IMPORT_ROWS_PER_SECOND.set(round(rows / seconds, 2))
+    for entry in stages:
+        IMPORT_STAGE_SECONDS.observe(entry['ms'] / 1000, stage=entry['stage'])
+        IMPORT_STAGE_ROUND_TRIPS.inc(entry['db_round_trips'], stage=entry['stage'])
+
+
+def set_connection_limit(limit: int | None):
+    if limit:
+        DB_CONNECTIONS_MAX.set(limit)
+
+
+def _refresh_derived():
+    """Ratios are computed at scrape time rather than on every observation."""
+    with _lock:
+        caches = {key[0] for key in CACHE_REQUESTS._values}
+    for cache in caches:
+        hits = CACHE_REQUESTS.value(cache=cache, result='hit')
+        total = hits + CACHE_REQUESTS.value(cache=cache, result='miss')
+        if total:
+            CACHE_HIT_RATIO.set(round(hits / total, 4), cache=cache)
+    limit = DB_CONNECTIONS_MAX.value()
+    if limit:
+        DB_CONNECTION_SATURATION.set(round(DB_CONNECTIONS_OPEN.value() / limit, 4))
+
+
+def render() -> str:
+    """Prometheus text exposition (format 0.0.4) of every registered metric."""
+    _refresh_derived()
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
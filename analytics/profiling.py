@@ -0,0 +1,137 @@
+"""Opt-in cProfile capture for slow requests.
+
+Disabled unless ANALYTICS_PROFILING is set; `profiled` then returns the view
+unchanged, so there is no per-request cost. When enabled, a request is profiled
+if it sends `X-Analytics-Profile: 1` or wins the ANALYTICS_PROFILE_SAMPLE_RATE
+draw. Each profile is written to ANALYTICS_PROFILE_DIR under a profile id made of
+the (sanitized) X-Request-ID, a UTC timestamp and a random suffix, so requests that
+reuse a request id never overwrite each other:
+
+- `<profile_id>.prof`: raw pstats dump (snakeviz, flameprof, gprof2dot)
+- `<profile_id>.txt`: cumulative-time listing with callees, readable as a call tree
+
+Only the newest ANALYTICS_PROFILE_MAX_FILES profiles (default 200) are kept.
+
+The db.py helpers run inside the profiled view, so they appear in its call tree.
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pathlib
+import pstats
+import random
+import re
+import uuid
+from datetime import datetime
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = (os.getenv('ANALYTICS_PROFILING') or '').strip().lower() in ('1', 'true', 'yes', 'on')
+PROFILE_HEADER = 'X-Analytics-Profile'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+try:
+    SAMPLE_RATE = float(os.getenv('ANALYTICS_PROFILE_SAMPLE_RATE') or 0)
+except ValueError:
+    logger.warning('Ignoring non-numeric ANALYTICS_PROFILE_SAMPLE_RATE')
+    SAMPLE_RATE = 0.0
+
+try:
+    MAX_PROFILES = int(os.getenv('ANALYTICS_PROFILE_MAX_FILES') or 200)
+except ValueError:
+    logger.warning('Ignoring non-numeric ANALYTICS_PROFILE_MAX_FILES')
+    MAX_PROFILES = 200
+
+PROFILE_DIR = pathlib.Path(os.getenv('ANALYTICS_PROFILE_DIR') or pathlib.Path(__file__).parent / 'profiles')
+
+# Rows of the text report; the .prof file always has everything
+REPORT_LIMIT = 80
+
+
+def _should_profile() -> bool:
+    if request.headers.get(PROFILE_HEADER, '').strip().lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _profile_id() -> str:
+    """Unique, filename-safe profile id: `[<X-Request-ID>-]<UTC timestamp>-<random hex>`."""
+    supplied = re.sub(r'[^A-Za-z0-9_-]', '_', request.headers.get(REQUEST_ID_HEADER, ''))[:64]
+    unique = f'{datetime.utcnow():%Y%m%dT%H%M%S%fZ}-{uuid.uuid4().hex[:8]}'
+    return f'{supplied}-{unique}' if supplied else unique
+
+
+def save_profile(profiler: cProfile.Profile, profile_id: str, label: str) -> pathlib.Path:
+    """Write `<profile_id>.prof` and `<profile_id>.txt` under PROFILE_DIR; returns the .prof path."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    prof_path = PROFILE_DIR / f'{profile_id}.prof'
+    profiler.dump_stats(str(prof_path))
+
+    report = io.StringIO()
+    report.write(f'# {label} profile_id={profile_id}\n')
+    stats = pstats.Stats(profiler, stream=report).strip_dirs().sort_stats('cumulative')
+    stats.print_stats(REPORT_LIMIT)
+    stats.print_callees(REPORT_LIMIT)
+    (PROFILE_DIR / f'{profile_id}.txt').write_text(report.getvalue())
+    prune_profiles()
+    return prof_path
+
+
+def prune_profiles(max_profiles: int | None = None):
+    """Delete the oldest profiles (.prof and .txt together) beyond `max_profiles` (MAX_PROFILES)."""
+    keep = MAX_PROFILES if max_profiles is None else max_profiles
+    if keep <= 0:
+        return
+    stems = {}
+    for path in PROFILE_DIR.glob('*.prof'):
+        try:
+            stems[path.stem] = path.stat().st_mtime
+        except OSError:
+            continue  # removed by a concurrent prune
+    for stem in sorted(stems, key=lambda name: (stems[name], name))[:-keep]:
+        for suffix in ('.prof', '.txt'):
+            (PROFILE_DIR / f'{stem}{suffix}').unlink(missing_ok=True)
+
+
+def profiled(label: str):
+    """Decorate a Flask view so sampled/opted-in requests are run under cProfile."""
+    def decorator(view):
+        if not PROFILING_ENABLED:
+            return view
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _should_profile():
+                return view(*args, **kwargs)
+            profile_id = _profile_id()
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # another profiler is already active in this thread
+                return view(*args, **kwargs)
+            try:
+                result = view(*args, **kwargs)
+            finally:
+                profiler.disable()
+                try:
+                    path = save_profile(profiler, profile_id, label)
+                    logger.info(f'Saved {label} profile {profile_id} to {path}')
+                except Exception:
+                    logger.exception('Failed to save profile %s', profile_id)
+            return _tag_response(result, profile_id)
+        return wrapper
+    return decorator
+
+
+def _tag_response(result, profile_id: str):
+    """Add the profile id header to a view result (Response or (body, status) tuple)."""
+    response, *rest = result if isinstance(result, tuple) else (result,)
+    headers = getattr(response, 'headers', None)
+    if headers is not None:
+        headers['X-Analytics-Profile-Id'] = profile_id
+    return result
@@ -0,0 +1,73 @@
+"""Purchase order drafts: one consolidated order per branch from stock and EOQ results.
+
+Every product at or below its reorder point gets a line sized by its EOQ and rounded
+up to whole supplier packs (`centralized_product.pack_size`). Positions for all
+branches come from one `db.fetch_inventory_positions` query, the lines are computed
+with `InventoryAnalytics.draft_purchase_orders` in one vectorized pass, and
+`db.save_purchase_order_drafts` stores every branch's draft in three statements, so
+the nightly run over all branches costs the same handful of round trips as one branch.
+"""
+import logging
+import time
+from datetime import datetime
+
+import pandas as pd
+
+# Handle both relative and absolute imports
+try:
+    from . import db as db_module
+    from .eoq_calculator import InventoryAnalytics
+except ImportError:
+    import db as db_module
+    from eoq_calculator import InventoryAnalytics
+
+logger = logging.getLogger(__name__)
+
+
+def consolidate(lines: pd.DataFrame, branch_ids=()) -> list:
+    """Group order lines into one draft per branch, most expensive line first.
+
+    branch_ids: branches that should get a (possibly empty) draft even without lines.
+    Returns [{'branch_id', 'line_count', 'total_units', 'total_cost', 'items'}] by branch_id.
+    """
+    lines = lines.sort_values(['branch_id', 'line_cost', 'product_id'], ascending=[True, False, True],
+                              na_position='last', kind='stable')
+    items = lines.drop(columns='branch_id').astype(object).where(lines.drop(columns='branch_id').notna(), None)
+    grouped = {int(branch): frame for branch, frame in items.groupby(lines['branch_id'], sort=True)}
+    drafts = []
+    for branch in sorted(set(grouped) | {int(b) for b in branch_ids}):
+        frame = grouped.get(branch, items.iloc[0:0])
+        drafts.append({
+            'branch_id': branch,
+            'line_count': len(frame),
+            'total_units': float(pd.to_numeric(frame['order_quantity']).sum()),
+            'total_cost': round(float(pd.to_numeric(frame['line_cost']).fillna(0).sum()), 2),
+            'items': frame.to_dict('records'),
+        })
+    return drafts
+
+
+def generate_drafts(branch_id: int | None = None, persist: bool = True, draft_date=None, conn=None) -> dict:
+    """Build (and optionally store) today's purchase order drafts for one branch or all.
+
+    Returns {'draft_date', 'drafts', 'draft_ids', 'elapsed_ms'}; draft_ids is empty
+    when persist is False. Branches without due products still get an empty draft
+    when persisted, replacing any earlier draft of the same day.
+    """
+    started = time.perf_counter()
+    draft_date = draft_date or datetime.utcnow().date()
+    positions = pd.DataFrame(db_module.fetch_inventory_positions(branch_id=branch_id, conn=conn),
+                             columns=db_module.INVENTORY_POSITION_FIELDS)
+    lines = InventoryAnalytics.draft_purchase_orders(positions)
+    branches = positions['branch_id'].dropna().astype('int64').unique() if branch_id is None else [branch_id]
+    drafts = consolidate(lines, branch_ids=branches)
+
+    draft_ids = {}
+    if persist and drafts:
+        draft_ids = db_module.save_purchase_order_drafts(drafts, draft_date=draft_date, conn=conn)
+        for draft in drafts:
+            draft['draft_id'] = draft_ids.get(draft['branch_id'])
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f'Drafted purchase orders for {len(drafts)} branches: {len(lines)} lines from '
+                f'{len(positions)} products in {elapsed_ms} ms')
+    return {'draft_date': draft_date, 'drafts': drafts, 'draft_ids': draft_ids, 'elapsed_ms': elapsed_ms}
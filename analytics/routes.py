@@ -1,17 +1,35 @@
 from flask import Blueprint, request, jsonify
+from dataclasses import replace
 from datetime import datetime, timedelta
 import logging
+import os
+import numpy as np
 import pandas as pd
 from io import BytesIO
+import hashlib
 import uuid
 
 # Handle both relative and absolute imports
 try:
     from .eoq_calculator import EOQCalculator, EOQInput, DemandForecaster, InventoryAnalytics
+    from . import catalog
+    from .cache import TTLCache
     from . import db as db_module
+    from . import ingest
+    from . import instrumentation
+    from . import metrics
+    from . import profiling
+    from . import purchase_orders
 except ImportError:
     from eoq_calculator import EOQCalculator, EOQInput, DemandForecaster, InventoryAnalytics
+    import catalog
+    from cache import TTLCache
     import db as db_module
+    import ingest
+    import instrumentation
+    import metrics
+    import profiling
+    import purchase_orders
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +74,77 @@ class Database:
 db = Database()
 
 
+def _request_branch_id(default: int = 1) -> int:
+    """Branch an upload belongs to: form field, then JSON body, then `default`."""
+    json_payload = request.get_json(silent=True)
+    candidates = [request.form.get('branch_id'), json_payload.get('branch_id') if json_payload else None]
+    for value in candidates:
+        if value:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                continue
+    return default
+
+
+def _request_flag(name: str) -> bool:
+    """Read a boolean flag from form data or the query string ('1', 'true', 'yes', 'on')."""
+    value = request.form.get(name) or request.args.get(name)
+    return bool(value) and str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _json_records(frame: pd.DataFrame) -> list:
+    """DataFrame rows as JSON-safe dicts: NaN/NaT/inf become None, dates ISO strings."""
+    frame = frame.replace([np.inf, -np.inf], np.nan)
+    frame = frame.astype(object).where(frame.notna(), None)
+    for column in frame.columns:
+        if frame[column].map(lambda v: hasattr(v, 'isoformat')).any():
+            frame[column] = frame[column].map(lambda v: v.isoformat() if hasattr(v, 'isoformat') else v)
+    return frame.to_dict('records')
+
+
+# Fuzzy-matched names listed in an import's product_matching, least confident first
+MAX_FUZZY_MATCH_REPORT = 100
+
+
+def _fuzzy_match_report(names: pd.Series, resolved: pd.DataFrame) -> list:
+    """One entry per distinct file name that resolved fuzzily, so the mapping can be reviewed.
+
+    Each entry: name (as in the file), product_id, branch_id, matched_name, score, rows.
+    """
+    fuzzy = (resolved['match'] == 'fuzzy').fillna(False).to_numpy()
+    if not fuzzy.any():
+        return []
+    matches = resolved.loc[fuzzy, ['product_id', 'branch_id', 'matched_name', 'score']].copy()
+    matches.insert(0, 'name', names.astype('string').to_numpy()[fuzzy])
+    report = (matches.groupby(['name', 'branch_id'], sort=False, observed=True)
+              .agg(product_id=('product_id', 'first'), matched_name=('matched_name', 'first'),
+                   score=('score', 'first'), rows=('product_id', 'size'))
+              .reset_index()
+              .sort_values(['score', 'name'], kind='stable')
+              .head(MAX_FUZZY_MATCH_REPORT))
+    report['score'] = report['score'].round(3)
+    return _json_records(report[['name', 'product_id', 'branch_id', 'matched_name', 'score', 'rows']])
+
+
+def _price_break_table(entries) -> list:
+    """[(min_quantity, unit_cost)] from a request's price breaks (dicts or pairs)."""
+    table = []
+    for entry in entries or []:
+        if isinstance(entry, dict):
+            entry = (entry.get('min_quantity', 0), entry.get('unit_cost'))
+        if not isinstance(entry, (list, tuple)) or len(entry) < 2 or entry[1] is None:
+            raise ValueError(f'Each price break needs a min_quantity and a unit_cost, got {entry!r}')
+        try:
+            min_quantity, unit_cost = float(entry[0] or 0), float(entry[1])
+        except (TypeError, ValueError):
+            raise ValueError(f'Price break values must be numbers, got {entry!r}') from None
+        if min_quantity < 0 or unit_cost < 0:
+            raise ValueError('Price breaks cannot be negative')
+        table.append((min_quantity, unit_cost))
+    return table
+
+
 @analytics_bp.route('/eoq/calculate', methods=['POST'])
 def calculate_eoq():
     """Calculate EOQ for a product"""
@@ -81,6 +170,23 @@ def calculate_eoq():
         
         # Calculate EOQ
         result = EOQCalculator.calculate_eoq(eoq_input)
+
+        # With supplier price breaks, order at the cheapest break and cost the EOQ at its price
+        discount = None
+        if data.get('price_breaks'):
+            quantities, prices = EOQCalculator.price_break_matrix([_price_break_table(data['price_breaks'])])
+            rate = data.get('holding_cost_percentage')
+            discount = EOQCalculator.quantity_discount_eoq(
+                [eoq_input.annual_demand], [eoq_input.ordering_cost], quantities, prices,
+                holding_rate=float(rate) if rate is not None else 0.25,
+                holding_cost=None if rate is not None else [eoq_input.holding_cost],
+            ).iloc[0]
+            if pd.isna(discount['eoq_quantity']):
+                raise ValueError('price_breaks has no usable break')
+            eoq_input = replace(eoq_input, unit_cost=float(discount['unit_cost']),
+                                holding_cost=float(discount['holding_cost']))
+            result = EOQCalculator.with_order_quantity(EOQCalculator.calculate_eoq(eoq_input), eoq_input,
+                                                       float(discount['eoq_quantity']))
         
         # Store in both mock database and persistent database
         product_id = data.get('product_id')
@@ -93,9 +199,9 @@ def calculate_eoq():
             try:
                 result_dict = {
                     'annual_demand': float(data.get('annual_demand', 0)),
-                    'holding_cost': float(data.get('holding_cost', 50)),
+                    'holding_cost': eoq_input.holding_cost,
                     'ordering_cost': float(data.get('ordering_cost', 100)),
-                    'unit_cost': float(data.get('unit_cost', 0)),
+                    'unit_cost': eoq_input.unit_cost,
                     'eoq_quantity': result.eoq_quantity,
                     'reorder_point': result.reorder_point,
                     'safety_stock': result.safety_stock,
@@ -116,19 +222,28 @@ def calculate_eoq():
         
         logger.info(f'EOQ calculated for product {product_id}, branch {branch_id}')
         
+        response_data = {
+            'eoq_quantity': result.eoq_quantity,
+            'reorder_point': result.reorder_point,
+            'safety_stock': result.safety_stock,
+            'annual_holding_cost': result.annual_holding_cost,
+            'annual_ordering_cost': result.annual_ordering_cost,
+            'total_annual_cost': result.total_annual_cost,
+            'max_stock_level': result.max_stock_level,
+            'min_stock_level': result.min_stock_level,
+            'average_inventory': result.average_inventory
+        }
+        if discount is not None:
+            response_data['quantity_discount'] = {
+                'unit_cost': float(discount['unit_cost']),
+                'price_break': float(discount['price_break']),
+                'annual_purchase_cost': float(discount['annual_purchase_cost']),
+                'total_annual_cost': float(discount['total_annual_cost']),
+                'discount_savings': float(discount['discount_savings']),
+            }
         return jsonify({
             'success': True,
-            'data': {
-                'eoq_quantity': result.eoq_quantity,
-                'reorder_point': result.reorder_point,
-                'safety_stock': result.safety_stock,
-                'annual_holding_cost': result.annual_holding_cost,
-                'annual_ordering_cost': result.annual_ordering_cost,
-                'total_annual_cost': result.total_annual_cost,
-                'max_stock_level': result.max_stock_level,
-                'min_stock_level': result.min_stock_level,
-                'average_inventory': result.average_inventory
-            }
+            'data': response_data
         }), 200
     
     except ValueError as e:
@@ -139,6 +254,178 @@ def calculate_eoq():
         return jsonify({'success': False, 'error': 'Failed to calculate EOQ'}), 500
 
 
+EOQ_ITEM_FIELDS = ('product_id', 'product_name', 'annual_demand', 'unit_cost', 'holding_cost', 'ordering_cost')
+
+
+def _eoq_items(data: dict, extra_fields=(), default_holding=True) -> pd.DataFrame:
+    """Per-product EOQ inputs of a batch request, one row per product.
+
+    Either `products` (a list of dicts with EOQ_ITEM_FIELDS and `extra_fields`) or a
+    `branch_id`, in which case every product of the branch with a positive annual
+    demand in its latest eoq_calculations row is used. Missing holding costs default
+    to unit_cost × holding_cost_percentage (0.25) and ordering costs to
+    `ordering_cost` (50); with default_holding=False missing holding costs stay NaN.
+    Raises ValueError when neither is given.
+    """
+    holding_rate = float(data.get('holding_cost_percentage', 0.25))
+    default_ordering = float(data.get('ordering_cost', 50))
+    columns = list(EOQ_ITEM_FIELDS) + list(extra_fields)
+    if data.get('products'):
+        items = pd.DataFrame(list(data['products'])).reindex(columns=columns)
+    elif data.get('branch_id') is not None:
+        positions = pd.DataFrame(db_module.fetch_inventory_positions(branch_id=int(data['branch_id'])),
+                                 columns=db_module.INVENTORY_POSITION_FIELDS)
+        positions['unit_cost'] = positions['unit_cost'].where(positions['unit_cost'].notna(), positions['price'])
+        items = positions.reindex(columns=columns)
+    else:
+        raise ValueError('Provide either products or branch_id')
+
+    numeric = ['annual_demand', 'unit_cost', 'holding_cost', 'ordering_cost']
+    items[numeric] = items[numeric].apply(pd.to_numeric, errors='coerce').astype('float64')
+    items['holding_cost'] = items['holding_cost'].where(
+        items['holding_cost'] > 0, items['unit_cost'] * holding_rate if default_holding else np.nan)
+    items['ordering_cost'] = items['ordering_cost'].fillna(default_ordering)
+    if not data.get('products'):
+        items = items[items['annual_demand'] > 0]
+    return items.reset_index(drop=True)
+
+
+@analytics_bp.route('/eoq/constrained', methods=['POST'])
+def calculate_constrained_eoq():
+    """EOQ for many products at once under a shared budget and/or storage capacity.
+
+    Body: products or branch_id (see _eoq_items; products may carry unit_volume),
+    budget (max Σ unit_cost × quantity), capacity (max Σ unit_volume × quantity,
+    unit_volume defaulting to 1), holding_cost_percentage, ordering_cost.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        budget = float(data['budget']) if data.get('budget') is not None else None
+        capacity = float(data['capacity']) if data.get('capacity') is not None else None
+        items = _eoq_items(data, extra_fields=('unit_volume',))
+        result = EOQCalculator.constrained_eoq(
+            items['annual_demand'], items['ordering_cost'], items['holding_cost'],
+            unit_cost=items['unit_cost'], unit_volume=pd.to_numeric(items['unit_volume'], errors='coerce'),
+            budget=budget, capacity=capacity,
+        )
+    except (TypeError, ValueError) as e:
+        logger.error(f'Validation error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f'Error calculating constrained EOQ: {str(e)}')
+        return jsonify({'success': False, 'error': 'Failed to calculate constrained EOQ'}), 500
+
+    attrs = result.attrs
+    return jsonify({
+        'success': True,
+        'summary': {
+            'products': len(result),
+            'budget': budget,
+            'budget_used': round(attrs['budget_used'], 2),
+            'unconstrained_budget': round(attrs['unconstrained_budget'], 2),
+            'capacity': capacity,
+            'capacity_used': round(attrs['capacity_used'], 2),
+            'unconstrained_capacity': round(attrs['unconstrained_capacity'], 2),
+            'budget_multiplier': attrs['budget_multiplier'],
+            'capacity_multiplier': attrs['capacity_multiplier'],
+            'total_annual_cost': round(float(result['total_annual_cost'].sum()), 2),
+            'cost_increase': round(float(result['cost_increase'].sum()), 2),
+        },
+        'data': _json_records(pd.concat([items[['product_id', 'product_name']], result], axis=1)),
+    }), 200
+
+
+@analytics_bp.route('/eoq/quantity-discount', methods=['POST'])
+def calculate_quantity_discount_eoq():
+    """All-units quantity-discount EOQ for many products in one call.
+
+    Body: products (see _eoq_items, each with price_breaks [{min_quantity, unit_cost}])
+    or branch_id (price breaks from product_price_breaks), holding_cost_percentage
+    (holding cost per unit-year as a share of the break price for products without
+    a holding_cost, default 0.25), ordering_cost. Products without breaks are priced at their unit_cost.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        # Holding costs a product supplies are used as given; the others are
+        # holding_cost_percentage of each break's price
+        items = _eoq_items(data, extra_fields=('price_breaks',), default_holding=False)
+        if data.get('products'):
+            tables = [_price_break_table(entry) if isinstance(entry, list) else [] for entry in items['price_breaks']]
+        else:
+            stored = db_module.fetch_price_breaks(items['product_id'].dropna().astype('int64'))
+            tables = [stored.get(int(pid), []) for pid in items['product_id']]
+        tables = [table or ([(0.0, cost)] if pd.notna(cost) else []) for table, cost in zip(tables, items['unit_cost'])]
+        quantities, prices = EOQCalculator.price_break_matrix(tables)
+        result = EOQCalculator.quantity_discount_eoq(
+            items['annual_demand'], items['ordering_cost'], quantities, prices,
+            holding_rate=float(data.get('holding_cost_percentage', 0.25)),
+            holding_cost=items['holding_cost'])
+    except (TypeError, ValueError, IndexError) as e:
+        logger.error(f'Validation error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f'Error calculating quantity-discount EOQ: {str(e)}')
+        return jsonify({'success': False, 'error': 'Failed to calculate quantity-discount EOQ'}), 500
+
+    priced = result['break_index'] >= 0
+    return jsonify({
+        'success': True,
+        'summary': {
+            'products': len(result),
+            'priced': int(priced.sum()),
+            'at_discount_break': int((result['break_index'] > 0).sum()),
+            'total_annual_cost': round(float(result['total_annual_cost'].sum()), 2),
+            'discount_savings': round(float(result['discount_savings'].sum()), 2),
+        },
+        'data': _json_records(pd.concat([items[['product_id', 'product_name', 'annual_demand']], result], axis=1)),
+    }), 200
+
+
+@analytics_bp.route('/eoq/joint-replenishment', methods=['POST'])
+def calculate_joint_replenishment():
+    """Joint replenishment plan: a shared base order cycle with an integer multiplier per product.
+
+    Body: products or branch_id (see _eoq_items; products may carry
+    minor_ordering_cost), major_ordering_cost (fixed cost per order, default 50),
+    minor_ordering_cost (per product on an order, default 0.5), holding_cost_percentage,
+    cycles (schedule length; default the plan's repeat length, at most 52).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        major = float(data.get('major_ordering_cost', 50))
+        default_minor = float(data.get('minor_ordering_cost', 0.5))
+        cycles = min(max(int(data['cycles']), 1), 520) if data.get('cycles') is not None else None
+        items = _eoq_items(data, extra_fields=('minor_ordering_cost',))
+        minor = pd.to_numeric(items['minor_ordering_cost'], errors='coerce').fillna(default_minor)
+        plan = EOQCalculator.joint_replenishment(items['annual_demand'], items['holding_cost'],
+                                                 major_ordering_cost=major, minor_ordering_cost=minor)
+    except (TypeError, ValueError) as e:
+        logger.error(f'Validation error: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f'Error planning joint replenishment: {str(e)}')
+        return jsonify({'success': False, 'error': 'Failed to plan joint replenishment'}), 500
+
+    attrs = plan.attrs
+    schedule = EOQCalculator.replenishment_schedule(
+        items['product_id'].astype(object).where(items['product_id'].notna(), None).to_numpy(),
+        plan['multiplier'], plan['order_quantity'], attrs['base_cycle_days'], cycles=cycles)
+    return jsonify({
+        'success': True,
+        'summary': {
+            'products': len(plan),
+            'base_cycle_days': attrs['base_cycle_days'],
+            'major_orders_per_year': attrs['major_orders_per_year'],
+            'total_annual_cost': attrs['total_annual_cost'],
+            'independent_annual_cost': attrs['independent_annual_cost'],
+            'savings': round(attrs['independent_annual_cost'] - attrs['total_annual_cost'], 2),
+            'groups': {str(k): int(n) for k, n in plan.loc[plan['multiplier'] > 0, 'multiplier'].value_counts().sort_index().items()},
+        },
+        'data': _json_records(pd.concat([items[['product_id', 'product_name', 'annual_demand']], plan], axis=1)),
+        'schedule': schedule,
+    }), 200
+
+
 @analytics_bp.route('/forecast/demand', methods=['POST'])
 def forecast_demand():
     """Forecast future demand based on historical data"""
@@ -234,6 +521,387 @@ def analyze_inventory_health():
         return jsonify({'success': False, 'error': 'Failed to analyze inventory'}), 500
 
 
+# Most urgent first when sorting by severity
+HEALTH_SEVERITY = {'CRITICAL': 0, 'LOW': 1, 'UNKNOWN': 2, 'NORMAL': 3, 'HIGH': 4}
+HEALTH_SORT_KEYS = ('severity', 'stockout_risk_percentage', 'days_of_stock', 'current_stock', 'daily_usage',
+                    'product_name', 'product_id')
+MAX_PAGE_SIZE = 500
+
+
+@analytics_bp.route('/inventory/health', methods=['GET'])
+def scan_inventory_health():
+    """Health status of every product in a branch, classified in one vectorized pass.
+
+    Stock comes from centralized_product, reorder point / safety stock / EOQ from each
+    product's latest eoq_calculations row, and daily usage from product_demand_history
+    over the last `days` days (falling back to the EOQ annual demand).
+    Query: branch_id (required), days, status (comma-separated filter),
+    sort (one of HEALTH_SORT_KEYS), order (asc/desc), page, page_size.
+    """
+    try:
+        branch_id = int(request.args['branch_id'])
+        days = max(int(request.args.get('days', 90)), 1)
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', 50)), 1), MAX_PAGE_SIZE)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'branch_id is required; branch_id, days, page and page_size must be integers'}), 400
+    sort = request.args.get('sort', 'severity')
+    if sort not in HEALTH_SORT_KEYS:
+        return jsonify({'success': False, 'error': f'sort must be one of: {", ".join(HEALTH_SORT_KEYS)}'}), 400
+    descending = request.args.get('order', 'desc' if sort == 'stockout_risk_percentage' else 'asc').lower() == 'desc'
+    statuses = [v.strip().upper() for v in request.args.get('status', '').split(',') if v.strip()]
+    unknown_statuses = sorted(set(statuses) - set(InventoryAnalytics.HEALTH_STATUSES))
+    if unknown_statuses:
+        return jsonify({'success': False, 'error': f'Unknown status: {", ".join(unknown_statuses)}'}), 400
+
+    try:
+        positions = pd.DataFrame(db_module.fetch_inventory_positions(branch_id=branch_id, days=days),
+                                 columns=db_module.INVENTORY_POSITION_FIELDS)
+    except Exception as e:
+        logger.warning('Error fetching inventory positions for branch %s: %s, returning empty scan', branch_id, str(e))
+        positions = pd.DataFrame(columns=db_module.INVENTORY_POSITION_FIELDS)
+
+    numeric = ['current_stock', 'eoq_quantity', 'reorder_point', 'safety_stock', 'annual_demand', 'recent_quantity_sold']
+    positions[numeric] = positions[numeric].apply(pd.to_numeric, errors='coerce').astype('float64')
+    positions['current_stock'] = positions['current_stock'].fillna(0)
+    recent_rate = positions['recent_quantity_sold'].fillna(0) / days
+    positions['daily_usage'] = recent_rate.where(recent_rate > 0, positions['annual_demand'] / 365).fillna(0).round(2)
+
+    health = InventoryAnalytics.classify_inventory_health(
+        positions['current_stock'], positions['daily_usage'], positions['reorder_point'],
+        positions['safety_stock'], positions['eoq_quantity']
+    )
+    scan = pd.concat([positions.reset_index(drop=True), health], axis=1)
+    summary = {status: int(n) for status, n in scan['status'].value_counts().reindex(
+        InventoryAnalytics.HEALTH_STATUSES, fill_value=0).items()}
+
+    if statuses:
+        scan = scan[scan['status'].isin(statuses)]
+    if sort == 'severity':
+        scan = scan.assign(severity=scan['status'].map(HEALTH_SEVERITY))
+        scan = scan.sort_values(['severity', 'stockout_risk_percentage', 'product_id'],
+                                ascending=[not descending, False, True], na_position='last', kind='stable')
+    else:
+        scan = scan.sort_values([sort, 'product_id'], ascending=[not descending, True], na_position='last', kind='stable')
+
+    total = len(scan)
+    page_rows = scan.iloc[(page - 1) * page_size:page * page_size]
+    columns = ['product_id', 'branch_id', 'product_name', 'current_stock', 'daily_usage', 'reorder_point',
+               'safety_stock', 'eoq_quantity', 'eoq_calculated_at', 'status', 'risk_level', 'days_of_stock',
+               'stockout_risk_percentage', 'recommendation']
+    data = _json_records(page_rows[columns].assign(current_stock=page_rows['current_stock'].astype('int64')))
+
+    return jsonify({
+        'success': True,
+        'branch_id': branch_id,
+        'summary': summary,
+        'data': data,
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'pages': (total + page_size - 1) // page_size,
+        },
+    }), 200
+
+
+def _fit_import_demand(grouped: pd.DataFrame, days_of_data: int) -> pd.DataFrame:
+    """DemandForecaster.fit_demand over an import's per-day aggregates.
+
+    grouped: one row per (product_id, branch_id, period_date) with `quantity`. Days
+    without a row count as zero demand, over at least `days_of_data` days ending on
+    the last imported day. Returns the fit indexed by (product_id, branch_id).
+    """
+    if grouped is None or grouped.empty:
+        return pd.DataFrame(columns=['adi', 'cv2', 'pattern', 'method', 'daily_rate', 'forecast_std'])
+    dates = pd.to_datetime(grouped['period_date'])
+    end = dates.max()
+    width = max(int(days_of_data), (end - dates.min()).days + 1, 1)
+    keys = pd.MultiIndex.from_arrays([grouped['product_id'].astype('int64'), grouped['branch_id'].astype('int64')],
+                                     names=['product_id', 'branch_id'])
+    codes, products = keys.factorize()
+    matrix = np.zeros((len(products), width))
+    np.add.at(matrix, (codes, (width - 1) - (end - dates).dt.days.to_numpy()),
+              pd.to_numeric(grouped['quantity'], errors='coerce').fillna(0).to_numpy())
+    return DemandForecaster.fit_demand(matrix).set_index(products)
+
+
+STOCKOUT_SORT_KEYS = ('days_until_stockout', 'days_until_reorder', 'latest_order_date', 'current_stock',
+                      'product_name', 'product_id')
+FORECAST_METHODS = ('exponential', 'moving_average', 'auto', 'sba', 'croston')
+
+try:
+    PROJECTION_TTL = float(os.getenv('ANALYTICS_PROJECTION_TTL') or 600)
+except ValueError:
+    logger.warning('Ignoring non-numeric ANALYTICS_PROJECTION_TTL')
+    PROJECTION_TTL = 600.0
+
+_stockout_projections = TTLCache('stockout_projection', PROJECTION_TTL, maxsize=64)
+
+
+def _daily_demand_matrix(positions: pd.DataFrame, history: pd.DataFrame, today, days: int) -> np.ndarray:
+    """(positions x days + 1) daily quantity_sold of the window ending `today`, zeros where nothing sold."""
+    window_start = today - pd.Timedelta(days=days)
+    matrix = np.zeros((len(positions), days + 1))
+    if not history.empty and not positions.empty:
+        rows = pd.MultiIndex.from_arrays([positions['product_id'].astype('int64'), positions['branch_id'].astype('int64')]) \
+            .get_indexer(pd.MultiIndex.from_arrays([history['product_id'].astype('int64'), history['branch_id'].astype('int64')]))
+        cols = (pd.to_datetime(history['period_date']) - window_start).dt.days.to_numpy()
+        keep = (rows >= 0) & (cols >= 0) & (cols <= days)
+        np.add.at(matrix, (rows[keep], cols[keep]),
+                  pd.to_numeric(history['quantity_sold'], errors='coerce').fillna(0).to_numpy()[keep])
+    return matrix
+
+
+def build_stockout_projection(branch_id: int, days: int = 90, horizon: int = 180,
+                              method: str = 'auto') -> pd.DataFrame:
+    """Stockout / reorder projection for every product of a branch.
+
+    Daily demand of the last `days` days is pivoted into a products x days matrix,
+    forecast `horizon` days ahead with DemandForecaster.forecast_curves and run through
+    InventoryAnalytics.project_stockouts. Daily series get a damped least-squares trend,
+    not the endpoint slope, and each product's series starts at its first recorded
+    sale. Products without recent history use a flat curve at their EOQ annual demand / 365.
+    """
+    positions = pd.DataFrame(db_module.fetch_inventory_positions(branch_id=branch_id, days=days),
+                             columns=db_module.INVENTORY_POSITION_FIELDS)
+    history = pd.DataFrame(db_module.fetch_demand_history(branch_id=branch_id, days=days),
+                           columns=['product_id', 'branch_id', 'period_date', 'quantity_sold'])
+
+    today = pd.Timestamp(datetime.utcnow().date())
+    matrix = _daily_demand_matrix(positions, history, today, days)
+
+    numeric = ['current_stock', 'reorder_point', 'lead_time_days', 'annual_demand']
+    positions[numeric] = positions[numeric].apply(pd.to_numeric, errors='coerce').astype('float64')
+    has_history = matrix.sum(axis=1) > 0
+    fallback_rate = (positions['annual_demand'] / 365).fillna(0).to_numpy()
+
+    if len(positions):
+        # days before the first recorded sale are not zero demand; they are left out
+        first_sale = pd.to_datetime(positions['first_sale_date'], errors='coerce')
+        start = ((first_sale - (today - pd.Timedelta(days=days))).dt.days.fillna(0)
+                 .clip(lower=0, upper=days).to_numpy(dtype='int64'))
+        curves = DemandForecaster.forecast_curves(matrix, horizon, method=method, trend='damped', start=start)
+        curves[~has_history] = fallback_rate[~has_history, None]
+    else:
+        curves = np.zeros((0, horizon))
+    projection = InventoryAnalytics.project_stockouts(
+        positions['current_stock'].fillna(0), curves, positions['reorder_point'],
+        positions['lead_time_days'].fillna(7), start_date=today
+    )
+    demand_source = np.select([has_history, fallback_rate > 0], ['forecast', 'eoq_annual_demand'], default='none')
+    return pd.concat([
+        positions[['product_id', 'branch_id', 'product_name', 'current_stock', 'reorder_point', 'lead_time_days']]
+        .reset_index(drop=True),
+        pd.DataFrame({
+            'forecast_daily_demand': np.round(curves.mean(axis=1), 2) if horizon else 0.0,
+            'demand_source': demand_source,
+        }),
+        projection,
+    ], axis=1)
+
+
+@analytics_bp.route('/inventory/stockout-projection', methods=['GET'])
+def stockout_projection():
+    """Projected stockout date, reorder date and latest order date for every product of a branch.
+
+    Query: branch_id (required), days (history window, default 90), horizon (days
+    forecast, default 180), method (one of FORECAST_METHODS, default auto), overdue=true,
+    within_days, sort (one of STOCKOUT_SORT_KEYS), order, page, page_size, refresh=true.
+    Results are cached per branch and parameters for ANALYTICS_PROJECTION_TTL seconds.
+    """
+    try:
+        branch_id = int(request.args['branch_id'])
+        days = min(max(int(request.args.get('days', 90)), 1), 730)
+        horizon = min(max(int(request.args.get('horizon', 180)), 1), 730)
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', 50)), 1), MAX_PAGE_SIZE)
+        within_days = float(request.args['within_days']) if request.args.get('within_days') else None
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'branch_id is required; days, horizon, page, page_size and within_days must be numbers'}), 400
+    method = request.args.get('method', 'auto')
+    if method not in FORECAST_METHODS:
+        return jsonify({'success': False, 'error': f'method must be one of: {", ".join(FORECAST_METHODS)}'}), 400
+    sort = request.args.get('sort', 'days_until_stockout')
+    if sort not in STOCKOUT_SORT_KEYS:
+        return jsonify({'success': False, 'error': f'sort must be one of: {", ".join(STOCKOUT_SORT_KEYS)}'}), 400
+    descending = request.args.get('order', 'asc').lower() == 'desc'
+
+    key = (branch_id, days, horizon, method, datetime.utcnow().date())
+    if request.args.get('refresh', '').lower() in ('1', 'true', 'yes', 'on'):
+        _stockout_projections.invalidate(key)
+    try:
+        projection = _stockout_projections.get_or_build(
+            key, lambda: build_stockout_projection(branch_id, days=days, horizon=horizon, method=method))
+    except Exception as e:
+        logger.error(f'Error projecting stockouts for branch {branch_id}: {str(e)}')
+        return jsonify({'success': False, 'error': 'Failed to project stockouts'}), 500
+
+    result = projection
+    if _request_flag('overdue'):
+        result = result[result['order_overdue']]
+    if within_days is not None:
+        result = result[result['days_until_stockout'] <= within_days]
+    result = result.sort_values([sort, 'product_id'], ascending=[not descending, True], na_position='last', kind='stable')
+
+    total = len(result)
+    finite = np.isfinite(projection['days_until_stockout'])
+    return jsonify({
+        'success': True,
+        'branch_id': branch_id,
+        'as_of': key[-1].isoformat(),
+        'horizon_days': horizon,
+        'summary': {
+            'products': int(len(projection)),
+            'stockout_within_horizon': int(finite.sum()),
+            'order_overdue': int(projection['order_overdue'].sum()),
+        },
+        'data': _json_records(result.iloc[(page - 1) * page_size:page * page_size]),
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'pages': (total + page_size - 1) // page_size,
+        },
+    }), 200
+
+
+@analytics_bp.route('/purchase-orders/drafts', methods=['POST'])
+def generate_purchase_order_drafts():
+    """Draft one consolidated purchase order per branch from every product at or below its reorder point.
+
+    Body or query: branch_id (optional; all branches when omitted), persist
+    (default true; false returns the drafts without storing them).
+    Lines order the EOQ rounded up to whole packs; see purchase_orders.
+    """
+    payload = request.get_json(silent=True) or {}
+    raw_branch = payload.get('branch_id', request.args.get('branch_id'))
+    raw_persist = payload.get('persist', request.args.get('persist', True))
+    try:
+        branch_id = int(raw_branch) if raw_branch not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'branch_id must be an integer'}), 400
+    persist = raw_persist if isinstance(raw_persist, bool) else str(raw_persist).strip().lower() in ('1', 'true', 'yes', 'on')
+
+    if branch_id is not None:
+        # An unknown branch would otherwise surface as the drafts' foreign key error (500)
+        try:
+            known_branch = db_module.branch_exists(branch_id)
+        except Exception as e:
+            logger.error(f'Error looking up branch {branch_id}: {str(e)}')
+            return jsonify({'success': False, 'error': 'Failed to draft purchase orders'}), 500
+        if not known_branch:
+            return jsonify({'success': False, 'error': f'Branch {branch_id} not found'}), 404
+
+    try:
+        result = purchase_orders.generate_drafts(branch_id=branch_id, persist=persist)
+    except Exception as e:
+        logger.error(f'Error drafting purchase orders for branch {branch_id or "all"}: {str(e)}')
+        return jsonify({'success': False, 'error': 'Failed to draft purchase orders'}), 500
+
+    drafts = result['drafts']
+    return jsonify({
+        'success': True,
+        'draft_date': result['draft_date'].isoformat(),
+        'persisted': persist,
+        'summary': {
+            'branches': len(drafts),
+            'lines': sum(d['line_count'] for d in drafts),
+            'total_units': sum(d['total_units'] for d in drafts),
+            'total_cost': round(sum(d['total_cost'] for d in drafts), 2),
+            'elapsed_ms': result['elapsed_ms'],
+        },
+        'data': drafts,
+    }), 200
+
+
+DEMAND_PATTERNS = ('smooth', 'erratic', 'intermittent', 'lumpy', 'none')
+
+
+def _safety_std(fit: pd.DataFrame) -> np.ndarray:
+    """fit_demand's forecast_std, or the CV estimate of calculate_eoq where it is NaN or 0."""
+    std = pd.to_numeric(fit['forecast_std'], errors='coerce').to_numpy(dtype='float64')
+    fallback = fit['daily_rate'].to_numpy(dtype='float64') * EOQCalculator.DEFAULT_DEMAND_CV
+    return np.where(np.isfinite(std) & (std > 0), std, fallback)
+
+
+def build_demand_fit(branch_id: int | None = None, days: int = 90, lead_time_days: int = 7,
+                     confidence_level: float = 0.95) -> pd.DataFrame:
+    """Demand pattern, fitted daily rate and safety stock for every product of a branch (or all).
+
+    The last `days` days of product_demand_history become one products x days matrix
+    fitted by DemandForecaster.fit_demand; safety stock is z × forecast_std × √lead time
+    (the product's EOQ lead time when it has one; a 20% CV of the rate when the history
+    is too short for forecast_std) and the reorder point adds the expected lead-time demand.
+    """
+    positions = pd.DataFrame(db_module.fetch_inventory_positions(branch_id=branch_id, days=days),
+                             columns=db_module.INVENTORY_POSITION_FIELDS)
+    history = pd.DataFrame(db_module.fetch_demand_history(branch_id=branch_id, days=days),
+                           columns=['product_id', 'branch_id', 'period_date', 'quantity_sold'])
+    matrix = _daily_demand_matrix(positions, history, pd.Timestamp(datetime.utcnow().date()), days)
+    fit = DemandForecaster.fit_demand(matrix)
+
+    lead = pd.to_numeric(positions['lead_time_days'], errors='coerce').fillna(lead_time_days).to_numpy()
+    z = EOQCalculator._get_z_score(confidence_level)
+    safety_stock = z * _safety_std(fit) * np.sqrt(lead)
+    return pd.concat([
+        positions[['product_id', 'branch_id', 'product_name', 'current_stock']].reset_index(drop=True),
+        fit,
+        pd.DataFrame({
+            'lead_time_days': lead,
+            'safety_stock': np.round(safety_stock, 2),
+            'reorder_point': np.round(fit['daily_rate'].to_numpy() * lead + safety_stock, 2),
+        }),
+    ], axis=1)
+
+
+@analytics_bp.route('/forecast/demand-patterns', methods=['GET'])
+def demand_patterns():
+    """Intermittent-demand aware forecast and safety stock for every product of a branch.
+
+    Query: branch_id (optional; all branches when omitted), days (history window,
+    default 90), lead_time_days (default 7, when a product has no EOQ lead time),
+    confidence_level (default 0.95), pattern (comma-separated filter), page, page_size.
+    """
+    try:
+        branch_id = int(request.args['branch_id']) if request.args.get('branch_id') else None
+        days = min(max(int(request.args.get('days', 90)), 7), 730)
+        lead_time_days = max(int(request.args.get('lead_time_days', 7)), 0)
+        confidence_level = float(request.args.get('confidence_level', 0.95))
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('page_size', 50)), 1), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'branch_id, days, lead_time_days, confidence_level, page and page_size must be numbers'}), 400
+    patterns = [v.strip().lower() for v in request.args.get('pattern', '').split(',') if v.strip()]
+    unknown = sorted(set(patterns) - set(DEMAND_PATTERNS))
+    if unknown:
+        return jsonify({'success': False, 'error': f'Unknown pattern: {", ".join(unknown)}'}), 400
+
+    try:
+        fit = build_demand_fit(branch_id, days=days, lead_time_days=lead_time_days, confidence_level=confidence_level)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f'Error fitting demand for branch {branch_id or "all"}: {str(e)}')
+        return jsonify({'success': False, 'error': 'Failed to fit demand'}), 500
+
+    summary = {pattern: int(n) for pattern, n in fit['pattern'].value_counts().reindex(DEMAND_PATTERNS, fill_value=0).items()}
+    result = fit[fit['pattern'].isin(patterns)] if patterns else fit
+    total = len(result)
+    return jsonify({
+        'success': True,
+        'branch_id': branch_id,
+        'summary': summary,
+        'data': _json_records(result.iloc[(page - 1) * page_size:page * page_size]),
+        'pagination': {
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'pages': (total + page_size - 1) // page_size,
+        },
+    }), 200
+
+
 @analytics_bp.route('/abc-analysis', methods=['POST'])
 def abc_analysis():
     """Perform ABC analysis on products"""
@@ -262,8 +930,16 @@ def abc_analysis():
 
 
 @analytics_bp.route('/sales-data/import', methods=['POST'])
+@profiling.profiled('import_sales_data')
 def import_sales_data():
     """Import and analyze sales data from CSV/Excel"""
+    # One psycopg2 connection/transaction for the whole batch (None on Supabase)
+    import_conn = None
+    # Supabase placeholder claim on the upload's hash, dropped unless the batch is recorded
+    hash_claim = None
+    # Per-stage wall time, rows and DB round trips, returned under `timings`
+    timer = instrumentation.StageTimer()
+    timer_token = instrumentation.activate(timer)
     try:
         if 'file' not in request.files:
             return jsonify({
@@ -284,6 +960,7 @@ def import_sales_data():
         # Read file - ensure we read from the uploaded file stream, not a cached version
         # Flask's FileStorage object needs to be handled carefully
         # Always read the file bytes first, then create a fresh BytesIO for pandas
+        timer.begin('read')
         try:
             # Reset file position to ensure we read from the beginning
             file.seek(0)
@@ -310,90 +987,138 @@ def import_sales_data():
             }), 400
         
         logger.info(f'Read {len(file_bytes)} bytes from uploaded file: {file.filename}')
-        # Log file signature to verify it's a valid Excel file
-        if len(file_bytes) >= 4:
-            file_signature = file_bytes[:4].hex()
-            logger.info(f'File signature (first 4 bytes): {file_signature}')
-            # Excel files start with PK (ZIP signature) - 504b0304
-            if file_signature.startswith('504b'):
-                logger.info('File appears to be a valid Excel/ZIP file')
-            else:
-                logger.warning(f'File signature {file_signature} does not match Excel format (expected PK/ZIP)')
-        
-        if file.filename.endswith('.csv'):
-            # Reset BytesIO position to beginning
-            file_content = BytesIO(file_bytes)
-            file_content.seek(0)
-            df = pd.read_csv(file_content)
-            logger.info(f'Read CSV file: {len(df)} rows loaded')
-        elif file.filename.endswith('.xlsx') or file.filename.endswith('.xls'):
-            # For Excel files, read into BytesIO first to ensure we get the actual uploaded content
-            # Create a fresh BytesIO from the file bytes
-            file_content = BytesIO(file_bytes)
-            file_content.seek(0)  # Ensure we start from the beginning
-            
+        timer.begin('duplicate_check')
+
+        # Idempotency: re-uploading the same file for the same branch returns the stored
+        # summary without parsing or touching sales/stock again, unless force=true
+        upload_branch_id = _request_branch_id()
+        content_hash = hashlib.sha256(file_bytes).hexdigest()
+        # Generate import_batch_id for transaction-based tracking
+        import_batch_id = str(uuid.uuid4())
+        logger.info(f'Generated import_batch_id: {import_batch_id}')
+        force = _request_flag('force')
+        # The import transaction opens here so the hash claim holds until the batch commits
+        try:
+            import_conn = db_module.begin_import_transaction()
+        except Exception as e:
+            logger.warning(f'Could not open import transaction, stages will use their own connections: {str(e)}')
+        # Claim the hash before reading the batch: a concurrent upload of the same file
+        # waits for (psycopg2) or is refused by (Supabase) the import that claimed it first
+        claimed = True
+        try:
+            if import_conn is not None:
+                with db_module.savepoint(import_conn, 'import_claim'):
+                    db_module.claim_import_hash(content_hash, upload_branch_id, import_batch_id, conn=import_conn)
+            elif not force:
+                claimed = db_module.claim_import_hash(content_hash, upload_branch_id, import_batch_id,
+                                                      file_name=file.filename)
+                hash_claim = (content_hash, upload_branch_id, import_batch_id) if claimed else None
+        except Exception:
+            logger.exception('Failed to claim content hash %s; concurrent re-uploads are not guarded', content_hash[:12])
+        if not force or not claimed:
+            with db_module.savepoint(import_conn, 'duplicate_check'):
+                previous_batch = db_module.get_import_batch_by_hash(content_hash, upload_branch_id, conn=import_conn)
+            if previous_batch and previous_batch.get('summary'):
+                logger.info(f'Duplicate upload {file.filename} (sha256 {content_hash[:12]}...) already imported as batch {previous_batch["import_batch_id"]}')
+                summary = dict(previous_batch['summary'])
+                summary['duplicate'] = True
+                summary['content_hash'] = content_hash
+                summary['message'] = f'File already imported as batch {previous_batch["import_batch_id"]}; send force=true to re-import'
+                return jsonify(summary), 200 if summary.get('success', True) else 207
+            if not claimed:
+                return jsonify({
+                    'success': False,
+                    'error': 'This file is already being imported for this branch; retry once that import finishes'
+                }), 409
+        # Saved column mapping for this branch's export format: pins columns, dtypes,
+        # date format and sheet, so detection is skipped and only mapped columns are read
+        profile = None
+        profile_name = request.form.get('profile') or request.args.get('profile')
+        if profile_name:
             try:
-                df = pd.read_excel(file_content, engine='openpyxl')
-            except Exception as e:
-                logger.error(f'Error reading Excel file with pandas: {str(e)}')
-                logger.error(f'File size: {len(file_bytes)} bytes, File signature: {file_bytes[:4].hex() if len(file_bytes) >= 4 else "N/A"}')
+                stored_profile = db_module.get_import_profile(upload_branch_id, profile_name)
+            except Exception:
                 return jsonify({
                     'success': False,
-                    'error': f'Failed to read Excel file: {str(e)}'
-                }), 400
-            
-            logger.info(f'Read Excel file: {len(df)} rows, {len(df.columns)} columns loaded from {file.filename}')
-            logger.info(f'Excel columns: {list(df.columns)}')
-            
-            if len(df) > 0:
-                logger.info(f'Sample row: {df.iloc[0].to_dict()}')
-            else:
-                logger.error(f'Excel file {file.filename} has 0 rows after reading! File size: {len(file_bytes)} bytes')
-                logger.error(f'This might indicate the file is corrupted or was not uploaded correctly')
-                # Try to read it again with different engine as fallback
-                try:
-                    file_content.seek(0)
-                    df_fallback = pd.read_excel(file_content, engine='xlrd')
-                    if len(df_fallback) > 0:
-                        logger.info(f'Fallback engine (xlrd) successfully read {len(df_fallback)} rows')
-                        df = df_fallback
-                    else:
-                        return jsonify({
-                            'success': False,
-                            'error': f'Excel file appears to be empty. File size: {len(file_bytes)} bytes. Please check the file and try again.'
-                        }), 400
-                except Exception:
-                    return jsonify({
-                        'success': False,
-                        'error': f'Excel file appears to be empty or could not be read. File size: {len(file_bytes)} bytes. Please regenerate the file and try again.'
-                    }), 400
-        else:
+                    'error': f'Failed to load import profile "{profile_name}"'
+                }), 500
+            if not stored_profile:
+                return jsonify({
+                    'success': False,
+                    'error': f'Import profile "{profile_name}" not found for branch {upload_branch_id}'
+                }), 404
+            try:
+                profile = ingest.ImportProfile.from_dict(stored_profile)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'Import profile "{profile_name}" is invalid: {str(e)}'}), 400
+
+        # CSV/Excel are parsed as before; Parquet/Arrow are read with column projection and stored types
+        # Excel only: sheet name or 0-based index, and 0-based header row (form values override the profile)
+        sheet_name = request.form.get('sheet') or (profile.sheet if profile else None)
+        if isinstance(sheet_name, str) and sheet_name.isdigit():
+            sheet_name = int(sheet_name)
+        header_row = request.form.get('header_row', str(profile.header_row) if profile else '0')
+        if not header_row.isdigit():
+            return jsonify({
+                'success': False,
+                'error': 'header_row must be a non-negative integer'
+            }), 400
+        timer.begin('parse')
+        try:
+            df = ingest.read_sales_file(file_bytes, file.filename, sheet_name=sheet_name, header_row=int(header_row),
+                                        profile=profile)
+        except ingest.SalesFileError as e:
             return jsonify({
                 'success': False,
-                'error': 'Unsupported file format. Use CSV or Excel'
+                'error': str(e)
             }), 400
         
+        timer.add_rows('parse', len(df))
+        timer.begin('normalize')
+
         # Expected columns - allow common date column names from different POS exports
         if 'quantity' not in df.columns:
             return jsonify({'success': False, 'error': 'Missing column: quantity'}), 400
 
-        # find a date column among common alternatives
-        date_candidates = ['date', 'transaction_date', 'sale_date', 'timestamp', 'transactiondatetime', 'created_at']
-        date_col = next((c for c in date_candidates if c in df.columns), None)
+        # find a date column among common alternatives (a profile has already mapped it to `date`)
+        date_candidates = ingest.DATE_CANDIDATES
+        date_col = 'date' if profile else next((c for c in date_candidates if c in df.columns), None)
         if not date_col:
             return jsonify({'success': False, 'error': f'Missing date column. Provide one of: {", ".join(date_candidates)}'}), 400
 
-        # Convert to numeric and normalize date into `date` column used below
+        # quantity/ids/prices were typed by ingest's schema step; normalize date into `date` column used below
         original_row_count = len(df)
-        df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
         
         # Handle date conversion - if already datetime, use it directly; otherwise parse
+        date_format = None
         if pd.api.types.is_datetime64_any_dtype(df[date_col]):
             df['date'] = df[date_col]
             logger.info(f'Date column {date_col} is already datetime type')
         else:
-            df['date'] = pd.to_datetime(df[date_col], errors='coerce')
-            logger.info(f'Parsed date column {date_col} to datetime')
+            # The profile's format, else the one stored for this branch's export layout, while it
+            # still fits the file; otherwise detected on a sample and written back to the profile
+            source = ingest.source_key(upload_branch_id, df.columns, date_col)
+            stored_format = profile.date_format if profile else ingest.remembered_date_format(source)
+            if not profile and stored_format is None:
+                try:
+                    stored_profile = db_module.get_import_profile(upload_branch_id, ingest.auto_profile_name(source))
+                    stored_format = stored_profile.get('date_format') if stored_profile else None
+                except Exception as e:
+                    logger.warning(f'Could not load the stored date format for this export layout: {str(e)}')
+            date_format = ingest.infer_date_format(df[date_col], source=source, remembered=stored_format)
+            if date_format and date_format != stored_format:
+                try:
+                    if profile:
+                        profile = replace(profile, date_format=date_format)
+                        db_module.upsert_import_profile(profile.to_dict())
+                    else:
+                        db_module.upsert_import_profile(ingest.auto_profile(
+                            source, upload_branch_id, df.columns, date_col, date_format,
+                            sheet=sheet_name, header_row=int(header_row)).to_dict())
+                except Exception as e:
+                    logger.warning(f'Could not store the detected date format {date_format}: {str(e)}')
+            df['date'] = ingest.parse_dates(df[date_col], date_format)
+            logger.info(f'Parsed date column {date_col} to datetime (format {date_format or "per element"})')
         
         # Log before filtering for debugging
         quantity_nulls = df['quantity'].isna().sum()
@@ -426,6 +1151,36 @@ def import_sales_data():
         date_max = df['date'].max() if valid_row_count > 0 else None
         logger.info(f'Imported data date range: {date_min} to {date_max} ({valid_row_count} valid rows)')
         
+        # Name-only exports (or rows without an id): attach product_id from the branch
+        # catalogues in one vectorized pass over the distinct names
+        name_col = next((c for c in ('product_name', 'product') if c in df.columns), None)
+        product_matching = None
+        if name_col:
+            unresolved_rows = df['product_id'].isna() if 'product_id' in df.columns else pd.Series(True, index=df.index)
+            if unresolved_rows.any():
+                try:
+                    resolved = catalog.resolve_products(
+                        df.loc[unresolved_rows, name_col],
+                        df.loc[unresolved_rows, 'branch_id'] if 'branch_id' in df.columns else None,
+                        default_branch_id=upload_branch_id,
+                    )
+                    if 'product_id' not in df.columns:
+                        df['product_id'] = pd.Series(pd.NA, index=df.index, dtype='Int32')
+                    df.loc[unresolved_rows, 'product_id'] = resolved['product_id'].astype('Int32').to_numpy()
+                    tiers = resolved['match'].value_counts()
+                    product_matching = {
+                        'column': name_col,
+                        'exact': int(tiers.get('exact', 0)),
+                        'fuzzy': int(tiers.get('fuzzy', 0)),
+                        'unmatched': int(resolved['product_id'].isna().sum()),
+                        'fuzzy_matches': _fuzzy_match_report(df.loc[unresolved_rows, name_col], resolved),
+                        # products added or renamed in the catalogue match after at most this long
+                        'name_index_ttl_seconds': catalog.NAME_INDEX_TTL,
+                    }
+                    logger.info(f'Resolved product names from column {name_col}: {product_matching}')
+                except Exception as e:
+                    logger.warning(f'Failed to resolve product names from column {name_col}: {str(e)}')
+
         # Calculate metrics
         total_quantity = df['quantity'].sum()
         average_daily = df['quantity'].mean()
@@ -442,7 +1197,9 @@ def import_sales_data():
                     'product_name' if 'product_name' in df.columns else 'product_id'
                 )
             )
-            product_analytics = df.groupby(product_col)['quantity'].agg(['sum', 'mean', 'count']).reset_index()
+            # observed=True: product/product_name are categorical, and categories whose rows were
+            # dropped during validation must not come back as empty (NaN mean) groups
+            product_analytics = df.groupby(product_col, observed=True)['quantity'].agg(['sum', 'mean', 'count']).reset_index()
             # normalize columns; if grouped by product_id we will resolve names below
             product_analytics.columns = [product_col, 'total_sold', 'avg_daily', 'transaction_count']
             product_analytics = product_analytics.sort_values('total_sold', ascending=False)
@@ -476,6 +1233,8 @@ def import_sales_data():
             slow_movers = product_analytics.tail(5).to_dict('records')
             restock_recommendations = [
                 {
+                    # Set only when the file is keyed by product_id; name-keyed rows resolve by name
+                    'product_id': int(item['product_id']) if product_col == 'product_id' else None,
                     'product_name': (item.get('product_name') or str(item.get(product_col))),
                     'last_sold_qty': int(item.get('total_sold') or 0),
                     'daily_rate': round(float(item.get('avg_daily') or 0), 2),
@@ -488,10 +1247,6 @@ def import_sales_data():
         logger.info(f'Sales data imported: {len(df)} records, annual demand: {annual_demand}')
         logger.info(f'DataFrame still has {len(df)} rows at this point (valid_row_count was {valid_row_count})')
 
-        # Generate import_batch_id for transaction-based tracking
-        import_batch_id = str(uuid.uuid4())
-        logger.info(f'Generated import_batch_id: {import_batch_id}')
-
         # Track affected products (product_id, branch_id pairs) for targeted EOQ recalculation
         affected_products = set()
 
@@ -502,20 +1257,8 @@ def import_sales_data():
         try:
             # Read JSON payload safely (may be multipart/form-data for file uploads)
             json_payload = request.get_json(silent=True)
-            # Determine branch_id provided in form/json or default to 1
-            branch_id = None
-            if request.form.get('branch_id'):
-                try:
-                    branch_id = int(request.form.get('branch_id'))
-                except Exception:
-                    branch_id = None
-            if not branch_id and json_payload and json_payload.get('branch_id'):
-                try:
-                    branch_id = int(json_payload.get('branch_id'))
-                except Exception:
-                    branch_id = None
-            if not branch_id:
-                branch_id = 1
+            # branch_id provided in form/json or default to 1
+            branch_id = upload_branch_id
 
             rows = []
             now_iso = datetime.utcnow().isoformat()
@@ -580,7 +1323,10 @@ def import_sales_data():
 
                 rows.append((product_id, row_branch_id, quantity, transaction_date, unit_price, total_amount, payment_method, created_at, import_batch_id))
 
+            timer.add_rows('normalize', len(rows))
+
             # Validate products exist before attempting insertion
+            timer.begin('validate')
             if rows:
                 # Extract unique (product_id, branch_id) pairs from rows
                 product_branch_pairs = set()
@@ -591,7 +1337,8 @@ def import_sales_data():
                 if product_branch_pairs:
                     valid_products = db_module.validate_products_exist(
                         [pid for pid, _ in product_branch_pairs],
-                        [bid for _, bid in product_branch_pairs]
+                        [bid for _, bid in product_branch_pairs],
+                        conn=import_conn
                     )
                     
                     # Filter rows to only include valid products
@@ -615,8 +1362,12 @@ def import_sales_data():
                     # Update affected_products to only include valid ones
                     affected_products = affected_products.intersection(valid_products)
 
+            timer.add_rows('validate', len(rows))
+            timer.begin('insert')
             try:
-                inserted_count = db_module.insert_sales_rows(rows) if rows else 0
+                with db_module.savepoint(import_conn, 'sales'):
+                    inserted_count = db_module.insert_sales_rows(rows, conn=import_conn) if rows else 0
+                timer.add_rows('insert', inserted_count)
             except ValueError as e:
                 # Negative stock validation error - check if it's the specific error we're looking for
                 error_msg = str(e)
@@ -634,20 +1385,23 @@ def import_sales_data():
                 db_warning = str(e)
 
             # After inserting raw sales, aggregate and persist to demand history, forecast, and inventory analytics
+            timer.begin('demand_history')
+            # Per-product fit of the imported daily demand; feeds forecasts and EOQ safety stock
+            demand_fit = pd.DataFrame(columns=['method', 'daily_rate', 'forecast_std'])
             try:
                 # Only proceed if product_id column exists and there are numeric product ids
                 if 'product_id' in df.columns:
-                    pid_df = df.dropna(subset=['product_id']).copy()
-                    # coerce product_id to int where possible
-                    pid_df['product_id'] = pid_df['product_id'].apply(lambda x: int(x) if (pd.notna(x) and str(x).strip() != '') else None)
-                    pid_df = pid_df.dropna(subset=['product_id'])
+                    # product_id/branch_id are already Int32 (ingest schema step); only the needed columns are copied
+                    pid_columns = [c for c in ('product_id', 'branch_id', 'date', 'quantity', 'total_amount', 'unit_price') if c in df.columns]
+                    pid_df = df.loc[df['product_id'].notna(), pid_columns]
+                    pid_df = pid_df.assign(product_id=pid_df['product_id'].astype('int32'))
                     
                     # Add branch_id column if not present (use form/json/default)
                     if 'branch_id' not in pid_df.columns:
                         pid_df['branch_id'] = branch_id
                     else:
-                        # Ensure branch_id is numeric
-                        pid_df['branch_id'] = pid_df['branch_id'].apply(lambda x: int(x) if pd.notna(x) else branch_id)
+                        pid_df['branch_id'] = pid_df['branch_id'].fillna(branch_id)
+                    pid_df['branch_id'] = pid_df['branch_id'].astype('int32')
 
                     if not pid_df.empty:
                         # period_date as date (YYYY-MM-DD)
@@ -658,7 +1412,7 @@ def import_sales_data():
                         if 'unit_price' not in pid_df.columns:
                             pid_df['unit_price'] = None
 
-                        grouped = pid_df.groupby(['product_id', 'branch_id', 'period_date']).agg({
+                        grouped = pid_df.groupby(['product_id', 'branch_id', 'period_date'], observed=True).agg({
                             'quantity': 'sum',
                             'total_amount': 'sum',
                             'unit_price': 'mean'
@@ -666,7 +1420,6 @@ def import_sales_data():
 
                         demand_entries = []
                         forecast_entries = []
-                        inventory_entries = []
                         from datetime import date
                         # forecast month: first day of next month
                         today = datetime.utcnow().date()
@@ -686,10 +1439,12 @@ def import_sales_data():
                                 grouped_products.add((pid, bid))
                             
                             if grouped_products:
-                                valid_grouped_products = db_module.validate_products_exist(
-                                    [pid for pid, _ in grouped_products],
-                                    [bid for _, bid in grouped_products]
-                                )
+                                with timer.stage('validate'):
+                                    valid_grouped_products = db_module.validate_products_exist(
+                                        [pid for pid, _ in grouped_products],
+                                        [bid for _, bid in grouped_products],
+                                        conn=import_conn
+                                    )
                                 
                                 # Filter grouped dataframe to only include valid products
                                 valid_mask = grouped.apply(
@@ -732,79 +1487,36 @@ def import_sales_data():
                                     'source': 'bitpos_import'
                                 })
 
-                                # simple projection: monthly forecast based on average daily * 30
-                                avg_daily = (qty / days_of_data) if days_of_data > 0 else 0
-                                forecast_qty = float(avg_daily * 30)
-                                forecast_entries.append({
-                                    'product_id': pid,
-                                    'branch_id': bid,
-                                    'forecast_month': fm.isoformat(),
-                                    'forecasted_quantity': forecast_qty,
-                                    'confidence_interval_lower': max(0.0, forecast_qty * 0.8),
-                                    'confidence_interval_upper': forecast_qty * 1.2,
-                                    'forecast_method': 'simple_projection'
-                                })
-
-                                # inventory analytics minimal info
-                                # Calculate inventory analytics fields from aggregated sales (g)
-                                total_sold_qty = float(qty)  # qty already extracted from g['quantity']
-                                avg_daily = (qty / days_of_data) if days_of_data > 0 else 0
-                                avg_unit_price = avg_price  # avg_price already extracted from g['unit_price']
-                                
-                                # ALWAYS get current_stock from centralized_product table - never use estimation
-                                current_stock_actual = 0
-                                stock_found = False
-                                try:
-                                    stock_map = db_module.get_product_stock([pid], [bid])
-                                    fetched_stock = stock_map.get((pid, bid), None)
-                                    if fetched_stock is not None:
-                                        # Product exists in centralized_product - use actual stock
-                                        current_stock_actual = int(fetched_stock) if fetched_stock is not None else 0
-                                        stock_found = True
-                                        logger.info('✓ Fetched actual stock from centralized_product for product %s branch %s: %s', pid, bid, current_stock_actual)
-                                    else:
-                                        # Product NOT found in centralized_product - use 0 (not estimation)
-                                        current_stock_actual = 0
-                                        logger.warning('✗ Product %s branch %s NOT FOUND in centralized_product table. current_stock set to 0. Please ensure product exists in centralized_product.', pid, bid)
-                                except Exception as e:
-                                    # Database lookup failed - use 0 (not estimation)
-                                    current_stock_actual = 0
-                                    logger.error('✗ Failed to fetch stock from centralized_product for product %s branch %s: %s. current_stock set to 0.', pid, bid, str(e))
-                                
-                                # Ensure current_stock_actual is never None (should always be 0 or positive number)
-                                if current_stock_actual is None:
-                                    current_stock_actual = 0
-                                
-                                # stock_adequacy_days: how many days of stock we have based on actual stock
-                                stock_adequacy = int(current_stock_actual / max(avg_daily, 0.001)) if current_stock_actual > 0 and avg_daily > 0 else 0
-                                
-                                # turnover_ratio: times inventory turned over
-                                turnover = (total_sold_qty / max(current_stock_actual, 1)) if current_stock_actual > 0 else 0
-                                
-                                # carrying_cost: estimated holding cost (assume 0.25 per unit per year)
-                                carrying = current_stock_actual * avg_unit_price * 0.25 / 365 if current_stock_actual > 0 else 0
-                                
-                                # stockout_risk_percentage: inverse of stock adequacy; if we have 30 days stock, risk ~3%
-                                stockout_risk = (1.0 / max(stock_adequacy, 1)) * 100 if stock_adequacy > 0 else 5.0
-                                
-                                inventory_entries.append({
-                                    'product_id': pid,
-                                    'branch_id': bid,
-                                    'analysis_date': datetime.utcnow().date().isoformat(),
-                                    'current_stock': current_stock_actual,
-                                    'avg_daily_usage': round(avg_daily, 2),
-                                    'stock_adequacy_days': stock_adequacy,
-                                    'turnover_ratio': round(turnover, 2),
-                                    'carrying_cost': round(carrying, 2),
-                                    'stockout_risk_percentage': round(stockout_risk, 2),
-                                    'recommendation': f'Daily usage: {avg_daily:.2f} units, Stock covers ~{stock_adequacy} days'
-                                })
                             except Exception:
-                                logger.exception('Failed to prepare demand/forecast/inventory entry for group %s', g)
+                                logger.exception('Failed to prepare demand/forecast entry for group %s', g)
+
+                        # One monthly forecast per product from its fitted daily rate (Croston/SBA for
+                        # intermittent items), with a 95% band from the one-step forecast error
+                        try:
+                            demand_fit = _fit_import_demand(grouped, days_of_data)
+                            monthly = demand_fit['daily_rate'] * 30
+                            band = 1.96 * _safety_std(demand_fit) * np.sqrt(30)
+                            forecast_entries = [
+                                {
+                                    'product_id': int(pid),
+                                    'branch_id': int(bid),
+                                    'forecast_month': fm.isoformat(),
+                                    'forecasted_quantity': float(qty),
+                                    'confidence_interval_lower': float(max(0.0, qty - width)),
+                                    'confidence_interval_upper': float(qty + width),
+                                    'forecast_method': method,
+                                }
+                                for (pid, bid), qty, width, method in zip(
+                                    demand_fit.index, monthly, band, demand_fit['method'])
+                            ]
+                        except Exception:
+                            logger.exception('Failed to fit demand for sales forecasts')
 
                         try:
                             if demand_entries:
-                                inserted_demand = db_module.insert_product_demand_history(demand_entries)
+                                with db_module.savepoint(import_conn, 'demand_history'):
+                                    inserted_demand = db_module.insert_product_demand_history(demand_entries, conn=import_conn)
+                                timer.add_rows('demand_history', inserted_demand or 0)
                                 # Log date range of inserted demand entries
                                 if demand_entries:
                                     period_dates = [e.get('period_date') for e in demand_entries if e.get('period_date')]
@@ -816,28 +1528,42 @@ def import_sales_data():
                         except Exception:
                             logger.exception('Failed to persist product demand history')
 
+                        timer.begin('forecasts')
                         try:
                             if forecast_entries:
-                                inserted_forecasts = db_module.insert_sales_forecasts(forecast_entries)
+                                with db_module.savepoint(import_conn, 'sales_forecast'):
+                                    inserted_forecasts = db_module.insert_sales_forecasts(forecast_entries, conn=import_conn)
+                                timer.add_rows('forecasts', inserted_forecasts or 0)
                                 logger.info('Inserted %s sales_forecast rows', inserted_forecasts)
                         except Exception:
                             logger.exception('Failed to persist sales forecasts')
 
+                        timer.begin('inventory_analytics')
                         try:
-                            if inventory_entries:
-                                # Deduplicate inventory_entries by (product_id, branch_id, analysis_date) before insertion
-                                seen = set()
-                                deduplicated_entries = []
-                                for entry in inventory_entries:
-                                    key = (entry.get('product_id'), entry.get('branch_id'), entry.get('analysis_date'))
-                                    if key not in seen:
-                                        seen.add(key)
-                                        deduplicated_entries.append(entry)
-                                
-                                if len(deduplicated_entries) < len(inventory_entries):
-                                    logger.warning(f'Removed {len(inventory_entries) - len(deduplicated_entries)} duplicate inventory_analytics entries before insertion')
-                                
-                                inserted_inv = db_module.insert_inventory_analytics(deduplicated_entries)
+                            if not grouped.empty:
+                                # current_stock always comes from centralized_product (0 when the product is missing),
+                                # fetched once for every product/branch pair in the import
+                                pairs = grouped[['product_id', 'branch_id']].drop_duplicates()
+                                stock_map = db_module.get_product_stock(
+                                    pairs['product_id'].astype(int).tolist(),
+                                    pairs['branch_id'].astype(int).tolist(),
+                                    conn=import_conn
+                                )
+                                stock = pd.Series(stock_map, dtype='float64')
+                                if stock.empty:
+                                    current_stock = np.full(len(grouped), np.nan)
+                                else:
+                                    positions = stock.index.get_indexer(pd.MultiIndex.from_arrays(
+                                        [grouped['product_id'].astype('int64'), grouped['branch_id'].astype('int64')]))
+                                    current_stock = np.where(positions >= 0, stock.to_numpy()[positions], np.nan)
+                                missing_stock = len(pairs) - len(stock_map)
+                                if missing_stock > 0:
+                                    logger.warning(f'{missing_stock} products not found in centralized_product; their current_stock is set to 0')
+
+                                inventory_frame = InventoryAnalytics.build_inventory_analytics(grouped, current_stock, days_of_data)
+                                with db_module.savepoint(import_conn, 'inventory_analytics'):
+                                    inserted_inv = db_module.insert_inventory_analytics(inventory_frame.to_dict('records'), conn=import_conn)
+                                timer.add_rows('inventory_analytics', inserted_inv or 0)
                                 logger.info('Inserted %s inventory_analytics rows', inserted_inv)
                         except Exception:
                             logger.exception('Failed to persist inventory analytics')
@@ -845,102 +1571,113 @@ def import_sales_data():
                 logger.exception('Failed to persist aggregated analytics after import')
 
             # Targeted EOQ recalculation: Only recalculate for affected products
+            timer.begin('eoq')
             try:
                 # Only recalculate EOQ for products that were affected by this import
                 if affected_products:
                     logger.info(f'Recalculating EOQ for {len(affected_products)} affected products')
+                    timer.add_rows('eoq', len(affected_products))
                     
                     for product_id, prod_branch_id in affected_products:
                         try:
-                            # Get sales data for this product from the imported dataframe
-                            product_sales = df[df['product_id'] == product_id] if 'product_id' in df.columns else pd.DataFrame()
-                            if product_sales.empty:
-                                # Try to get from product_demand_history if available
-                                product_annual_demand = 0
-                            else:
-                                # Calculate annual demand from imported data
-                                product_total = product_sales['quantity'].sum()
-                                product_annual_demand = float((product_total / days_of_data) * 365) if days_of_data > 0 else 0
+                            # One savepoint per product: a failed upsert only loses that product's row
+                            with db_module.savepoint(import_conn, 'eoq'):
+                                # Get sales data for this product from the imported dataframe
+                                product_sales = df[df['product_id'] == product_id] if 'product_id' in df.columns else pd.DataFrame()
+                                if product_sales.empty:
+                                    # Try to get from product_demand_history if available
+                                    product_annual_demand = 0
+                                else:
+                                    # Calculate annual demand from imported data
+                                    product_total = product_sales['quantity'].sum()
+                                    product_annual_demand = float((product_total / days_of_data) * 365) if days_of_data > 0 else 0
                             
-                            # prepare EOQ input using defaults or provided overrides
-                            holding_cost = float(request.form.get('holding_cost') or (json_payload.get('holding_cost') if json_payload else None) or 50)
-                            ordering_cost = float(request.form.get('ordering_cost') or (json_payload.get('ordering_cost') if json_payload else None) or 100)
-                            unit_cost = float(request.form.get('unit_cost') or (json_payload.get('unit_cost') if json_payload else None) or 25)
-                            lead_time_days = int(request.form.get('lead_time_days') or (json_payload.get('lead_time_days') if json_payload else None) or 7)
-                            confidence_level = float(request.form.get('confidence_level') or (json_payload.get('confidence_level') if json_payload else None) or 0.95)
-
-                            # INPUT VALIDATION: Prevent invalid EOQ calculations
-                            validation_errors = []
-                            if product_annual_demand <= 0:
-                                validation_errors.append('Annual demand must be greater than 0')
-                            if holding_cost <= 0:
-                                validation_errors.append('Holding cost must be greater than 0')
-                            if ordering_cost <= 0:
-                                validation_errors.append('Ordering cost must be greater than 0')
+                                # prepare EOQ input using defaults or provided overrides
+                                holding_cost = float(request.form.get('holding_cost') or (json_payload.get('holding_cost') if json_payload else None) or 50)
+                                ordering_cost = float(request.form.get('ordering_cost') or (json_payload.get('ordering_cost') if json_payload else None) or 100)
+                                unit_cost = float(request.form.get('unit_cost') or (json_payload.get('unit_cost') if json_payload else None) or 25)
+                                lead_time_days = int(request.form.get('lead_time_days') or (json_payload.get('lead_time_days') if json_payload else None) or 7)
+                                confidence_level = float(request.form.get('confidence_level') or (json_payload.get('confidence_level') if json_payload else None) or 0.95)
+
+                                # INPUT VALIDATION: Prevent invalid EOQ calculations
+                                validation_errors = []
+                                if product_annual_demand <= 0:
+                                    validation_errors.append('Annual demand must be greater than 0')
+                                if holding_cost <= 0:
+                                    validation_errors.append('Holding cost must be greater than 0')
+                                if ordering_cost <= 0:
+                                    validation_errors.append('Ordering cost must be greater than 0')
                             
-                            if validation_errors:
-                                # Store invalid EOQ with status and reason
-                                invalid_result = {
+                                if validation_errors:
+                                    # Store invalid EOQ with status and reason
+                                    invalid_result = {
+                                        'annual_demand': product_annual_demand,
+                                        'holding_cost': holding_cost,
+                                        'ordering_cost': ordering_cost,
+                                        'unit_cost': unit_cost,
+                                        'eoq_quantity': 0,
+                                        'reorder_point': 0,
+                                        'safety_stock': 0,
+                                        'annual_holding_cost': 0,
+                                        'annual_ordering_cost': 0,
+                                        'total_annual_cost': 0,
+                                        'max_stock_level': 0,
+                                        'min_stock_level': 0,
+                                        'average_inventory': 0,
+                                        'lead_time_days': lead_time_days,
+                                        'confidence_level': confidence_level,
+                                        'status': 'invalid_inputs',
+                                        'reason': '; '.join(validation_errors)
+                                    }
+                                    db_module.insert_eoq_calculation(product_id, prod_branch_id, invalid_result, conn=import_conn)
+                                    logger.warning(f'EOQ calculation skipped for product {product_id} branch {prod_branch_id}: {"; ".join(validation_errors)}')
+                                    continue
+
+                                # Measured forecast error of the fitted daily demand replaces the 20% CV guess
+                                fitted_std = (demand_fit['forecast_std'].get((int(product_id), int(prod_branch_id)))
+                                              if not demand_fit.empty else None)
+                                # NaN (too few one-step errors) or 0 keeps the CV estimate
+                                if fitted_std is not None and not (np.isfinite(fitted_std) and fitted_std > 0):
+                                    fitted_std = None
+                                eoq_input = EOQInput(
+                                    annual_demand=product_annual_demand,
+                                    holding_cost=holding_cost,
+                                    ordering_cost=ordering_cost,
+                                    unit_cost=unit_cost,
+                                    lead_time_days=lead_time_days,
+                                    confidence_level=confidence_level,
+                                    demand_std=float(fitted_std) if fitted_std is not None else None
+                                )
+                                result_obj = EOQCalculator.calculate_eoq(eoq_input)
+
+                                # convert EOQResult dataclass to dict
+                                # Include all required fields for database persistence
+                                result_dict = {
                                     'annual_demand': product_annual_demand,
                                     'holding_cost': holding_cost,
                                     'ordering_cost': ordering_cost,
                                     'unit_cost': unit_cost,
-                                    'eoq_quantity': 0,
-                                    'reorder_point': 0,
-                                    'safety_stock': 0,
-                                    'annual_holding_cost': 0,
-                                    'annual_ordering_cost': 0,
-                                    'total_annual_cost': 0,
-                                    'max_stock_level': 0,
-                                    'min_stock_level': 0,
-                                    'average_inventory': 0,
                                     'lead_time_days': lead_time_days,
                                     'confidence_level': confidence_level,
-                                    'status': 'invalid_inputs',
-                                    'reason': '; '.join(validation_errors)
+                                    'eoq_quantity': result_obj.eoq_quantity,
+                                    'reorder_point': result_obj.reorder_point,
+                                    'safety_stock': result_obj.safety_stock,
+                                    'annual_holding_cost': result_obj.annual_holding_cost,
+                                    'annual_ordering_cost': result_obj.annual_ordering_cost,
+                                    'total_annual_cost': result_obj.total_annual_cost,
+                                    'max_stock_level': result_obj.max_stock_level,
+                                    'min_stock_level': result_obj.min_stock_level,
+                                    'average_inventory': result_obj.average_inventory,
+                                    'status': 'valid',  # Mark as valid since validation passed
+                                    'reason': None
                                 }
-                                db_module.insert_eoq_calculation(product_id, prod_branch_id, invalid_result)
-                                logger.warning(f'EOQ calculation skipped for product {product_id} branch {prod_branch_id}: {"; ".join(validation_errors)}')
-                                continue
-
-                            eoq_input = EOQInput(
-                                annual_demand=product_annual_demand,
-                                holding_cost=holding_cost,
-                                ordering_cost=ordering_cost,
-                                unit_cost=unit_cost,
-                                lead_time_days=lead_time_days,
-                                confidence_level=confidence_level
-                            )
-                            result_obj = EOQCalculator.calculate_eoq(eoq_input)
-
-                            # convert EOQResult dataclass to dict
-                            # Include all required fields for database persistence
-                            result_dict = {
-                                'annual_demand': product_annual_demand,
-                                'holding_cost': holding_cost,
-                                'ordering_cost': ordering_cost,
-                                'unit_cost': unit_cost,
-                                'lead_time_days': lead_time_days,
-                                'confidence_level': confidence_level,
-                                'eoq_quantity': result_obj.eoq_quantity,
-                                'reorder_point': result_obj.reorder_point,
-                                'safety_stock': result_obj.safety_stock,
-                                'annual_holding_cost': result_obj.annual_holding_cost,
-                                'annual_ordering_cost': result_obj.annual_ordering_cost,
-                                'total_annual_cost': result_obj.total_annual_cost,
-                                'max_stock_level': result_obj.max_stock_level,
-                                'min_stock_level': result_obj.min_stock_level,
-                                'average_inventory': result_obj.average_inventory,
-                                'status': 'valid',  # Mark as valid since validation passed
-                                'reason': None
-                            }
-
-                            # Persist EOQ calculation using product_id from affected_products
-                            try:
-                                db_module.insert_eoq_calculation(product_id, prod_branch_id, result_dict)
-                                logger.info(f'EOQ persisted to database for product {product_id}, branch {prod_branch_id} (targeted recalculation)')
-                            except Exception:
-                                logger.exception('Failed to persist EOQ for product %s branch %s', product_id, prod_branch_id)
+
+                                # Persist EOQ calculation using product_id from affected_products
+                                try:
+                                    db_module.insert_eoq_calculation(product_id, prod_branch_id, result_dict, conn=import_conn)
+                                    logger.info(f'EOQ persisted to database for product {product_id}, branch {prod_branch_id} (targeted recalculation)')
+                                except Exception:
+                                    logger.exception('Failed to persist EOQ for product %s branch %s', product_id, prod_branch_id)
                         except Exception:
                             logger.exception('EOQ calc failed for product %s branch %s', product_id, prod_branch_id)
                 else:
@@ -952,39 +1689,36 @@ def import_sales_data():
             logger.exception('Failed while attempting to persist sales to DB')
 
         # Persist restock recommendations to database
+        timer.begin('restock')
+        # Kept apart from inserted_count, which is the sales row count the response reports
+        restock_inserted = 0
         try:
-            inserted_count = 0
-            for rec in restock_recommendations:
-                # Try to find product_id from the dataframe
-                product_identifier = rec.get('product_name')
-                if not product_identifier:
-                    continue
-                    
-                try:
-                    pid = None
-                    # First check if product_identifier is a numeric product_id
+            entries = [rec for rec in restock_recommendations
+                       if rec.get('product_id') is not None or rec.get('product_name')]
+            if entries:
+                # Recommendations of an id-keyed file carry their product_id; the rest are names,
+                # all-digit ones (model or SKU numbers) included, resolved by name in one pass
+                product_ids = pd.Series([rec.get('product_id') for rec in entries], dtype='Int64')
+                by_name = product_ids.isna().to_numpy()
+                if by_name.any():
+                    names = pd.Series([str(rec['product_name']) for rec in entries], dtype='string')[by_name]
                     try:
-                        pid = int(product_identifier)
-                    except ValueError:
-                        # If not, try to look up product_id by name
-                        try:
-                            pid = db_module.get_product_id_by_name(str(product_identifier), branch_id)
-                            if pid:
-                                logger.info(f'Found product_id {pid} for restock recommendation product "{product_identifier}"')
-                        except Exception as e:
-                            logger.warning(f'Failed to look up product_id for restock recommendation "{product_identifier}": {str(e)}')
-                    
-                    # Persist to database (with or without product_id)
-                    # If no product_id found, pass None and let the insert handle it
-                    success = db_module.insert_restock_recommendations(pid or None, branch_id, rec)
-                    if success:
-                        inserted_count += 1
-                        logger.info(f'✓ Restock recommendation persisted for product {pid or "unknown"} (name: "{product_identifier}"), branch {branch_id}')
-                    else:
-                        logger.error(f'✗ Failed to persist restock recommendation for product {pid or "unknown"} (name: "{product_identifier}"), branch {branch_id}')
-                except Exception:
-                    logger.exception('Failed to persist restock recommendation for product %s', product_identifier)
-            logger.info(f'Restock recommendations insertion complete: {inserted_count}/{len(restock_recommendations)} inserted')
+                        product_ids[by_name] = catalog.resolve_product_ids(
+                            names, upload_branch_id, conn=import_conn
+                        ).to_numpy()
+                    except Exception as e:
+                        logger.warning(f'Failed to resolve product ids for restock recommendations: {str(e)}')
+                unresolved = int(product_ids.isna().sum())
+                if unresolved:
+                    logger.warning(f'{unresolved} restock recommendations have no matching product in branch {upload_branch_id}')
+
+                with db_module.savepoint(import_conn, 'restock'):
+                    restock_inserted = db_module.insert_restock_recommendations_bulk(
+                        zip([None if pd.isna(pid) else int(pid) for pid in product_ids], entries),
+                        upload_branch_id,
+                        conn=import_conn,
+                    )
+            logger.info(f'Restock recommendations insertion complete: {restock_inserted}/{len(restock_recommendations)} inserted')
         except Exception:
             logger.exception('Restock recommendation persistence step failed')
 
@@ -994,10 +1728,11 @@ def import_sales_data():
 
         # Get stock deduction details for this import batch
         # Note: This will be empty if sales insertion failed, but we still return the import_batch_id
+        timer.begin('deduction_summary')
         stock_deduction_summary = []
         if inserted_count > 0 and import_batch_id:
             try:
-                stock_deduction_summary = db_module.get_stock_deductions_by_batch(import_batch_id)
+                stock_deduction_summary = db_module.get_stock_deductions_by_batch(import_batch_id, conn=import_conn)
                 logger.info(f'Fetched {len(stock_deduction_summary)} stock deduction records for import_batch_id {import_batch_id}')
             except Exception as e:
                 logger.warning(f'Failed to fetch stock deduction details: {str(e)}')
@@ -1014,11 +1749,15 @@ def import_sales_data():
             'records_imported': actual_inserted,
             'records_processed': final_row_count,
             'import_batch_id': import_batch_id,
+            'content_hash': content_hash,
+            'import_profile': profile.name if profile else None,
+            'product_matching': product_matching,
             'metrics': {
                 'total_quantity': float(total_quantity),
                 'average_daily': round(float(average_daily), 2),
                 'annual_demand': round(float(annual_demand), 2),
                 'days_of_data': int(days_of_data),
+                'date_format': date_format,
                 'date_range': {
                     'start': df['date'].min().isoformat(),
                     'end': df['date'].max().isoformat()
@@ -1026,6 +1765,7 @@ def import_sales_data():
             },
             'top_products': top_products,
             'restock_recommendations': restock_recommendations,
+            'restock_recommendations_saved': restock_inserted,
             'stock_deductions': stock_deduction_summary,
             'affected_products': [{'product_id': pid, 'branch_id': bid} for pid, bid in affected_products]
         }
@@ -1037,11 +1777,87 @@ def import_sales_data():
             response['success'] = False  # Mark as failure if there's a warning
             is_success = False  # Also update is_success for HTTP status code consistency
 
+        # Remember uploads that saved rows by content hash (same transaction as the sales rows);
+        # partial imports (207) too, so a retry cannot insert their saved rows a second time
+        timer.begin('commit')
+        if actual_inserted > 0:
+            try:
+                with db_module.savepoint(import_conn, 'import_batch'):
+                    db_module.record_import_batch(content_hash, upload_branch_id, import_batch_id, response,
+                                                  file_name=file.filename, conn=import_conn)
+                hash_claim = None
+            except Exception:
+                logger.exception('Failed to record import batch %s; re-uploads of this file will not be deduplicated', import_batch_id)
+
+        # Single commit for the whole batch; failed optional stages were rolled back to their savepoints
+        if import_conn is not None:
+            try:
+                import_conn.commit()
+                logger.info(f'Committed import transaction for import_batch_id {import_batch_id}')
+            except Exception as e:
+                logger.exception('Failed to commit import transaction')
+                return jsonify({
+                    'success': False,
+                    'error': 'Failed to import sales data',
+                    'details': f'Failed to commit import: {str(e)}'
+                }), 500
+        timer.end()
+
+        response['timings'] = timer.as_dict()
+        metrics.record_import(final_row_count, response['timings']['total_ms'] / 1000, response['timings']['stages'])
+        timer.emit('import_stage_timings', import_batch_id=import_batch_id, branch_id=upload_branch_id,
+                   records_processed=final_row_count, success=is_success)
         return jsonify(response), 200 if is_success else 207  # 207 = Multi-Status (partial success)
     
     except Exception as e:
         logger.error(f'Error importing sales data: {str(e)}')
         return jsonify({'success': False, 'error': 'Failed to import sales data'}), 500
+    finally:
+        # Closing without commit rolls back anything left uncommitted (early returns, errors)
+        if import_conn is not None:
+            import_conn.close()
+        if hash_claim is not None:
+            db_module.release_import_hash(*hash_claim)
+        instrumentation.deactivate(timer_token)
+
+
+@analytics_bp.route('/sales-data/import-profiles', methods=['GET'])
+def list_import_profiles():
+    """Return saved sales import profiles, for one branch when branch_id is given."""
+    branch_id = request.args.get('branch_id', None)
+    if branch_id is not None:
+        try:
+            branch_id = int(branch_id)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'branch_id must be an integer'}), 400
+    return jsonify({'success': True, 'data': db_module.fetch_import_profiles(branch_id)}), 200
+
+
+@analytics_bp.route('/sales-data/import-profiles', methods=['POST'])
+def save_import_profile():
+    """Create or replace a named import profile for a branch."""
+    try:
+        profile = ingest.ImportProfile.from_dict(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        db_module.upsert_import_profile(profile.to_dict())
+    except Exception as e:
+        logger.error(f'Error saving import profile {profile.name}: {str(e)}')
+        return jsonify({'success': False, 'error': 'Failed to save import profile'}), 500
+    return jsonify({'success': True, 'data': profile.to_dict()}), 200
+
+
+@analytics_bp.route('/sales-data/import-profiles/<name>', methods=['DELETE'])
+def delete_import_profile(name):
+    """Delete a branch's import profile by name."""
+    try:
+        branch_id = int(request.args.get('branch_id', 1))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'branch_id must be an integer'}), 400
+    if not db_module.delete_import_profile(branch_id, name):
+        return jsonify({'success': False, 'error': f'Import profile "{name}" not found for branch {branch_id}'}), 404
+    return jsonify({'success': True}), 200
 
 
 @analytics_bp.route('/eoq/recommendations', methods=['GET'])
@@ -0,0 +1,52 @@
+"""
+Shared fixtures for the analytics tests.
+
+Run from the analytics folder (no database needed):
+  python -m pytest tests
+Database access goes through tools/fake_supabase.FakeSupabaseClient, the same
+in-memory client the benchmark uses for its Supabase backend.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root (for `analytics.*`) and tools/ (for fake_supabase) to sys.path
+analytics_root = Path(__file__).parent.parent
+sys.path.insert(0, str(analytics_root.parent))
+sys.path.insert(0, str(analytics_root / 'tools'))
+
+from analytics import catalog  # noqa: E402
+from analytics import db as db_module  # noqa: E402
+from analytics import ingest  # noqa: E402
+from analytics import routes  # noqa: E402
+from analytics.app import create_app  # noqa: E402
+from fake_supabase import FakeSupabaseClient  # noqa: E402
+
+BRANCH_ID = 1
+PRODUCT_NAMES = ('LED Bulb 13W', 'LED Bulb 18W', 'Ceiling Fan 42in', 'Wall Switch 2-Gang', 'Extension Cord 5m')
+
+
+@pytest.fixture
+def supabase():
+    """A FakeSupabaseClient with one branch and five products, installed as db._supabase_client."""
+    client = FakeSupabaseClient(sleep=False)
+    client.seed('branch', [{'id': BRANCH_ID, 'location': 'Main'}])
+    client.seed('centralized_product', [
+        {'id': i, 'branch_id': BRANCH_ID, 'product_name': name, 'quantity': 1000, 'price': 10.0}
+        for i, name in enumerate(PRODUCT_NAMES, start=1)
+    ])
+    saved = db_module._supabase_client
+    db_module._supabase_client = client
+    catalog.invalidate()
+    routes._stockout_projections.invalidate()
+    ingest._source_date_formats.clear()
+    yield client
+    db_module._supabase_client = saved
+    catalog.invalidate()
+
+
+@pytest.fixture
+def client(supabase):
+    """Flask test client backed by the `supabase` fixture."""
+    return create_app().test_client()
@@ -0,0 +1,44 @@
+"""EOQCalculator.constrained_eoq against a general-purpose solver."""
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+
+from analytics.eoq_calculator import EOQCalculator
+
+
+def _random_products(n=6, seed=3):
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(200, 5000, n), rng.uniform(20, 80, n), rng.uniform(0.5, 4, n),
+            rng.uniform(2, 20, n), rng.uniform(0.1, 2, n))
+
+
+@pytest.mark.parametrize('budget_share, capacity_share', [(0.6, None), (None, 0.5), (0.8, 0.5)])
+def test_constrained_eoq_matches_slsqp(budget_share, capacity_share):
+    demand, ordering, holding, cost, volume = _random_products()
+    free = EOQCalculator.constrained_eoq(demand, ordering, holding, cost, volume)
+    budget = budget_share * free.attrs['unconstrained_budget'] if budget_share else None
+    capacity = capacity_share * free.attrs['unconstrained_capacity'] if capacity_share else None
+
+    result = EOQCalculator.constrained_eoq(demand, ordering, holding, cost, volume, budget=budget, capacity=capacity)
+
+    constraints = []
+    if budget is not None:
+        constraints.append({'type': 'ineq', 'fun': lambda q: budget - cost @ q})
+    if capacity is not None:
+        constraints.append({'type': 'ineq', 'fun': lambda q: capacity - volume @ q})
+    reference = minimize(lambda q: (demand * ordering / q + q * holding / 2).sum(),
+                         free['eoq_quantity'].to_numpy() * 0.5, method='SLSQP',
+                         bounds=[(1e-6, None)] * len(demand), constraints=constraints,
+                         options={'ftol': 1e-12, 'maxiter': 500})
+    assert reference.success
+    np.testing.assert_allclose(result['order_quantity'], reference.x, rtol=1e-3)
+    assert result['total_annual_cost'].sum() == pytest.approx(reference.fun, rel=1e-4)
+    if budget is not None:
+        assert result.attrs['budget_used'] <= budget * (1 + 1e-6)
+    if capacity is not None:
+        assert result.attrs['capacity_used'] <= capacity * (1 + 1e-6)
+
+
+def test_constrained_eoq_rejects_non_positive_limits():
+    with pytest.raises(ValueError):
+        EOQCalculator.constrained_eoq([100], [50], [2], budget=0)
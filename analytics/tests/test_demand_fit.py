@@ -0,0 +1,95 @@
+"""DemandForecaster.fit_demand against scalar references, and the measured error in calculate_eoq."""
+import numpy as np
+import pytest
+
+from analytics.eoq_calculator import DemandForecaster, EOQCalculator, EOQInput
+
+
+def _scalar_croston(series, croston_alpha=0.1, variant='sba'):
+    """Textbook Croston on one series: (rate, RMSE of the one-step forecasts, forecast count)."""
+    size = interval = rate = None
+    last, squared, count = -1, 0.0, 0
+    for t, demand in enumerate(series):
+        if rate is not None:
+            squared += (demand - rate) ** 2
+            count += 1
+        if demand > 0:
+            if size is None:
+                size, interval = demand, t + 1
+            else:
+                size += croston_alpha * (demand - size)
+                interval += croston_alpha * ((t - last) - interval)
+            rate = size / interval * (1 - croston_alpha / 2 if variant == 'sba' else 1.0)
+            last = t
+    return rate or 0.0, (squared / count) ** 0.5 if count else np.nan, count
+
+
+def _scalar_ses(series, alpha=0.3):
+    level, squared = series[0], 0.0
+    for demand in series[1:]:
+        squared += (demand - level) ** 2
+        level += alpha * (demand - level)
+    return level, (squared / (len(series) - 1)) ** 0.5
+
+
+@pytest.mark.parametrize('variant', ['sba', 'croston'])
+def test_fit_demand_matches_scalar_croston(variant):
+    rng = np.random.default_rng(7)
+    history = np.where(rng.random((40, 90)) < 0.15, rng.integers(1, 30, (40, 90)), 0).astype('float64')
+
+    fit = DemandForecaster.fit_demand(history, variant=variant)
+
+    intermittent = fit['method'] == variant
+    assert intermittent.sum() > 30
+    for row in np.flatnonzero(intermittent):
+        rate, std, _ = _scalar_croston(history[row], variant=variant)
+        assert fit['daily_rate'].iloc[row] == pytest.approx(rate, abs=1e-4)
+        assert fit['forecast_std'].iloc[row] == pytest.approx(std, abs=1e-4)
+
+
+def test_fit_demand_matches_scalar_ses_for_smooth_demand():
+    rng = np.random.default_rng(11)
+    history = rng.integers(20, 30, (10, 60)).astype('float64')
+
+    fit = DemandForecaster.fit_demand(history)
+
+    assert (fit['method'] == 'exponential').all()
+    for row in range(len(history)):
+        level, std = _scalar_ses(history[row])
+        assert fit['daily_rate'].iloc[row] == pytest.approx(level, abs=1e-4)
+        assert fit['forecast_std'].iloc[row] == pytest.approx(std, abs=1e-4)
+
+
+def test_fit_demand_short_history_has_no_forecast_std():
+    history = np.array([
+        [5, 6],  # one SES error
+        [0, 4],  # no Croston forecast yet
+        [0, 0],  # no demand
+    ], dtype='float64')
+    assert DemandForecaster.fit_demand(history)['forecast_std'].isna().all()
+
+
+def test_fit_demand_needs_min_forecast_errors():
+    two_errors = np.array([[0, 0, 0, 0, 0, 3.0, 0, 0]])
+    three_errors = np.array([[0, 0, 0, 0, 3.0, 0, 0, 0]])
+    assert _scalar_croston(two_errors[0])[2] == DemandForecaster.MIN_FORECAST_ERRORS - 1
+
+    assert np.isnan(DemandForecaster.fit_demand(two_errors)['forecast_std'].iloc[0])
+    assert DemandForecaster.fit_demand(three_errors)['forecast_std'].iloc[0] == pytest.approx(
+        _scalar_croston(three_errors[0])[1], abs=1e-4)
+
+
+@pytest.mark.parametrize('demand_std', [None, 0.0, float('nan')])
+def test_calculate_eoq_without_measured_error_uses_cv(demand_std):
+    eoq_input = EOQInput(annual_demand=3650, holding_cost=2, ordering_cost=50, unit_cost=5,
+                         lead_time_days=9, confidence_level=0.95, demand_std=demand_std)
+    result = EOQCalculator.calculate_eoq(eoq_input)
+    z = EOQCalculator._get_z_score(0.95)
+    assert result.safety_stock == pytest.approx(z * 10 * EOQCalculator.DEFAULT_DEMAND_CV * 3, abs=0.01)
+
+
+def test_calculate_eoq_uses_measured_error():
+    eoq_input = EOQInput(annual_demand=3650, holding_cost=2, ordering_cost=50, unit_cost=5,
+                         lead_time_days=9, confidence_level=0.95, demand_std=4.0)
+    result = EOQCalculator.calculate_eoq(eoq_input)
+    assert result.safety_stock == pytest.approx(EOQCalculator._get_z_score(0.95) * 4.0 * 3, abs=0.01)
@@ -0,0 +1,175 @@
+"""POST /api/analytics/sales-data/import over the fake Supabase client."""
+import hashlib
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from analytics import db as db_module
+
+IMPORT_URL = '/api/analytics/sales-data/import'
+
+
+def _sales_csv(days=28, extra_rows=()):
+    rows = ['product_name,quantity,date']
+    for day in range(1, days + 1):
+        rows.append(f'LED Bulb 13W,{day % 4 + 1},2025-08-{day:02d}')
+        rows.append(f'led bulb 18w,2,2025-08-{day:02d}')
+        rows.append(f'Ceiling Fan 42 in.,1,2025-08-{day:02d}')
+    rows.extend(extra_rows)
+    return '\n'.join(rows).encode()
+
+
+def _post(client, content, filename='sales.csv', **form):
+    data = {'file': (io.BytesIO(content), filename), 'branch_id': '1', **form}
+    return client.post(IMPORT_URL, data=data, content_type='multipart/form-data')
+
+
+def test_import_inserts_sales_and_eoq_per_product(client, supabase):
+    response = _post(client, _sales_csv())
+
+    body = response.get_json()
+    assert response.status_code == 200, body
+    assert body['records_imported'] == 84
+    assert len(supabase.rows('sales')) == 84
+    assert sorted(r['product_id'] for r in supabase.rows('eoq_calculations')) == [1, 2, 3]
+
+
+def test_one_failing_eoq_product_does_not_block_the_others(client, supabase, monkeypatch):
+    insert = db_module.insert_eoq_calculation
+
+    def failing_insert(product_id, branch_id, result, conn=None):
+        if int(product_id) == 2:
+            raise RuntimeError('simulated failure')
+        return insert(product_id, branch_id, result, conn=conn)
+
+    monkeypatch.setattr(db_module, 'insert_eoq_calculation', failing_insert)
+    response = _post(client, _sales_csv())
+
+    assert response.status_code == 200, response.get_json()
+    assert sorted(r['product_id'] for r in supabase.rows('eoq_calculations')) == [1, 3]
+    assert len(supabase.rows('sales')) == 84
+
+
+def test_duplicate_file_is_not_imported_twice(client, supabase):
+    content = _sales_csv()
+    first = _post(client, content)
+    second = _post(client, content)
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.get_json()['duplicate'] is True
+    assert second.get_json()['import_batch_id'] == first.get_json()['import_batch_id']
+    assert len(supabase.rows('sales')) == 84
+    assert len(supabase.rows('sales_import_batches')) == 1
+
+
+def _abandoned_claim(supabase, claimed_at):
+    content = _sales_csv()
+    supabase.seed('sales_import_batches', [{
+        'import_batch_id': 'dead-worker', 'content_hash': hashlib.sha256(content).hexdigest(),
+        'branch_id': 1, 'records_imported': 0, 'summary': None, 'claimed_at': claimed_at.isoformat(),
+    }])
+    return content
+
+
+def test_file_claimed_by_a_running_import_returns_409(client, supabase):
+    content = _abandoned_claim(supabase, datetime.utcnow())
+
+    response = _post(client, content)
+
+    assert response.status_code == 409
+    assert supabase.rows('sales') == []
+
+
+def test_stale_claim_of_a_dead_import_is_taken_over(client, supabase):
+    content = _abandoned_claim(supabase, datetime.utcnow() - timedelta(seconds=db_module.IMPORT_CLAIM_TTL + 60))
+
+    response = _post(client, content)
+
+    assert response.status_code == 200, response.get_json()
+    assert len(supabase.rows('sales')) == 84
+    batches = supabase.rows('sales_import_batches')
+    assert [b['import_batch_id'] for b in batches] == [response.get_json()['import_batch_id']]
+    assert batches[0]['summary'] is not None
+
+
+def test_failed_import_releases_the_hash_claim(client, supabase):
+    response = _post(client, b'product_id,qty\n1,2\n', filename='bad.csv')
+
+    assert response.status_code == 400
+    assert supabase.rows('sales_import_batches') == []
+
+
+def test_rows_dropped_in_validation_leave_no_empty_product_groups(client):
+    # 'Mystery Item' only appears on a row with an invalid quantity; with a categorical
+    # product column it must not come back as an empty group
+    response = _post(client, _sales_csv(extra_rows=['Mystery Item,abc,2025-08-03']))
+
+    body = response.get_json()
+    assert response.status_code == 200, body
+    names = {p['product_name'] for p in body['top_products']} | \
+        {r['product_name'] for r in body['restock_recommendations']}
+    assert 'Mystery Item' not in names
+    assert all(p['total_sold'] > 0 for p in body['top_products'])
+
+
+@pytest.mark.parametrize('dates, expected', [
+    (['03/04/2025', '15/04/2025', '28/04/2025'], '%d/%m/%Y'),
+    (['04/03/2025', '04/15/2025', '04/28/2025'], '%m/%d/%Y'),
+])
+def test_detected_date_format_is_stored_for_the_branch(client, supabase, dates, expected):
+    rows = ['product_name,quantity,date'] + [f'LED Bulb 13W,1,{d}' for d in dates]
+    response = _post(client, '\n'.join(rows).encode())
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['metrics']['date_format'] == expected
+    profiles = supabase.rows('sales_import_profiles')
+    assert [p['date_format'] for p in profiles] == [expected]
+
+def test_fuzzy_matches_need_the_same_numbers_and_are_reported(client):
+    response = _post(client, _sales_csv(extra_rows=['LED Bulb 15W,1,2025-08-03']))
+
+    matching = response.get_json()['product_matching']
+    assert matching['unmatched'] == 1
+    assert matching['fuzzy_matches'] == [{
+        'name': 'Ceiling Fan 42 in.', 'product_id': 3, 'branch_id': 1,
+        'matched_name': 'Ceiling Fan 42in', 'score': 1.0, 'rows': 28,
+    }]
+
+
+def test_import_profile_load_error_returns_500(client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('connection refused')
+
+    monkeypatch.setattr(db_module, 'get_import_profile', broken)
+    response = _post(client, _sales_csv(), profile='pos-export')
+
+    assert response.status_code == 500
+    assert 'import profile' in response.get_json()['error']
+
+
+def test_unknown_import_profile_returns_404(client):
+    response = _post(client, _sales_csv(), profile='missing')
+    assert response.status_code == 404
+
+
+def test_restock_resolves_all_digit_names_by_name(client, supabase):
+    # A product named '2024' (a model number) is not product_id 2024
+    supabase.seed('centralized_product', [
+        {'id': 6, 'branch_id': 1, 'product_name': '2024', 'quantity': 10, 'price': 5.0}])
+    rows = ['product_name,quantity,date'] + [f'2024,1,2025-08-{day:02d}' for day in range(1, 8)]
+    response = _post(client, '\n'.join(rows).encode())
+
+    body = response.get_json()
+    assert response.status_code == 200, body
+    assert body['product_matching']['name_index_ttl_seconds'] > 0
+    assert [r['product_id'] for r in supabase.rows('restock_recommendations')] == [6]
+
+
+def test_restock_of_an_id_keyed_file_keeps_its_ids(client, supabase):
+    rows = ['product_id,quantity,date'] + [f'{pid},1,2025-08-{day:02d}' for pid in (2, 4) for day in range(1, 8)]
+    response = _post(client, '\n'.join(rows).encode())
+
+    assert response.status_code == 200, response.get_json()
+    assert sorted(r['product_id'] for r in supabase.rows('restock_recommendations')) == [2, 4]
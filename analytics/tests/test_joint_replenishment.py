@@ -0,0 +1,46 @@
+"""EOQCalculator.joint_replenishment and the order schedule built from it."""
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from analytics.eoq_calculator import EOQCalculator
+
+
+def _brute_force_jrp(demand, holding, major, minor, max_multiplier=20):
+    dh = np.asarray(demand) * np.asarray(holding)
+    best = math.inf
+    for k in itertools.product(range(1, max_multiplier + 1), repeat=len(demand)):
+        k = np.array(k)
+        cycle = math.sqrt(2 * (major + (minor / k).sum()) / (k * dh).sum())
+        best = min(best, (major + (minor / k).sum()) / cycle + cycle / 2 * (k * dh).sum())
+    return best
+
+
+@pytest.mark.parametrize('demand, holding, major, minor', [
+    ([1000, 500, 50, 10], [2, 3, 1, 0.5], 100, [10, 20, 30, 40]),
+    ([12000, 800, 60], [1.5, 4, 2], 50, [5, 25, 60]),
+    ([400, 400, 400], [1, 1, 1], 80, [1, 1, 1]),
+])
+def test_joint_replenishment_matches_brute_force(demand, holding, major, minor):
+    result = EOQCalculator.joint_replenishment(demand, holding, major_ordering_cost=major,
+                                               minor_ordering_cost=minor)
+    best = _brute_force_jrp(demand, holding, major, np.asarray(minor, dtype='float64'))
+    assert result.attrs['total_annual_cost'] == pytest.approx(best, abs=0.01)
+    assert result.attrs['total_annual_cost'] <= result.attrs['independent_annual_cost']
+    assert (result['multiplier'] >= 1).all()
+
+
+def test_replenishment_schedule_caps_many_multipliers():
+    # the lcm of the first 20 primes overflows int64
+    primes = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71]
+    schedule = EOQCalculator.replenishment_schedule(list(range(20)), primes, [1] * 20, 7.0)
+    assert len(schedule) == 52
+    assert schedule[0]['product_count'] == 20
+
+
+def test_replenishment_schedule_repeats_after_lcm():
+    schedule = EOQCalculator.replenishment_schedule([1, 2, 3], [1, 2, 4], [10, 20, 40], 7.0)
+    assert [entry['product_ids'] for entry in schedule] == [[1, 2, 3], [1], [1, 2], [1]]
+    assert [entry['day'] for entry in schedule] == [0.0, 7.0, 14.0, 21.0]
@@ -0,0 +1,45 @@
+"""Opt-in request profiling: file naming and the profile directory cap."""
+import pytest
+from flask import Flask, jsonify
+
+from analytics import profiling
+
+
+@pytest.fixture
+def profiled_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', tmp_path)
+    app = Flask(__name__)
+
+    @app.route('/work')
+    @profiling.profiled('work')
+    def work():
+        return jsonify({'total': sum(range(1000))}), 200
+
+    return app.test_client()
+
+
+def _profile(client, request_id=None):
+    headers = {profiling.PROFILE_HEADER: '1'}
+    if request_id is not None:
+        headers[profiling.REQUEST_ID_HEADER] = request_id
+    return client.get('/work', headers=headers).headers['X-Analytics-Profile-Id']
+
+
+def test_reused_request_ids_do_not_overwrite_profiles(profiled_client, tmp_path):
+    first = _profile(profiled_client, '../../etc/passwd x')
+    second = _profile(profiled_client, '../../etc/passwd x')
+
+    assert first != second
+    assert first.startswith('______etc_passwd_x-')
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        f'{stem}{suffix}' for stem in (first, second) for suffix in ('.prof', '.txt'))
+
+
+def test_profile_directory_keeps_the_newest(profiled_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'MAX_PROFILES', 3)
+
+    ids = [_profile(profiled_client) for _ in range(5)]
+
+    assert sorted(p.stem for p in tmp_path.glob('*.prof')) == sorted(ids[-3:])
+    assert sorted(p.stem for p in tmp_path.glob('*.txt')) == sorted(ids[-3:])
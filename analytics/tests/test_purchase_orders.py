@@ -0,0 +1,45 @@
+"""Purchase order drafts over the fake Supabase client."""
+from analytics import purchase_orders
+
+
+def _seed_due_products(supabase):
+    supabase.tables['centralized_product'][0]['quantity'] = 2
+    supabase.tables['centralized_product'][1]['quantity'] = 0
+    supabase.seed('eoq_calculations', [
+        {'product_id': pid, 'branch_id': 1, 'eoq_quantity': 30, 'reorder_point': 10,
+         'calculated_at': '2026-10-01T00:00:00'}
+        for pid in (1, 2)
+    ])
+
+
+def test_drafts_are_saved_in_one_rpc(supabase):
+    _seed_due_products(supabase)
+    supabase.reset_calls()
+
+    purchase_orders.generate_drafts(branch_id=1)
+    result = purchase_orders.generate_drafts(branch_id=1)  # replaces the day's draft
+
+    assert supabase.call_counts()['save_purchase_order_drafts.rpc'] == 2
+    assert not any(name.startswith('purchase_order_draft') for name in supabase.call_counts())
+    assert len(supabase.rows('purchase_order_drafts')) == 1
+    items = supabase.rows('purchase_order_draft_items')
+    assert sorted(item['product_id'] for item in items) == [1, 2]
+    assert {item['draft_id'] for item in items} == {result['draft_ids'][1]}
+
+
+def test_drafts_for_an_unknown_branch_return_404(client, supabase):
+    response = client.post('/api/analytics/purchase-orders/drafts', json={'branch_id': 99})
+
+    assert response.status_code == 404
+    assert supabase.rows('purchase_order_drafts') == []
+
+
+def test_drafts_for_a_known_branch(client, supabase):
+    _seed_due_products(supabase)
+
+    response = client.post('/api/analytics/purchase-orders/drafts', json={'branch_id': 1})
+
+    body = response.get_json()
+    assert response.status_code == 200, body
+    assert body['summary']['lines'] == 2
+    assert body['data'][0]['draft_id'] is not None
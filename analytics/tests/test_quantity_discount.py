@@ -0,0 +1,63 @@
+"""EOQCalculator.quantity_discount_eoq and the price-break routes."""
+import math
+
+import numpy as np
+import pytest
+
+from analytics.eoq_calculator import EOQCalculator
+
+EOQ_URL = '/api/analytics/eoq/calculate'
+QUANTITY_DISCOUNT_URL = '/api/analytics/eoq/quantity-discount'
+TEXTBOOK_BREAKS = [{'min_quantity': 0, 'unit_cost': 5.00}, {'min_quantity': 1000, 'unit_cost': 4.80},
+                   {'min_quantity': 2000, 'unit_cost': 4.75}]
+
+
+def test_quantity_discount_eoq_textbook_example():
+    # D = 5000, S = 49, H = 20% of price; breaks at 0 ($5.00), 1000 ($4.80), 2000 ($4.75).
+    # Q* at $4.80 is 714, raised to the 1000 break: 24000 + 245 + 480 = 24725
+    result = EOQCalculator.quantity_discount_eoq([5000], [49], [[0, 1000, 2000]], [[5.00, 4.80, 4.75]],
+                                                 holding_rate=0.2)
+    row = result.iloc[0]
+    assert row['eoq_quantity'] == 1000
+    assert row['unit_cost'] == 4.80
+    assert row['total_annual_cost'] == pytest.approx(24725)
+    assert row['discount_savings'] == pytest.approx(1000)
+
+
+def test_quantity_discount_eoq_without_breaks_is_nan():
+    result = EOQCalculator.quantity_discount_eoq([5000, 0], [49, 49], [[0, np.nan], [0, 100]],
+                                                 [[5.0, np.nan], [5.0, 4.0]])
+    assert result['eoq_quantity'].iloc[0] == pytest.approx(math.sqrt(2 * 5000 * 49 / (0.25 * 5)), abs=0.01)
+    assert np.isnan(result['eoq_quantity'].iloc[1])
+
+
+def test_quantity_discount_route_uses_supplied_holding_costs(client):
+    response = client.post(QUANTITY_DISCOUNT_URL, json={'holding_cost_percentage': 0.2, 'products': [
+        {'product_id': 1, 'annual_demand': 5000, 'ordering_cost': 49, 'price_breaks': TEXTBOOK_BREAKS},
+        {'product_id': 2, 'annual_demand': 5000, 'ordering_cost': 49, 'holding_cost': 0.49,
+         'price_breaks': TEXTBOOK_BREAKS},
+    ]})
+
+    body = response.get_json()
+    assert response.status_code == 200, body
+    rate_based, fixed = body['data']
+    assert rate_based['holding_cost'] == pytest.approx(0.96)
+    # H = 0.49 puts Q* = √(2·5000·49/0.49) = 1000 below the 2000 break, where 4.75 wins
+    assert fixed['holding_cost'] == pytest.approx(0.49)
+    assert fixed['eoq_quantity'] == 2000
+
+
+@pytest.mark.parametrize('url, extra', [
+    (EOQ_URL, {'holding_cost': 1, 'unit_cost': 5}),
+    (QUANTITY_DISCOUNT_URL, {}),
+])
+@pytest.mark.parametrize('price_break', [{'min_quantity': 1000}, [1000], [1000, None], {'unit_cost': 'cheap'}])
+def test_malformed_price_break_returns_400(client, url, extra, price_break):
+    product = {'annual_demand': 5000, 'ordering_cost': 49, **extra,
+               'price_breaks': [{'min_quantity': 0, 'unit_cost': 5.0}, price_break]}
+    body = product if url == EOQ_URL else {'products': [product]}
+
+    response = client.post(url, json=body)
+
+    assert response.status_code == 400
+    assert 'price break' in response.get_json()['error'].lower()
@@ -0,0 +1,45 @@
+"""DemandForecaster.forecast_curves: per-day demand curves behind the stockout projection."""
+import numpy as np
+import pytest
+
+from analytics.eoq_calculator import DemandForecaster
+
+
+
+def test_forecast_curves_endpoint_matches_scalar_forecast():
+    history = np.array([[3.0, 5, 4, 6, 8, 7, 9], [10, 9, 8, 8, 7, 6, 5]])
+    curves = DemandForecaster.forecast_curves(history, 5)
+    for row in range(len(history)):
+        scalar = DemandForecaster.forecast_multiple_periods(history[row].tolist(), 5)
+        np.testing.assert_allclose(curves[row], scalar['forecasts'], atol=1e-9)
+
+
+def test_forecast_curves_damped_trend_bounds_a_single_spike():
+    flat = np.full(30, 2.0)
+    spike_last, spike_first = flat.copy(), flat.copy()
+    spike_last[-1] = spike_first[0] = 20.0
+    history = np.vstack([flat, spike_last, spike_first])
+
+    endpoint = DemandForecaster.forecast_curves(history, 180).sum(axis=1)
+    damped = DemandForecaster.forecast_curves(history, 180, trend='damped').sum(axis=1)
+
+    assert damped[0] == pytest.approx(360)
+    # the endpoint trend multiplies 180 days of demand by ~28 or drives it to ~0
+    assert endpoint[1] > 20 * damped[0] and endpoint[2] < 0.01 * damped[0]
+    assert damped[1] < 2 * damped[0]
+    assert damped[2] > 0.4 * damped[0]
+
+
+def test_forecast_curves_start_skips_days_before_first_sale():
+    series = np.array([4.0, 6, 5, 5, 4, 6])
+    padded = np.concatenate([np.zeros(10), series])
+
+    shifted = DemandForecaster.forecast_curves(padded[None, :], 7, trend='damped', start=np.array([10]))
+    sliced = DemandForecaster.forecast_curves(series[None, :], 7, trend='damped')
+
+    np.testing.assert_allclose(shifted, sliced, atol=1e-9)
+
+
+def test_forecast_curves_rejects_unknown_trend():
+    with pytest.raises(ValueError):
+        DemandForecaster.forecast_curves(np.ones((1, 5)), 3, trend='linear')
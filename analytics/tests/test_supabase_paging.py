@@ -0,0 +1,33 @@
+"""db.py Supabase paths: paging past the row cap and the latest EOQ row per product."""
+from analytics import db as db_module
+
+
+
+def test_selects_page_past_the_row_cap(supabase):
+    supabase.max_rows = 1000
+    supabase.seed('centralized_product', [
+        {'id': 100 + i, 'branch_id': 1, 'product_name': f'Item {i}', 'quantity': 5, 'price': 2.0}
+        for i in range(2495)
+    ])
+
+    positions = db_module.fetch_inventory_positions(branch_id=1)
+
+    assert len(positions) == 2500
+    assert len({p['product_id'] for p in positions}) == 2500
+
+
+def test_positions_read_the_latest_eoq_row(supabase):
+    supabase.seed('eoq_calculations', [
+        {'product_id': 1, 'branch_id': 1, 'eoq_quantity': 10, 'reorder_point': 5,
+         'calculated_at': '2026-01-01T00:00:00'},
+        {'product_id': 1, 'branch_id': 1, 'eoq_quantity': 40, 'reorder_point': 20,
+         'calculated_at': '2026-03-01T00:00:00'},
+        {'product_id': 1, 'branch_id': 1, 'eoq_quantity': 25, 'reorder_point': 12,
+         'calculated_at': '2026-02-01T00:00:00'},
+    ])
+
+    positions = {p['product_id']: p for p in db_module.fetch_inventory_positions(branch_id=1)}
+
+    assert positions[1]['eoq_quantity'] == 40
+    assert positions[1]['reorder_point'] == 20
+
@@ -0,0 +1,403 @@
+"""
+Repeatable benchmarks for the analytics service.
+
+Datasets come from generate_synthetic_sales (seeded, so runs are comparable).
+
+Covers EOQCalculator, DemandForecaster, InventoryAnalytics.calculate_abc_analysis
+and an end-to-end POST /api/analytics/sales-data/import against an in-process app
+whose db.py helpers are stubbed (no database or Supabase needed). With
+--backend fake-supabase the real db.py Supabase code paths run against
+fake_supabase.FakeSupabaseClient instead, and the HTTP call count is recorded.
+
+Usage:
+  python analytics/tools/benchmark.py                          # 1k, 100k, 1M rows
+  python analytics/tools/benchmark.py --sizes 1000,100000 --output bench.json
+  python analytics/tools/benchmark.py --baseline baseline.json --threshold 0.2
+  python analytics/tools/benchmark.py --only import --backend fake-supabase --latency-ms 5
+
+With --baseline, each (benchmark, size) is compared on its best time and the
+script exits with status 1 when any is slower than baseline * (1 + threshold),
+or when it makes more Supabase calls than the baseline did.
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the project root to sys.path to enable imports
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from analytics import db as db_module  # noqa: E402
+from analytics import instrumentation  # noqa: E402
+from analytics.app import create_app  # noqa: E402
+from analytics.eoq_calculator import (  # noqa: E402
+    DemandForecaster,
+    EOQCalculator,
+    EOQInput,
+    InventoryAnalytics,
+)
+from fake_supabase import FakeSupabaseClient  # noqa: E402
+from generate_synthetic_sales import generate_sales_frame, synthetic_catalog  # noqa: E402
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+# Scalar-per-row benchmarks run once above 100k rows
+SLOW_BENCHMARKS = ('eoq', 'import')
+# Opt-in via --only; 'memory' replays the import under tracemalloc
+DEFAULT_BENCHMARKS = ('eoq', 'forecast', 'abc', 'import')
+
+
+class StubBackend:
+    """Replaces the db.py helpers used by the import route with in-memory stand-ins.
+
+    Every product has effectively unlimited stock, so imports always succeed and the
+    timing reflects the route's own work. Product names come from the same synthetic
+    catalog the generated sales use. Use as a context manager.
+    """
+
+    def __init__(self, seed: int = 42):
+        self.calls = {}
+        self._saved = {}
+        self.catalog = synthetic_catalog(500, 3, seed)  # matches generate_sales_frame defaults
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _stubs(self):
+        def counted(name, fn):
+            def wrapper(*args, **kwargs):
+                self._count(name)
+                return fn(*args, **kwargs)
+            return wrapper
+
+        def validate_products_exist(product_ids, branch_ids=None, conn=None):
+            return set(zip(product_ids, branch_ids or []))
+
+        def get_product_stock(product_ids, branch_ids=None, conn=None):
+            return {(pid, bid): 1_000_000 for pid, bid in zip(product_ids, branch_ids or [])}
+
+        def insert_sales_rows(rows, commit=True, conn=None):
+            return len(list(rows))
+
+        def insert_many(entries, conn=None):
+            return len(list(entries))
+
+        names = dict(zip(self.catalog['product_id'].astype(int), self.catalog['product_name']))
+
+        def fetch_branch_product_names(branch_id, conn=None):
+            rows = self.catalog[self.catalog['branch_id'] == int(branch_id)]
+            return list(zip(rows['product_id'].astype(int), rows['product_name']))
+
+        stubs = {
+            'get_import_batch_by_hash': lambda *a, **k: None,
+            'claim_import_hash': lambda *a, **k: True,
+            'release_import_hash': lambda *a, **k: None,
+            'record_import_batch': lambda *a, **k: True,
+            'begin_import_transaction': lambda: None,
+            'get_import_profile': lambda *a, **k: None,
+            'upsert_import_profile': lambda *a, **k: True,
+            'validate_products_exist': validate_products_exist,
+            'get_product_stock': get_product_stock,
+            'get_product_names': lambda ids, conn=None: {int(i): names.get(int(i), f'Product {i}') for i in ids},
+            'get_product_id_by_name': lambda name, branch_id=None, conn=None: None,
+            'fetch_branch_product_names': fetch_branch_product_names,
+            'insert_sales_rows': insert_sales_rows,
+            'insert_product_demand_history': insert_many,
+            'insert_sales_forecasts': insert_many,
+            'insert_inventory_analytics': insert_many,
+            'insert_eoq_calculation': lambda *a, **k: True,
+            'insert_restock_recommendations': lambda *a, **k: True,
+            'insert_restock_recommendations_bulk': lambda entries, branch_id, conn=None: len(list(entries)),
+            'get_stock_deductions_by_batch': lambda *a, **k: [],
+        }
+        return {name: counted(name, fn) for name, fn in stubs.items()}
+
+    def __enter__(self):
+        for name, stub in self._stubs().items():
+            self._saved[name] = getattr(db_module, name)
+            setattr(db_module, name, stub)
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._saved.items():
+            setattr(db_module, name, original)
+        self._saved.clear()
+
+
+class FakeSupabaseBackend:
+    """Points db._supabase_client at a FakeSupabaseClient seeded with the synthetic catalog.
+
+    Unlike StubBackend, the db.py helpers themselves run, so their Supabase request
+    patterns (and the simulated latency of each request) are part of the timing.
+    """
+
+    def __init__(self, seed: int, latency_ms: float = 0.0):
+        self.client = FakeSupabaseClient(latency_ms=latency_ms)
+        catalog = synthetic_catalog(500, 3, seed)  # matches generate_sales_frame defaults
+        self.client.seed('centralized_product', [
+            {'id': int(row.product_id), 'branch_id': int(row.branch_id), 'product_name': row.product_name,
+             'price': float(row.price), 'quantity': 10_000_000}
+            for row in catalog.itertuples(index=False)
+        ])
+        self._seeded = {name: [dict(r) for r in rows] for name, rows in self.client.tables.items()}
+        self._saved = None
+
+    def reset(self):
+        """Restore the seeded tables so every run imports into the same state."""
+        self.client.tables = {name: [dict(r) for r in rows] for name, rows in self._seeded.items()}
+
+    @property
+    def calls(self) -> dict:
+        return self.client.call_counts()
+
+    def __enter__(self):
+        self._saved = db_module._supabase_client
+        db_module._supabase_client = instrumentation.count_supabase_calls(self.client)
+        return self
+
+    def __exit__(self, *exc):
+        db_module._supabase_client = self._saved
+
+
+def time_call(fn, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def result_entry(name: str, size: int, timings: list, **extra) -> dict:
+    best = min(timings)
+    return {
+        'name': name,
+        'size': size,
+        'repeat': len(timings),
+        'seconds_min': round(best, 6),
+        'seconds_median': round(statistics.median(timings), 6),
+        'items_per_second': round(size / best, 1) if best > 0 else None,
+        **extra,
+    }
+
+
+def bench_eoq(df: pd.DataFrame, repeat: int) -> dict:
+    inputs = [
+        EOQInput(annual_demand=float(q) * 365, holding_cost=float(p) * 0.25, ordering_cost=100, unit_cost=float(p))
+        for q, p in zip(df['quantity'].to_numpy(), df['unit_price'].to_numpy())
+    ]
+
+    def run():
+        for eoq_input in inputs:
+            EOQCalculator.calculate_eoq(eoq_input)
+    return result_entry('eoq_calculator.calculate_eoq', len(df), time_call(run, repeat))
+
+
+def bench_forecast(df: pd.DataFrame, repeat: int) -> dict:
+    series = df['quantity'].astype(float).tolist()
+
+    def run():
+        DemandForecaster.exponential_smoothing(series, 0.3)
+        DemandForecaster.forecast_multiple_periods(series, periods_ahead=30)
+    return result_entry('demand_forecaster.smoothing_and_forecast', len(df), time_call(run, repeat))
+
+
+def bench_abc(df: pd.DataFrame, repeat: int) -> dict:
+    products = [
+        {'id': i, 'annual_demand': float(q) * 365, 'unit_cost': float(p)}
+        for i, (q, p) in enumerate(zip(df['quantity'].to_numpy(), df['unit_price'].to_numpy()))
+    ]
+    return result_entry('inventory_analytics.calculate_abc_analysis', len(df),
+                        time_call(lambda: InventoryAnalytics.calculate_abc_analysis(products), repeat))
+
+
+def bench_import(df: pd.DataFrame, repeat: int, backend: str = 'stub', seed: int = 42,
+                 latency_ms: float = 0.0) -> dict:
+    app = create_app()
+    app.config['MAX_CONTENT_LENGTH'] = None  # benchmark files exceed the 16MB upload cap
+    client = app.test_client()
+    payload = df.to_csv(index=False).encode()
+    last = {}
+
+    def run():
+        response = client.post(
+            '/api/analytics/sales-data/import?force=true',
+            data={'file': (io.BytesIO(payload), 'benchmark.csv'), 'branch_id': '1'},
+            content_type='multipart/form-data',
+        )
+        body = response.get_json() or {}
+        if response.status_code not in (200, 207):
+            raise RuntimeError(f'import failed with {response.status_code}: {body.get("error")}')
+        last['body'] = body
+
+    if backend == 'fake-supabase':
+        fake = FakeSupabaseBackend(seed, latency_ms)
+
+        def run_reset():
+            fake.reset()
+            fake.client.reset_calls()
+            run()
+        with fake:
+            timings = time_call(run_reset, repeat)
+        body = last.get('body', {})
+        return result_entry('routes.import_sales_data[fake-supabase]', len(df), timings,
+                            records_imported=body.get('records_imported'),
+                            stages=(body.get('timings') or {}).get('stages'),
+                            supabase_calls=fake.client.total_calls,
+                            supabase_calls_by_table=fake.calls,
+                            simulated_latency_ms=latency_ms)
+
+    with StubBackend(seed) as stub:
+        timings = time_call(run, repeat)
+    body = last.get('body', {})
+    return result_entry('routes.import_sales_data', len(df), timings,
+                        records_imported=body.get('records_imported'),
+                        stages=(body.get('timings') or {}).get('stages'),
+                        stub_calls=stub.calls)
+
+
+def bench_memory(df: pd.DataFrame, repeat: int, backend: str = 'stub', seed: int = 42) -> dict:
+    # tracemalloc slows the run several-fold, so this is a separate, single-run benchmark
+    from memory_harness import replay_import
+    return replay_import(df.to_csv(index=False).encode(), 'benchmark.csv', len(df), backend, seed)
+
+
+BENCHMARKS = {
+    'eoq': bench_eoq,
+    'forecast': bench_forecast,
+    'abc': bench_abc,
+    'import': bench_import,
+    'memory': bench_memory,
+}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes, names, repeat: int, seed: int, backend: str = 'stub', latency_ms: float = 0.0) -> dict:
+    results = []
+    for size in sizes:
+        df = generate_sales_frame(size, seed=seed)
+        for name in names:
+            runs = 1 if name in SLOW_BENCHMARKS and size > 100_000 else repeat
+            print(f'  {name:<8} {size:>9,} rows ...', end='', flush=True)
+            if name == 'import':
+                entry = bench_import(df, runs, backend=backend, seed=seed, latency_ms=latency_ms)
+            elif name == 'memory':
+                entry = bench_memory(df, 1, backend=backend, seed=seed)
+            else:
+                entry = BENCHMARKS[name](df, runs)
+            print(f' {entry["seconds_min"]:.4f}s')
+            results.append(entry)
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'seed': seed,
+            'repeat': repeat,
+            'backend': backend,
+            'latency_ms': latency_ms,
+        },
+        'results': results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Return (name, size, baseline, current, ratio) for results slower than the threshold.
+
+    Results that record `supabase_calls` also regress on any increase in that count,
+    since an extra request per row costs far more against the real service; memory
+    results regress when their tracemalloc peak grows beyond the threshold.
+    """
+    base = {(r['name'], r['size']): r for r in baseline.get('results', [])}
+    regressions = []
+    print(f'\n{"benchmark":<45} {"size":>9} {"baseline":>10} {"current":>10} {"ratio":>7}')
+    for entry in current['results']:
+        previous = base.get((entry['name'], entry['size']))
+        if not previous or not previous.get('seconds_min'):
+            continue
+        ratio = entry['seconds_min'] / previous['seconds_min']
+        flag = '  REGRESSION' if ratio > 1 + threshold else ''
+        print(f'{entry["name"]:<45} {entry["size"]:>9,} {previous["seconds_min"]:>10.4f} {entry["seconds_min"]:>10.4f} {ratio:>7.2f}{flag}')
+        if flag:
+            regressions.append((entry['name'], entry['size'], previous['seconds_min'], entry['seconds_min'], ratio))
+        calls, previous_calls = entry.get('supabase_calls'), previous.get('supabase_calls')
+        if calls is not None and previous_calls and calls > previous_calls:
+            print(f'{"":<45} {"":>9} {previous_calls:>10,} {calls:>10,} {calls / previous_calls:>7.2f}  MORE SUPABASE CALLS')
+            regressions.append((entry['name'], entry['size'], previous_calls, calls, calls / previous_calls))
+        peak = (entry.get('memory') or {}).get('peak_tracemalloc_bytes')
+        previous_peak = (previous.get('memory') or {}).get('peak_tracemalloc_bytes')
+        if peak is not None and previous_peak:
+            growth = peak / previous_peak
+            flag = '  MEMORY REGRESSION' if growth > 1 + threshold else ''
+            print(f'{"  peak memory (MB)":<45} {"":>9} {previous_peak / 2**20:>10.1f} {peak / 2**20:>10.1f} {growth:>7.2f}{flag}')
+            if flag:
+                regressions.append((entry['name'], entry['size'], previous_peak, peak, growth))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the analytics calculators and import route')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='comma-separated dataset sizes in rows (default: 1000,100000,1000000)')
+    parser.add_argument('--only', default=','.join(DEFAULT_BENCHMARKS),
+                        help=f'comma-separated subset of: {", ".join(BENCHMARKS)}')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark; the best time is compared')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--backend', choices=('stub', 'fake-supabase'), default='stub',
+                        help='import benchmark backend: stubbed db.py helpers, or db.py against a fake Supabase client')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='simulated latency per Supabase request with --backend fake-supabase')
+    parser.add_argument('--output', default='benchmark-results.json', help='where to write the JSON results')
+    parser.add_argument('--baseline', help='previous results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown vs baseline before failing (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    names = [n.strip() for n in args.only.split(',') if n.strip()]
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmark(s): {", ".join(unknown)}')
+
+    # The import route logs every stage (and expected duplicate warnings); keep the output readable
+    logging.disable(logging.WARNING)
+
+    print(f'Running {", ".join(names)} at sizes {sizes} (repeat={args.repeat}, seed={args.seed}, backend={args.backend})')
+    current = run_benchmarks(sizes, names, args.repeat, args.seed, args.backend, args.latency_ms)
+
+    Path(args.output).write_text(json.dumps(current, indent=2, default=str))
+    print(f'\nResults written to {os.path.abspath(args.output)}')
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}')
+            sys.exit(1)
+        print('\nNo regressions beyond threshold')
+
+
+if __name__ == '__main__':
+    main()
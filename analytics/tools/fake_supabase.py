@@ -0,0 +1,390 @@
+"""
+In-process stand-in for the Supabase client, covering the API subset db.py uses.
+
+Tables are lists of dicts in memory. Every `.execute()` is recorded (table, operation,
+filters, rows) and can sleep for a simulated network latency, so the HTTP patterns of
+the Supabase code paths can be benchmarked and their call counts asserted offline.
+
+Usage:
+  from fake_supabase import FakeSupabaseClient
+  from analytics import db, instrumentation
+
+  client = FakeSupabaseClient(latency_ms=20)
+  client.seed('centralized_product', [{'id': 1, 'branch_id': 1, 'product_name': 'Bulb', 'quantity': 100}])
+  db._supabase_client = instrumentation.count_supabase_calls(client)
+  ...
+  print(client.call_counts())   # {'centralized_product.select': 3, 'sales.insert': 1, ...}
+"""
+
+import copy
+import itertools
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+
+@dataclass
+class FakeResponse:
+    """Shape of supabase-py's APIResponse that db.py reads (.data, .error, .count)."""
+    data: list = field(default_factory=list)
+    error: object = None
+    count: int | None = None
+
+
+@dataclass
+class FakeCall:
+    table: str
+    operation: str
+    filters: tuple
+    rows: int
+    latency_ms: float
+
+
+def _comparable(left, right):
+    # PostgREST filters arrive as strings; compare loosely when the types differ
+    if type(left) is type(right) or isinstance(left, (int, float)) and isinstance(right, (int, float)):
+        return left, right
+    return str(left), str(right)
+
+
+def _matches(row: dict, filters: list) -> bool:
+    for op, column, value in filters:
+        current = row.get(column)
+        if op == 'in':
+            if not any(current == v or str(current) == str(v) for v in value):
+                return False
+            continue
+        if op == 'is':
+            # PostgREST is.null / is.true / is.false
+            if {'null': None, 'true': True, 'false': False}.get(str(value).lower(), value) is not current:
+                return False
+            continue
+        if current is None:
+            return False
+        left, right = _comparable(current, value)
+        if op == 'eq' and left != right:
+            return False
+        if op == 'neq' and left == right:
+            return False
+        if op == 'gt' and not left > right:
+            return False
+        if op == 'gte' and not left >= right:
+            return False
+        if op == 'lt' and not left < right:
+            return False
+        if op == 'lte' and not left <= right:
+            return False
+    return True
+
+
+def _latest_eoq(tables: dict) -> list:
+    """eoq_calculations_latest: the newest eoq_calculations row per (product_id, branch_id)."""
+    latest = {}
+    for row in tables.get('eoq_calculations', []):
+        key = (row.get('product_id'), row.get('branch_id'))
+        current = latest.get(key)
+        if current is None or (str(row.get('calculated_at')), row.get('id') or 0) > \
+                (str(current.get('calculated_at')), current.get('id') or 0):
+            latest[key] = row
+    return list(latest.values())
+
+
+def _first_sale(tables: dict) -> list:
+    """product_first_sale: MIN(period_date) of product_demand_history per (product_id, branch_id)."""
+    first = {}
+    for row in tables.get('product_demand_history', []):
+        key = (row.get('product_id'), row.get('branch_id'))
+        if key not in first or str(row.get('period_date')) < str(first[key]):
+            first[key] = row.get('period_date')
+    return [{'product_id': p, 'branch_id': b, 'first_sale_date': d} for (p, b), d in first.items()]
+
+
+# Read-only views of schema.sql, computed from the base tables on each select
+VIEWS = {'eoq_calculations_latest': _latest_eoq, 'product_first_sale': _first_sale}
+
+
+def _save_purchase_order_drafts(client: 'FakeSupabaseClient', params: dict) -> dict:
+    """save_purchase_order_drafts(p_headers, p_items): upsert headers, replace their lines."""
+    drafts = client.tables.setdefault('purchase_order_drafts', [])
+    lines = client.tables.setdefault('purchase_order_draft_items', [])
+    draft_ids = {}
+    for header in params.get('p_headers') or []:
+        existing = next((r for r in drafts if str(r.get('branch_id')) == str(header['branch_id'])
+                         and str(r.get('draft_date')) == str(header['draft_date'])), None)
+        if existing is None:
+            existing = client._with_id('purchase_order_drafts', dict(header))
+            drafts.append(existing)
+        else:
+            existing.update(header)
+        draft_ids[str(header['branch_id'])] = existing['id']
+    lines[:] = [r for r in lines if r.get('draft_id') not in draft_ids.values()]
+    for item in params.get('p_items') or []:
+        row = {k: v for k, v in item.items() if k != 'branch_id'}
+        row['draft_id'] = draft_ids[str(item['branch_id'])]
+        lines.append(client._with_id('purchase_order_draft_items', row))
+    return draft_ids
+
+
+# SQL functions of schema.sql callable through client.rpc(); each runs under the client lock
+RPCS = {'save_purchase_order_drafts': _save_purchase_order_drafts}
+
+
+class FakeQuery:
+    """Chainable builder returned by `FakeSupabaseClient.table`."""
+
+    def __init__(self, client: 'FakeSupabaseClient', table: str):
+        self._client = client
+        self._table = table
+        self._operation = 'select'
+        self._columns = None
+        self._payload = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._offset = 0
+        self._count = None
+
+    # operations
+    def select(self, columns: str = '*', count: str | None = None):
+        self._operation = 'select'
+        self._columns = None if columns.strip() == '*' else [c.strip() for c in columns.split(',') if c.strip()]
+        self._count = count
+        return self
+
+    def insert(self, rows):
+        self._operation = 'insert'
+        self._payload = rows
+        return self
+
+    def upsert(self, rows, on_conflict: str | None = None, ignore_duplicates: bool = False, **_):
+        self._operation = 'upsert'
+        self._payload = rows
+        self._ignore_duplicates = ignore_duplicates
+        self._on_conflict = [c.strip() for c in on_conflict.split(',')] if on_conflict else ['id']
+        return self
+
+    def update(self, values: dict):
+        self._operation = 'update'
+        self._payload = values
+        return self
+
+    def delete(self):
+        self._operation = 'delete'
+        return self
+
+    # filters and modifiers
+    def eq(self, column, value):
+        self._filters.append(('eq', column, value))
+        return self
+
+    def neq(self, column, value):
+        self._filters.append(('neq', column, value))
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(('gt', column, value))
+        return self
+
+    def gte(self, column, value):
+        self._filters.append(('gte', column, value))
+        return self
+
+    def is_(self, column, value):
+        self._filters.append(('is', column, value))
+        return self
+
+    def lt(self, column, value):
+        self._filters.append(('lt', column, value))
+        return self
+
+    def lte(self, column, value):
+        self._filters.append(('lte', column, value))
+        return self
+
+    def in_(self, column, values):
+        self._filters.append(('in', column, list(values)))
+        return self
+
+    def order(self, column, desc: bool = False, **_):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, count: int, **_):
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def execute(self) -> FakeResponse:
+        return self._client._execute(self)
+
+
+class FakeRpc:
+    """Builder returned by `FakeSupabaseClient.rpc`."""
+
+    def __init__(self, client: 'FakeSupabaseClient', name: str, params: dict | None):
+        self._client = client
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> FakeResponse:
+        return self._client._execute_rpc(self)
+
+
+class FakeSupabaseClient:
+    """Supabase client double with in-memory tables, call accounting and simulated latency.
+
+    latency_ms:         added to every execute() (one HTTP round trip)
+    latency_per_row_ms: added per row sent or returned (payload transfer)
+    max_rows:           cap on rows per select response, like PostgREST's max-rows (1000 on Supabase)
+    sleep:              actually sleep for the latency; when False it is only accounted
+    """
+
+    def __init__(self, tables: dict | None = None, latency_ms: float = 0.0,
+                 latency_per_row_ms: float = 0.0, sleep: bool = True, max_rows: int | None = None):
+        self.latency_ms = latency_ms
+        self.latency_per_row_ms = latency_per_row_ms
+        self.sleep = sleep
+        self.max_rows = max_rows
+        self.tables = {}
+        self.calls = []
+        self._ids = {}
+        self._lock = threading.Lock()
+        for name, rows in (tables or {}).items():
+            self.seed(name, rows)
+
+    # client API
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: dict | None = None) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    # test helpers
+    def seed(self, table: str, rows: list):
+        """Add rows to a table (copied); ids are assigned after the largest existing one."""
+        with self._lock:
+            stored = self.tables.setdefault(table, [])
+            for row in rows:
+                stored.append(self._with_id(table, dict(row)))
+
+    def rows(self, table: str) -> list:
+        return copy.deepcopy(self.tables.get(table, []))
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def call_counts(self) -> dict:
+        """execute() calls per 'table.operation'."""
+        return dict(Counter(f'{c.table}.{c.operation}' for c in self.calls))
+
+    @property
+    def total_calls(self) -> int:
+        return len(self.calls)
+
+    @property
+    def simulated_ms(self) -> float:
+        return sum(c.latency_ms for c in self.calls)
+
+    # internals
+    def _with_id(self, table: str, row: dict) -> dict:
+        counter = self._ids.get(table)
+        if counter is None:
+            existing = [r.get('id') for r in self.tables.get(table, []) if isinstance(r.get('id'), int)]
+            counter = self._ids[table] = itertools.count(max(existing, default=0) + 1)
+        if row.get('id') is None:
+            row['id'] = next(counter)
+        elif isinstance(row['id'], int):
+            # keep the sequence ahead of explicitly seeded ids
+            self._ids[table] = itertools.count(max(row['id'] + 1, next(counter)))
+        return row
+
+    def _project(self, rows: list, columns: list | None) -> list:
+        if columns is None:
+            return [dict(r) for r in rows]
+        return [{c: r.get(c) for c in columns} for r in rows]
+
+    def _execute(self, query: FakeQuery) -> FakeResponse:
+        with self._lock:
+            table = self.tables.setdefault(query._table, [])
+            operation = query._operation
+
+            if operation == 'select':
+                source = VIEWS[query._table](self.tables) if query._table in VIEWS else table
+                result = [r for r in source if _matches(r, query._filters)]
+                for column, desc in reversed(query._order):
+                    result.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+                total = len(result)
+                limits = [x for x in (query._limit, self.max_rows) if x is not None]
+                result = result[query._offset:query._offset + min(limits) if limits else None]
+                data = self._project(result, query._columns)
+                response = FakeResponse(data=data, count=total if query._count else None)
+                moved = len(data)
+            elif operation == 'insert':
+                payload = query._payload if isinstance(query._payload, list) else [query._payload]
+                data = [dict(self._with_id(query._table, dict(r))) for r in payload]
+                table.extend(dict(r) for r in data)
+                response = FakeResponse(data=data)
+                moved = len(data)
+            elif operation == 'upsert':
+                payload = query._payload if isinstance(query._payload, list) else [query._payload]
+                keys = query._on_conflict
+                index = {tuple(str(r.get(k)) for k in keys): r for r in table}
+                data = []
+                for incoming in payload:
+                    existing = index.get(tuple(str(incoming.get(k)) for k in keys))
+                    if existing is not None:
+                        if query._ignore_duplicates:
+                            continue
+                        existing.update(incoming)
+                        data.append(dict(existing))
+                    else:
+                        row = self._with_id(query._table, dict(incoming))
+                        table.append(row)
+                        index[tuple(str(row.get(k)) for k in keys)] = row
+                        data.append(dict(row))
+                response = FakeResponse(data=data)
+                moved = len(data)
+            elif operation == 'update':
+                data = []
+                for row in table:
+                    if _matches(row, query._filters):
+                        row.update(query._payload)
+                        data.append(dict(row))
+                response = FakeResponse(data=data)
+                moved = len(data)
+            elif operation == 'delete':
+                data = [dict(r) for r in table if _matches(r, query._filters)]
+                table[:] = [r for r in table if not _matches(r, query._filters)]
+                response = FakeResponse(data=data)
+                moved = len(data)
+            else:
+                raise ValueError(f'Unsupported operation: {operation}')
+
+            latency = self.latency_ms + self.latency_per_row_ms * moved
+            filters = tuple((op, column) for op, column, _ in query._filters)
+            self.calls.append(FakeCall(query._table, operation, filters, moved, latency))
+
+        if self.sleep and latency > 0:
+            time.sleep(latency / 1000)
+        return response
+
+    def _execute_rpc(self, call: FakeRpc) -> FakeResponse:
+        with self._lock:
+            data = RPCS[call._name](self, call._params)
+            moved = sum(len(v) for v in call._params.values() if isinstance(v, list))
+            latency = self.latency_ms + self.latency_per_row_ms * moved
+            self.calls.append(FakeCall(call._name, 'rpc', (), moved, latency))
+
+        if self.sleep and latency > 0:
+            time.sleep(latency / 1000)
+        return FakeResponse(data=data)
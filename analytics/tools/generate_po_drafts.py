@@ -0,0 +1,50 @@
+"""
+Nightly purchase order drafts for every branch.
+
+Runs analytics.purchase_orders.generate_drafts over all branches (or one) with the
+database configured in .env, prints a per-branch summary and the elapsed time.
+Usage:
+  python analytics/tools/generate_po_drafts.py                 # all branches, stored
+  python analytics/tools/generate_po_drafts.py --branch-id 3
+  python analytics/tools/generate_po_drafts.py --dry-run       # compute only
+Exits with status 1 when drafting fails, so a scheduler can alert on it.
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to sys.path to enable imports
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from analytics import purchase_orders  # noqa: E402
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Generate purchase order drafts for all branches')
+    parser.add_argument('--branch-id', type=int, default=None, help='only this branch')
+    parser.add_argument('--dry-run', action='store_true', help='compute the drafts without storing them')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    started = time.perf_counter()
+    try:
+        result = purchase_orders.generate_drafts(branch_id=args.branch_id, persist=not args.dry_run)
+    except Exception as e:
+        print(f'Drafting purchase orders failed: {e}', file=sys.stderr)
+        return 1
+
+    for draft in result['drafts']:
+        print(f"branch {draft['branch_id']:>4}: {draft['line_count']:>5} lines, "
+              f"{draft['total_units']:>10.0f} units, {draft['total_cost']:>12.2f} cost"
+              + (f", draft #{draft['draft_id']}" if draft.get('draft_id') else ''))
+    total_lines = sum(d['line_count'] for d in result['drafts'])
+    print(f"{len(result['drafts'])} branches, {total_lines} lines for {result['draft_date']} "
+          f"in {time.perf_counter() - started:.2f}s" + (' (dry run)' if args.dry_run else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Generate large, deterministic synthetic sales files for load-testing the import path.
+
+Everything is vectorized with numpy and produced in date-ordered chunks, so millions of
+rows across many branches and products are generated and written without holding the
+whole dataset in memory. The same --seed always yields the same file.
+
+Demand model per catalog item (one product in one branch):
+  - popularity: Zipf-like weights, so a few items dominate sales
+  - seasonality: yearly sine wave plus a weekly profile (weekend dip)
+  - intermittent demand: a share of items only sells on sparse random days, in lumps
+  - price noise: log-normal jitter around each item's base price
+
+Usage:
+  python analytics/tools/generate_synthetic_sales.py --rows 2000000 --branches 10 --products 2000 \\
+      --output sales_2m.parquet
+  python analytics/tools/generate_synthetic_sales.py --rows 100000 --output sales.csv \\
+      --catalog analytics/tools/centralized_product_rows.json
+  python analytics/tools/generate_synthetic_sales.py --rows 50000 --output names.xlsx --name-only
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PAYMENT_METHODS = np.array(['cash', 'card', 'gcash', 'bank_transfer'])
+PAYMENT_WEIGHTS = np.array([0.45, 0.3, 0.2, 0.05])
+# Monday..Sunday multipliers
+WEEKLY_PROFILE = np.array([1.0, 1.0, 1.05, 1.1, 1.2, 0.7, 0.6])
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def synthetic_catalog(products: int, branches: int, seed: int = 42) -> pd.DataFrame:
+    """Catalog of `products` items per branch with unique ids (as in centralized_product)."""
+    rng = np.random.default_rng([seed, 0])
+    base_prices = np.round(rng.lognormal(mean=6.5, sigma=0.9, size=products), 2)
+    branch_ids = np.repeat(np.arange(1, branches + 1), products)
+    product_index = np.tile(np.arange(products), branches)
+    return pd.DataFrame({
+        'product_id': np.arange(1, products * branches + 1),
+        'branch_id': branch_ids,
+        'product_name': [f'Product {i + 1:05d}' for i in product_index],
+        'price': base_prices[product_index],
+    })
+
+
+def load_catalog(json_path: Path) -> pd.DataFrame:
+    """Catalog from a centralized_product export (e.g. centralized_product_rows.json)."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        products = json.load(f)
+    catalog = pd.DataFrame([
+        {
+            'product_id': p['id'],
+            'branch_id': p.get('branch_id') or 1,
+            'product_name': p.get('product_name') or f'Product {p["id"]}',
+            'price': float(p.get('price') or 0) or 100.0,
+        }
+        for p in products if p.get('id')
+    ])
+    if catalog.empty:
+        raise ValueError(f'No products with an id in {json_path}')
+    return catalog
+
+
+def day_weights(days: np.ndarray, amplitude: float = 0.3) -> np.ndarray:
+    """Relative sales volume per day: yearly seasonality times the weekly profile."""
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(int)
+    yearly = 1 + amplitude * np.sin(2 * np.pi * (day_of_year - 80) / 365.25)
+    weekday = (days.astype('datetime64[D]').view('int64') - 4) % 7  # 1970-01-01 was a Thursday
+    return yearly * WEEKLY_PROFILE[weekday]
+
+
+class SalesGenerator:
+    """Seeded, chunked generator of sales rows for a catalog over a date range."""
+
+    def __init__(self, catalog: pd.DataFrame, rows: int, start: str, days: int, seed: int = 42,
+                 intermittent_share: float = 0.3, intermittent_density: float = 0.08,
+                 price_noise: float = 0.05, seasonality: float = 0.3):
+        self.catalog = catalog.reset_index(drop=True)
+        self.rows = rows
+        self.seed = seed
+        self.price_noise = price_noise
+        self.days = np.datetime64(start, 'D') + np.arange(days)
+
+        rng = np.random.default_rng([seed, 1])
+        items = len(self.catalog)
+        # Zipf-like popularity, shuffled so ids do not encode rank
+        self.popularity = rng.permutation(1.0 / np.arange(1, items + 1) ** 0.8)
+        self.intermittent = rng.random(items) < intermittent_share
+        # Intermittent items only sell on a sparse, fixed set of days
+        self.active = np.ones((days, items), dtype=bool)
+        self.active[:, self.intermittent] = rng.random((days, int(self.intermittent.sum()))) < intermittent_density
+
+        # Rows per day: multinomial over seasonal day weights, fixed for the seed
+        weights = day_weights(self.days, seasonality)
+        self.rows_per_day = rng.multinomial(rows, weights / weights.sum())
+
+    def chunks(self, chunk_rows: int = 500_000):
+        """Yield DataFrames of consecutive days, each about `chunk_rows` rows, in date order."""
+        day = 0
+        total_days = len(self.days)
+        while day < total_days:
+            end = day + 1
+            block_rows = self.rows_per_day[day]
+            while end < total_days and block_rows + self.rows_per_day[end] <= chunk_rows:
+                block_rows += self.rows_per_day[end]
+                end += 1
+            if block_rows:
+                yield self._block(day, end)
+            day = end
+
+    def _day_draws(self, day: int, n: int) -> tuple:
+        # One stream per day, so the output does not depend on --chunk-rows
+        rng = np.random.default_rng([self.seed, 2, day])
+        return (
+            rng.random(n),
+            rng.geometric(0.25, n) * 2,
+            rng.poisson(1.5, n) + 1,
+            rng.lognormal(0, self.price_noise, n),
+            rng.integers(8 * 3600, 21 * 3600, n),  # store hours
+            rng.choice(PAYMENT_METHODS, n, p=PAYMENT_WEIGHTS),
+        )
+
+    def _block(self, first_day: int, end_day: int) -> pd.DataFrame:
+        counts = self.rows_per_day[first_day:end_day]
+        local_day = np.repeat(np.arange(end_day - first_day), counts)
+        draws = [self._day_draws(first_day + i, int(c)) for i, c in enumerate(counts)]
+        uniform, lumps, regular, noise, seconds, payment = (np.concatenate(parts) for parts in zip(*draws))
+
+        # Pick an item per row from that day's weights (inverse CDF on a stacked per-day CDF)
+        weights = self.popularity * self.active[first_day:end_day]
+        cdf = np.cumsum(weights, axis=1)
+        totals = cdf[:, -1:].copy()
+        totals[totals == 0] = 1
+        cdf = cdf / totals + np.arange(end_day - first_day)[:, None]
+        items = len(self.catalog)
+        item = np.searchsorted(cdf.ravel(), uniform + local_day, side='right') - local_day * items
+        item = np.clip(item, 0, items - 1)
+
+        quantity = np.where(self.intermittent[item], lumps, regular)
+        unit_price = np.round(self.catalog['price'].to_numpy()[item] * noise, 2)
+        timestamps = self.days[first_day:end_day][local_day].astype('datetime64[s]') + seconds
+
+        frame = pd.DataFrame({
+            'date': timestamps,
+            'product_id': self.catalog['product_id'].to_numpy()[item],
+            'branch_id': self.catalog['branch_id'].to_numpy()[item],
+            'product_name': self.catalog['product_name'].to_numpy()[item],
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_amount': np.round(quantity * unit_price, 2),
+            'payment_method': payment,
+        })
+        return frame.sort_values('date', kind='stable', ignore_index=True)
+
+
+def generate_sales_frame(rows: int, products: int = 500, branches: int = 3, days: int = 365,
+                         start: str = '2025-01-01', seed: int = 42, catalog: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Whole dataset as one DataFrame (for benchmarks and tests of moderate size)."""
+    if catalog is None:
+        catalog = synthetic_catalog(products, branches, seed)
+    generator = SalesGenerator(catalog, rows, start, days, seed)
+    return pd.concat(generator.chunks(), ignore_index=True)
+
+
+def write_chunks(chunks, output: Path, fmt: str, columns: list) -> int:
+    """Write chunks to CSV, Parquet or Excel without materializing the whole file."""
+    written = 0
+    if fmt == 'csv':
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            for i, chunk in enumerate(chunks):
+                chunk[columns].to_csv(f, header=(i == 0), index=False, date_format='%Y-%m-%d %H:%M:%S')
+                written += len(chunk)
+    elif fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk[columns], preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema, compression='snappy')
+                writer.write_table(table)
+                written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    elif fmt == 'excel':
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('sales')
+        sheet.append(columns)
+        for chunk in chunks:
+            if written + len(chunk) > EXCEL_MAX_ROWS:
+                raise ValueError(f'Excel sheets hold at most {EXCEL_MAX_ROWS:,} rows; use CSV or Parquet')
+            for row in chunk[columns].itertuples(index=False):
+                sheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+            written += len(chunk)
+        workbook.save(output)
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+    return written
+
+
+def output_format(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        return 'csv'
+    if suffix in ('.parquet', '.pq'):
+        return 'parquet'
+    if suffix in ('.xlsx', '.xls'):
+        return 'excel'
+    raise ValueError(f'Cannot infer format from {path.name}; use .csv, .parquet or .xlsx')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate deterministic synthetic sales data')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--products', type=int, default=500, help='products per branch (synthetic catalog)')
+    parser.add_argument('--branches', type=int, default=5)
+    parser.add_argument('--catalog', type=Path, help='centralized_product JSON export to use instead')
+    parser.add_argument('--start', default='2025-01-01')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--intermittent-share', type=float, default=0.3,
+                        help='fraction of items with sparse, lumpy demand')
+    parser.add_argument('--price-noise', type=float, default=0.05, help='sigma of log-normal price jitter')
+    parser.add_argument('--chunk-rows', type=int, default=500_000)
+    parser.add_argument('--name-only', action='store_true',
+                        help='omit product_id/branch_id (POS exports that only carry names)')
+    parser.add_argument('--output', type=Path, required=True, help='.csv, .parquet or .xlsx')
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog) if args.catalog else synthetic_catalog(args.products, args.branches, args.seed)
+    generator = SalesGenerator(catalog, args.rows, args.start, args.days, args.seed,
+                               intermittent_share=args.intermittent_share, price_noise=args.price_noise)
+    columns = ['date', 'product_id', 'branch_id', 'product_name', 'quantity', 'unit_price', 'total_amount', 'payment_method']
+    if args.name_only:
+        columns = [c for c in columns if c not in ('product_id', 'branch_id')]
+
+    fmt = output_format(args.output)
+    print(f'Generating {args.rows:,} rows over {args.days} days for {len(catalog):,} catalog items -> {args.output} ({fmt})')
+    started = time.perf_counter()
+    written = write_chunks(generator.chunks(args.chunk_rows), args.output, fmt, columns)
+    elapsed = time.perf_counter() - started
+    print(f'Wrote {written:,} rows in {elapsed:.1f}s ({written / max(elapsed, 1e-9):,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Replay a sales import through the pipeline and record its memory profile.
+
+The POST /api/analytics/sales-data/import route runs in-process (db.py stubbed, or
+against the fake Supabase client) while two probes watch it:
+  - tracemalloc: Python-level allocations (numpy/pandas buffers included). Peak is
+    reset at every StageTimer stage change, so each stage gets its own high-water
+    mark (above the allocations live when the import started) and its net growth.
+  - RSS sampling: a background thread reads the process resident set size every
+    --interval-ms and keeps the maximum per stage (psutil, else /proc/self/statm).
+
+The result is the same shape as a benchmark.py entry plus a `memory` block, and can
+be merged into a benchmark results file, so copy-elimination work in the import
+route shows up as a lower peak:
+
+Usage:
+  python analytics/tools/memory_harness.py --file sales_1m.csv --output benchmark-results.json
+  python analytics/tools/memory_harness.py --rows 200000 --backend fake-supabase
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from benchmark import FakeSupabaseBackend, StubBackend, create_app, instrumentation, result_entry  # noqa: E402
+from generate_synthetic_sales import generate_sales_frame  # noqa: E402
+
+MB = 1024 * 1024
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes() -> int | None:
+    """Current resident set size of this process, or None where it cannot be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryProfiler:
+    """Per-stage tracemalloc peaks and RSS maxima for one StageTimer-instrumented run.
+
+    Registered as an instrumentation stage observer; use as a context manager.
+    """
+
+    def __init__(self, interval_ms: float = 5.0, trace_frames: int = 1):
+        self.interval = interval_ms / 1000
+        self.trace_frames = trace_frames
+        self.stages = {}
+        self._stage = None
+        self._baseline = 0
+        self._start = 0
+        self._rss_baseline = None
+        self._rss_peak = None
+        self._stop = threading.Event()
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    def _entry(self, stage: str | None) -> dict:
+        name = stage or '(between stages)'
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'peak_bytes': 0, 'net_bytes': 0, 'rss_peak_bytes': None}
+        return entry
+
+    def _on_stage(self, timer, stage: str | None):
+        # Close out the stage that was running: its peak and what it left allocated
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            entry = self._entry(self._stage)
+            entry['peak_bytes'] = max(entry['peak_bytes'], peak - self._start)
+            entry['net_bytes'] += current - self._baseline
+            self._stage = stage
+        self._baseline = current
+        tracemalloc.reset_peak()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = rss_bytes()
+            if rss is None:
+                return
+            with self._lock:
+                self._rss_peak = max(self._rss_peak or 0, rss)
+                entry = self._entry(self._stage)
+                entry['rss_peak_bytes'] = max(entry['rss_peak_bytes'] or 0, rss)
+
+    def __enter__(self):
+        self._rss_baseline = rss_bytes()
+        tracemalloc.start(self.trace_frames)
+        self._baseline = self._start = tracemalloc.get_traced_memory()[0]
+        instrumentation.add_stage_observer(self._on_stage)
+        self._sampler = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._sampler.join()
+        instrumentation.remove_stage_observer(self._on_stage)
+        self._on_stage(None, None)
+        self.overall_peak = max(e['peak_bytes'] for e in self.stages.values()) if self.stages else 0
+        tracemalloc.stop()
+
+    def as_dict(self) -> dict:
+        def mb(value):
+            return None if value is None else round(value / MB, 2)
+
+        stages = [
+            {
+                'stage': name,
+                'tracemalloc_peak_mb': mb(entry['peak_bytes']),
+                'tracemalloc_net_mb': mb(entry['net_bytes']),
+                'rss_peak_mb': mb(entry['rss_peak_bytes']),
+            }
+            for name, entry in self.stages.items()
+        ]
+        return {
+            'peak_tracemalloc_bytes': self.overall_peak,
+            'peak_tracemalloc_mb': mb(self.overall_peak),
+            'rss_baseline_mb': mb(self._rss_baseline),
+            'rss_peak_mb': mb(self._rss_peak),
+            'rss_growth_mb': mb(self._rss_peak - self._rss_baseline) if self._rss_peak and self._rss_baseline else None,
+            'rss_source': 'psutil' if psutil is not None else '/proc/self/statm',
+            'sample_interval_ms': self.interval * 1000,
+            'stages': stages,
+        }
+
+
+def replay_import(payload: bytes, filename: str, rows: int | None, backend: str = 'stub', seed: int = 42,
+                  interval_ms: float = 5.0) -> dict:
+    """POST `payload` to the import route under MemoryProfiler; returns a benchmark entry."""
+    app = create_app()
+    app.config['MAX_CONTENT_LENGTH'] = None
+    client = app.test_client()
+    context = FakeSupabaseBackend(seed) if backend == 'fake-supabase' else StubBackend(seed)
+
+    with context, MemoryProfiler(interval_ms) as profiler:
+        started = time.perf_counter()
+        response = client.post(
+            '/api/analytics/sales-data/import?force=true',
+            data={'file': (io.BytesIO(payload), filename), 'branch_id': '1'},
+            content_type='multipart/form-data',
+        )
+        elapsed = time.perf_counter() - started
+    body = response.get_json() or {}
+    if response.status_code not in (200, 207):
+        raise RuntimeError(f'import failed with {response.status_code}: {body.get("error")}')
+    suffix = '' if backend == 'stub' else f'[{backend}]'
+    return result_entry(f'routes.import_sales_data.memory{suffix}', rows or body.get('records_imported') or 0,
+                        [elapsed], file=filename, memory=profiler.as_dict())
+
+
+def merge_into(output: Path, entry: dict):
+    """Add `entry` to a benchmark results file, replacing any entry with the same name and size."""
+    results = json.loads(output.read_text()) if output.exists() else {'meta': {}, 'results': []}
+    results['results'] = [
+        r for r in results.get('results', []) if (r['name'], r['size']) != (entry['name'], entry['size'])
+    ] + [entry]
+    output.write_text(json.dumps(results, indent=2, default=str))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record per-stage memory of a sales import')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--file', type=Path, help='import file to replay (CSV, Excel or Parquet)')
+    source.add_argument('--rows', type=int, default=100_000, help='synthetic rows when no --file is given')
+    parser.add_argument('--backend', choices=('stub', 'fake-supabase'), default='stub')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--interval-ms', type=float, default=5.0, help='RSS sampling interval')
+    parser.add_argument('--output', type=Path, default=Path('benchmark-results.json'),
+                        help='benchmark results JSON to add the entry to')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    if args.file:
+        payload, filename = args.file.read_bytes(), args.file.name
+        rows = None
+    else:
+        df = generate_sales_frame(args.rows, seed=args.seed)
+        payload, filename, rows = df.to_csv(index=False).encode(), 'synthetic.csv', args.rows
+        del df
+
+    entry = replay_import(payload, filename, rows, args.backend, args.seed, args.interval_ms)
+    memory = entry['memory']
+    print(f'{filename}: peak tracemalloc {memory["peak_tracemalloc_mb"]} MB, peak RSS {memory["rss_peak_mb"]} MB')
+    for stage in memory['stages']:
+        print(f'  {stage["stage"]:<22} peak {stage["tracemalloc_peak_mb"]:>9} MB  net {stage["tracemalloc_net_mb"]:>9} MB  rss {stage["rss_peak_mb"]} MB')
+    merge_into(args.output, entry)
+    print(f'Added {entry["name"]} to {os.path.abspath(args.output)}')
+
+
+if __name__ == '__main__':
+    main()
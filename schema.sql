@@ -841,6 +841,7 @@ CREATE INDEX IF NOT EXISTS idx_sales_composite_product_date ON public.sales(prod
 CREATE INDEX IF NOT EXISTS idx_eoq_calculations_product_id ON public.eoq_calculations(product_id);
 CREATE INDEX IF NOT EXISTS idx_eoq_calculations_branch_id ON public.eoq_calculations(branch_id);
 CREATE INDEX IF NOT EXISTS idx_eoq_calculations_valid_until ON public.eoq_calculations(valid_until);
+CREATE INDEX IF NOT EXISTS idx_eoq_calculations_latest ON public.eoq_calculations(product_id, branch_id, calculated_at DESC);
 
 CREATE INDEX IF NOT EXISTS idx_sales_forecast_product_id ON public.sales_forecast(product_id);
 CREATE INDEX IF NOT EXISTS idx_sales_forecast_branch_id ON public.sales_forecast(branch_id);
@@ -930,6 +931,165 @@ BEGIN
     END IF;
 END $$;
 
+-- Sales import batches keyed by upload content hash (idempotent re-uploads)
+CREATE TABLE IF NOT EXISTS public.sales_import_batches (
+  id bigint GENERATED ALWAYS AS IDENTITY NOT NULL,
+  import_batch_id uuid NOT NULL,
+  content_hash character varying(64) NOT NULL,
+  branch_id integer NOT NULL,
+  file_name character varying,
+  records_imported integer DEFAULT 0,
+  summary jsonb,
+  claimed_at timestamp with time zone,
+  created_at timestamp with time zone DEFAULT now(),
+  CONSTRAINT sales_import_batches_pkey PRIMARY KEY (id),
+  CONSTRAINT sales_import_batches_hash_branch_unique UNIQUE (content_hash, branch_id),
+  CONSTRAINT sales_import_batches_branch_id_fkey FOREIGN KEY (branch_id) REFERENCES public.branch(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_import_batches_import_batch_id
+ON public.sales_import_batches(import_batch_id);
+
+-- When a Supabase import claimed the hash; unfinished claims older than the claim TTL are taken over
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_schema = 'public' 
+        AND table_name = 'sales_import_batches' 
+        AND column_name = 'claimed_at'
+    ) THEN
+        ALTER TABLE public.sales_import_batches
+        ADD COLUMN claimed_at timestamp with time zone;
+    END IF;
+END $$;
+
+-- Saved column mappings for POS export formats, per branch (sales import profiles)
+CREATE TABLE IF NOT EXISTS public.sales_import_profiles (
+  id bigint GENERATED ALWAYS AS IDENTITY NOT NULL,
+  branch_id integer NOT NULL,
+  name character varying NOT NULL,
+  column_map jsonb NOT NULL,
+  dtypes jsonb DEFAULT '{}'::jsonb,
+  date_format character varying,
+  sheet character varying,
+  header_row integer DEFAULT 0,
+  created_at timestamp with time zone DEFAULT now(),
+  updated_at timestamp with time zone DEFAULT now(),
+  CONSTRAINT sales_import_profiles_pkey PRIMARY KEY (id),
+  CONSTRAINT sales_import_profiles_branch_name_unique UNIQUE (branch_id, name),
+  CONSTRAINT sales_import_profiles_branch_id_fkey FOREIGN KEY (branch_id) REFERENCES public.branch(id) ON DELETE CASCADE
+);
+
+-- Units per supplier pack; purchase order drafts are rounded up to whole packs
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_schema = 'public' 
+        AND table_name = 'centralized_product' 
+        AND column_name = 'pack_size'
+    ) THEN
+        ALTER TABLE public.centralized_product
+        ADD COLUMN pack_size INTEGER NOT NULL DEFAULT 1
+        CONSTRAINT chk_pack_size_positive CHECK (pack_size > 0);
+    END IF;
+END $$;
+
+-- Purchase order drafts: one consolidated draft per branch per day, regenerated in place
+CREATE TABLE IF NOT EXISTS public.purchase_order_drafts (
+  id bigint GENERATED ALWAYS AS IDENTITY NOT NULL,
+  branch_id integer NOT NULL,
+  draft_date date NOT NULL DEFAULT CURRENT_DATE,
+  status character varying NOT NULL DEFAULT 'draft',
+  line_count integer NOT NULL DEFAULT 0,
+  total_units real NOT NULL DEFAULT 0,
+  total_cost real NOT NULL DEFAULT 0,
+  generated_at timestamp with time zone DEFAULT now(),
+  CONSTRAINT purchase_order_drafts_pkey PRIMARY KEY (id),
+  CONSTRAINT purchase_order_drafts_branch_date_unique UNIQUE (branch_id, draft_date),
+  CONSTRAINT purchase_order_drafts_branch_id_fkey FOREIGN KEY (branch_id) REFERENCES public.branch(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS public.purchase_order_draft_items (
+  id bigint GENERATED ALWAYS AS IDENTITY NOT NULL,
+  draft_id bigint NOT NULL,
+  product_id integer NOT NULL,
+  product_name text,
+  current_stock real NOT NULL,
+  reorder_point real NOT NULL,
+  eoq_quantity real NOT NULL,
+  pack_size integer NOT NULL DEFAULT 1,
+  packs integer NOT NULL,
+  order_quantity real NOT NULL,
+  unit_cost real,
+  line_cost real,
+  CONSTRAINT purchase_order_draft_items_pkey PRIMARY KEY (id),
+  CONSTRAINT purchase_order_draft_items_draft_id_fkey FOREIGN KEY (draft_id) REFERENCES public.purchase_order_drafts(id) ON DELETE CASCADE,
+  CONSTRAINT purchase_order_draft_items_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.centralized_product(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_purchase_order_draft_items_draft_id
+ON public.purchase_order_draft_items(draft_id);
+
+-- Replace the drafts of several branches in one transaction (used over Supabase RPC).
+-- p_headers: [{branch_id, draft_date, status, line_count, total_units, total_cost, generated_at}]
+-- p_items:   [{branch_id, product_id, product_name, ...}] for the purchase_order_draft_items columns
+-- Returns {branch_id: draft_id}.
+CREATE OR REPLACE FUNCTION public.save_purchase_order_drafts(p_headers jsonb, p_items jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  draft_ids jsonb;
+BEGIN
+  WITH upserted AS (
+    INSERT INTO public.purchase_order_drafts AS d
+      (branch_id, draft_date, status, line_count, total_units, total_cost, generated_at)
+    SELECT h.branch_id, h.draft_date, h.status, h.line_count, h.total_units, h.total_cost, h.generated_at
+    FROM jsonb_to_recordset(p_headers) AS h(branch_id integer, draft_date date, status character varying,
+                                            line_count integer, total_units real, total_cost real,
+                                            generated_at timestamp with time zone)
+    ON CONFLICT (branch_id, draft_date) DO UPDATE SET
+      status = EXCLUDED.status,
+      line_count = EXCLUDED.line_count,
+      total_units = EXCLUDED.total_units,
+      total_cost = EXCLUDED.total_cost,
+      generated_at = EXCLUDED.generated_at
+    RETURNING d.branch_id, d.id
+  )
+  SELECT COALESCE(jsonb_object_agg(u.branch_id::text, u.id), '{}'::jsonb) INTO draft_ids FROM upserted u;
+
+  DELETE FROM public.purchase_order_draft_items
+  WHERE draft_id IN (SELECT value::bigint FROM jsonb_each_text(draft_ids));
+
+  INSERT INTO public.purchase_order_draft_items
+    (draft_id, product_id, product_name, current_stock, reorder_point, eoq_quantity,
+     pack_size, packs, order_quantity, unit_cost, line_cost)
+  SELECT (draft_ids ->> i.branch_id::text)::bigint, i.product_id, i.product_name, i.current_stock,
+         i.reorder_point, i.eoq_quantity, i.pack_size, i.packs, i.order_quantity, i.unit_cost, i.line_cost
+  FROM jsonb_to_recordset(COALESCE(p_items, '[]'::jsonb)) AS i(branch_id integer, product_id integer,
+       product_name text, current_stock real, reorder_point real, eoq_quantity real, pack_size integer,
+       packs integer, order_quantity real, unit_cost real, line_cost real);
+
+  RETURN draft_ids;
+END;
+$$;
+
+-- Supplier price breaks (all-units discounts): unit_cost applies to every unit once an
+-- order reaches min_quantity
+CREATE TABLE IF NOT EXISTS public.product_price_breaks (
+  id bigint GENERATED ALWAYS AS IDENTITY NOT NULL,
+  product_id integer NOT NULL,
+  min_quantity real NOT NULL DEFAULT 0,
+  unit_cost real NOT NULL,
+  created_at timestamp with time zone DEFAULT now(),
+  CONSTRAINT product_price_breaks_pkey PRIMARY KEY (id),
+  CONSTRAINT product_price_breaks_product_quantity_unique UNIQUE (product_id, min_quantity),
+  CONSTRAINT product_price_breaks_product_id_fkey FOREIGN KEY (product_id) REFERENCES public.centralized_product(id) ON DELETE CASCADE,
+  CONSTRAINT chk_price_break_values CHECK (min_quantity >= 0 AND unit_cost >= 0)
+);
+
 -- =============================================
 -- ANALYTICS VIEWS
 -- =============================================
@@ -955,6 +1115,19 @@ WHERE s.transaction_date >= NOW() - INTERVAL '12 months'
 GROUP BY s.product_id, cp.product_name, s.branch_id, b.location, DATE_TRUNC('month', s.transaction_date)
 ORDER BY s.branch_id, sales_month DESC;
 
+-- Newest EOQ calculation per product and branch; lets PostgREST clients page through
+-- one row per product instead of the whole calculation history
+CREATE OR REPLACE VIEW public.eoq_calculations_latest AS
+SELECT DISTINCT ON (product_id, branch_id) *
+FROM public.eoq_calculations
+ORDER BY product_id, branch_id, calculated_at DESC, id DESC;
+
+-- First recorded sale day per product and branch (forecasts ignore the days before it)
+CREATE OR REPLACE VIEW public.product_first_sale AS
+SELECT product_id, branch_id, MIN(period_date) AS first_sale_date
+FROM public.product_demand_history
+GROUP BY product_id, branch_id;
+
 CREATE OR REPLACE VIEW public.v_eoq_recommendations AS
 SELECT 
     e.id,